@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+#*******************************************************************************
+#*
+#*    SCons-side overhead benchmark
+#*
+#*    Generates synthetic projects (IP configs with deep 'import' chains,
+#*    HDL module trees with include webs) which use 'vivado' and 'questa'
+#*    tools with fake tool executables (stubs/fake_tool.py), runs SCons on
+#*    them and measures:
+#*
+#*        startup  - 'scons -h' on fresh tree: tool loading and SConscript
+#*                   evaluation only
+#*        full     - clean build
+#*        noop     - rebuild with nothing to do (SConscript evaluation and
+#*                   dependency walk)
+#*        scan     - dry run with implicit dependencies and HDL scan cache
+#*                   dropped (cold scanning)
+#*        incr     - rebuild after one include file change
+#*
+#*    Results are appended to history file (JSON lines). Each run is compared
+#*    with the previous run of the same scale, slowdowns above threshold are
+#*    reported and make exit code non-zero.
+#*
+#*    Usage: bench.py [--scale small,medium] [--scons 'python3 -m SCons']
+#*
+#*******************************************************************************
+
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import random
+import shutil
+import socket
+import argparse
+import platform
+import subprocess
+
+#-------------------------------------------------------------------------------
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR  = os.path.dirname(BENCH_DIR)
+STUB      = os.path.join(BENCH_DIR, 'stubs', 'fake_tool.py')
+
+SCALES = {
+    'small'  : { 'ips' : 10,  'hdl' : 100,  'headers' : 20,  'depth' : 5  },
+    'medium' : { 'ips' : 50,  'hdl' : 1000, 'headers' : 100, 'depth' : 20 },
+    'large'  : { 'ips' : 200, 'hdl' : 5000, 'headers' : 400, 'depth' : 50 }
+}
+
+CFG_NAME = 'bench_cfg'
+STEPS    = ['startup', 'full', 'noop', 'scan', 'incr']
+
+DEBUG_TIME = [
+    ('total',      re.compile(r'Total build time:\s*([\d.]+)')),
+    ('sconscript', re.compile(r'Total SConscript file execution time:\s*([\d.]+)')),
+    ('scons',      re.compile(r'Total SCons execution time:\s*([\d.]+)')),
+    ('commands',   re.compile(r'Total command execution time:\s*([\d.]+)'))
+]
+
+#-------------------------------------------------------------------------------
+#
+#    Synthetic project
+#
+SCONSTRUCT = '''\
+SConscript('{cfg}/SConscript')
+'''
+
+SCONSCRIPT = '''\
+import os
+
+env = Environment(tools = ['vivado', 'questa'], ENV = os.environ,
+                  XILINX_VIVADO = r'{vivado}',
+                  QUESTABIN     = r'{questabin}',
+                  QUESTASIM     = r'{questabin}/vsim')
+
+env['TOP_NAME']       = 'top'
+env['TESTBENCH_NAME'] = 'top'
+env['INC_PATH']       = [r'{inc}']
+env['SIM_INC_PATH']   = [r'{inc}']
+env['VERBOSE']        = False
+env['SETTINGS_SEARCH_PATH'] = [env['CFG_PATH'], os.path.join(env['CFG_PATH'], 'settings')]
+env['IP_SIM_SRC_LIST_PATH'] = os.path.join(env['CFG_PATH'], 'simsrc')
+env['IP_SIMLIB_PER_IP']     = os.environ.get('BENCH_IP_SIMLIB_PER_IP') == '1'
+env['SIM_INCREMENTAL']      = os.environ.get('BENCH_SIM_INCREMENTAL') == '1'
+
+ips  = sorted(str(f) for f in Glob('ip/*.yml'))
+hdl  = sorted(str(f) for f in Glob('src/*.sv'))
+
+xci  = env.CreateIps(env.IpCreateScripts(ips))
+dcp  = env.SynIps(env.IpSynScripts(ips), xci)
+prj  = env.CreateVivadoProject('src.yml', xci)
+syn  = env.LaunchSynthVivadoProject(prj, hdl)
+lib  = env.CompileSimLib(env.IpSimLibScripts(xci))
+wlib = env.CompileWorkLib(hdl)
+
+Default(dcp, syn, lib, wlib)
+'''
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+def link(src, dst):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.lexists(dst):
+        os.remove(dst)
+    os.symlink(src, dst)
+
+def generate_project(root, scale, seed=1):
+
+    rnd = random.Random(seed)
+    cfg = os.path.join(root, CFG_NAME)
+    inc = os.path.join(cfg, 'inc')
+
+    if os.path.exists(root):
+        shutil.rmtree(root)
+
+    #---------------------------------------------------------------
+    #   fake tools and repo as 'site_scons'
+    vivado    = os.path.join(root, 'tools', 'Vivado', '2020.2')
+    questabin = os.path.join(root, 'tools', 'questa', 'bin')
+    link(STUB, os.path.join(vivado, 'bin', 'vivado'))
+    for t in ('vlib', 'vmap', 'vdel', 'vsim', 'vlog', 'vopt'):
+        link(STUB, os.path.join(questabin, t))
+    write(os.path.join(vivado, 'data', 'verilog', 'src', 'glbl.v'), 'module glbl; endmodule\n')
+    link(REPO_DIR, os.path.join(root, 'site_scons'))
+
+    write(os.path.join(root, 'SConstruct'), SCONSTRUCT.format(cfg=CFG_NAME))
+    write(os.path.join(cfg, 'SConscript'), SCONSCRIPT.format(vivado=vivado, questabin=questabin, inc=inc))
+
+    #---------------------------------------------------------------
+    #   config import chain: settings/chain_<k>.yml imports chain_<k-1>
+    for k in range(scale['depth']):
+        text = ''
+        if k:
+            text += 'import: chain_' + str(k - 1) + '\n'
+        text += 'parameters:\n'
+        if k:
+            text += '    WIDTH: "=chain_' + str(k - 1) + '.WIDTH + 1"\n'
+            text += '    DEPTH: "=chain_' + str(k - 1) + '.DEPTH * 2 % 4096 + WIDTH"\n'
+        else:
+            text += '    WIDTH: 8\n'
+            text += '    DEPTH: 16\n'
+        write(os.path.join(cfg, 'settings', 'chain_' + str(k) + '.yml'), text)
+
+    write(os.path.join(cfg, 'simsrc', 'fifo_generator.yml'),
+          'sources:\n    - ${ip_name}/${ip_name}/sim/${ip_name}.v\n')
+
+    last = 'chain_' + str(scale['depth'] - 1)
+    for i in range(scale['ips']):
+        text  = 'type: fifo_generator\n'
+        text += 'import: ' + last + '\n'
+        text += 'config:\n'
+        text += '    Input_Data_Width: "=' + last + '.WIDTH + ' + str(i) + '"\n'
+        text += '    Input_Depth: "=' + last + '.DEPTH"\n'
+        text += '    Output_Data_Width: "=Input_Data_Width"\n'
+        write(os.path.join(cfg, 'ip', 'ip_' + str(i) + '.yml'), text)
+
+    #---------------------------------------------------------------
+    #   include web: each header includes up to two later headers
+    nh = scale['headers']
+    for k in range(nh):
+        text = '`ifndef HDR_' + str(k) + '\n`define HDR_' + str(k) + '\n'
+        for j in rnd.sample(range(k + 1, nh), min(2, nh - k - 1)):
+            text += '`include "hdr_' + str(j) + '.svh"\n'
+        text += '`define HDR_' + str(k) + '_W ' + str(k % 32 + 1) + '\n`endif\n'
+        write(os.path.join(inc, 'hdr_' + str(k) + '.svh'), text)
+
+    #---------------------------------------------------------------
+    #   module tree: mod_<i> instantiates mod_<2i+1> and mod_<2i+2>
+    n   = scale['hdl']
+    src = []
+    for i in range(n):
+        name  = 'mod_' + str(i)
+        text  = '// ' + name + '\n'
+        for j in rnd.sample(range(nh), min(2, nh)):
+            text += '`include "hdr_' + str(j) + '.svh"\n'
+        text += 'module ' + name + '(input logic clk, input logic [7:0] d, output logic [7:0] q);\n'
+        for c in (2*i + 1, 2*i + 2):
+            if c < n:
+                text += '    mod_' + str(c) + ' u' + str(c) + ' (.clk(clk), .d(d), .q());\n'
+        text += '    always_ff @(posedge clk) q <= d;\n'
+        text += 'endmodule\n'
+        fn = os.path.join('src', name + '.sv')
+        write(os.path.join(cfg, fn), text)
+        src.append(fn)
+
+    text  = 'module top(input logic clk, input logic [7:0] d, output logic [7:0] q);\n'
+    text += '    mod_0 u0 (.clk(clk), .d(d), .q(q));\n'
+    text += 'endmodule\n'
+    write(os.path.join(cfg, 'src', 'top.sv'), text)
+    src.append(os.path.join('src', 'top.sv'))
+
+    text = 'sources:\n' + ''.join('    - ' + s + '\n' for s in src)
+    write(os.path.join(cfg, 'src.yml'), text)
+
+#-------------------------------------------------------------------------------
+#
+#    Measurement
+#
+def run_scons(root, scons, args, log):
+    cmd   = scons + ['--debug=time'] + args
+    start = time.time()
+    p     = subprocess.run(cmd, cwd=root, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                           universal_newlines=True)
+    wall  = time.time() - start
+    with open(log, 'w') as f:
+        f.write(' '.join(cmd) + '\n' + p.stdout)
+
+    res = { 'wall' : round(wall, 3), 'rcode' : p.returncode }
+    for name, pattern in DEBUG_TIME:
+        m = pattern.search(p.stdout)
+        if m:
+            res[name] = float(m.group(1))
+    return res
+
+def bench_scale(name, scale, args):
+
+    root = os.path.join(os.path.abspath(args.workdir), name)
+    print('[' + name + '] generating: ' + ', '.join(k + '=' + str(v) for k, v in sorted(scale.items())))
+    generate_project(root, scale)
+
+    scons  = shlex.split(args.scons)
+    jobs   = ['-j', str(args.jobs)]
+    build  = os.path.join(root, 'build')
+    logs   = os.path.join(args.workdir, name + '-logs')
+    os.makedirs(logs, exist_ok=True)
+
+    steps = {
+        'startup' : ['-h'],
+        'full'    : jobs,
+        'noop'    : jobs,
+        'scan'    : ['-n', '--implicit-deps-changed'],
+        'incr'    : jobs
+    }
+
+    results = {}
+    for step in STEPS:
+        if step == 'scan':
+            cache = os.path.join(build, '.hdl_scan.json')
+            if os.path.exists(cache):
+                os.remove(cache)
+        if step == 'incr':
+            with open(os.path.join(root, CFG_NAME, 'inc', 'hdr_0.svh'), 'a') as f:
+                f.write('// changed ' + str(time.time()) + '\n')
+
+        res = run_scons(root, scons, steps[step], os.path.join(logs, step + '.log'))
+        results[step] = res
+        print('[' + name + '] %-7s wall %7.2f s  sconscript %7.2f s  scons %7.2f s  commands %7.2f s%s' %
+              (step, res['wall'], res.get('sconscript', 0), res.get('scons', 0), res.get('commands', 0),
+               '' if res['rcode'] == 0 else '  FAILED (' + str(res['rcode']) + '), see ' + logs))
+    return results
+
+#-------------------------------------------------------------------------------
+#
+#    History
+#
+def git_rev():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                       universal_newlines=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def load_history(path):
+    res = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    res.append(json.loads(line))
+                except ValueError:
+                    pass
+    return res
+
+def compare(prev, record, threshold, min_delta):
+    res = []
+    for step in STEPS:
+        old = prev['results'].get(step, {}).get('wall')
+        new = record['results'].get(step, {}).get('wall')
+        if not old or new is None:
+            continue
+        if new > old*threshold and new - old > min_delta:
+            res.append('%s %s: %.2f s -> %.2f s (x%.2f, baseline %s)' %
+                       (record['scale'], step, old, new, new/old, prev.get('rev') or prev['date']))
+    return res
+
+#-------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='SCons-side overhead benchmark of vivado/questa tools')
+    parser.add_argument('--scale',     default='small,medium', help='comma-separated: ' + ', '.join(SCALES))
+    parser.add_argument('--scons',     default='scons',        help='SCons command')
+    parser.add_argument('--jobs',      default=4, type=int,    help='SCons -j value')
+    parser.add_argument('--delay',     default=0.0, type=float, help='fake tool startup delay, s')
+    parser.add_argument('--per-ip',    action='store_true',     help='compile IP simulation libraries per IP')
+    parser.add_argument('--sim-incr',  action='store_true',     help='incremental work library compile')
+    parser.add_argument('--workdir',   default=os.path.join(BENCH_DIR, 'work'))
+    parser.add_argument('--history',   default=os.path.join(BENCH_DIR, 'history.jsonl'))
+    parser.add_argument('--threshold', default=1.25, type=float, help='slowdown ratio reported as regression')
+    parser.add_argument('--min-delta', default=0.2,  type=float, help='ignore slowdowns below, s')
+    args = parser.parse_args()
+
+    os.environ['FAKE_TOOL_DELAY']        = str(args.delay)
+    os.environ['BENCH_IP_SIMLIB_PER_IP'] = '1' if args.per_ip else '0'
+    os.environ['BENCH_SIM_INCREMENTAL']  = '1' if args.sim_incr else '0'
+
+    history     = load_history(args.history)
+    regressions = []
+    failed      = False
+    for name in args.scale.split(','):
+        if name not in SCALES:
+            print('E: unknown scale: ' + name)
+            return 2
+        results = bench_scale(name, SCALES[name], args)
+        failed |= any(r['rcode'] for r in results.values())
+
+        record = { 'date'    : time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'rev'     : git_rev(),
+                   'host'    : socket.gethostname(),
+                   'python'  : platform.python_version(),
+                   'scale'   : name,
+                   'params'  : SCALES[name],
+                   'jobs'    : args.jobs,
+                   'delay'   : args.delay,
+                   'per_ip'  : args.per_ip,
+                   'sim_incr': args.sim_incr,
+                   'results' : results }
+
+        prev = [h for h in history if h['scale'] == name and h['params'] == record['params'] and
+                h.get('jobs') == args.jobs and h.get('delay') == args.delay and
+                h.get('per_ip', False) == args.per_ip and h.get('sim_incr', False) == args.sim_incr and
+                h['host'] == record['host']]
+        if prev:
+            regressions += compare(prev[-1], record, args.threshold, args.min_delta)
+
+        if not failed:
+            with open(args.history, 'a') as f:
+                f.write(json.dumps(record, sort_keys=True) + '\n')
+
+    for r in regressions:
+        print('REGRESSION: ' + r)
+
+    return 1 if failed or regressions else 0
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main())
+
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+#*******************************************************************************
+#*
+#*    Fake Vivado/QuestaSim executables for benchmarks
+#*
+#*    Dispatches on executable name (the file is linked as 'vivado', 'vlib',
+#*    'vmap', 'vdel', 'vsim', 'vlog', 'vopt'). Vivado stand-in interprets
+#*    generated Tcl scripts just enough to produce expected outputs: .xci
+#*    with its simulation model, .dcp, .xpr, project run results, checkpoints
+#*    and bitstreams. Like Vivado, it rewrites volatile fields of IP core and
+#*    project files it opens. Every invocation sleeps FAKE_TOOL_DELAY seconds
+#*    (default 0) to emulate tool startup.
+#*
+#*******************************************************************************
+
+import os
+import re
+import sys
+import time
+
+#-------------------------------------------------------------------------------
+def touch(path, text=''):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+def option(args, name, default=None):
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return default
+
+#-------------------------------------------------------------------------------
+XCI_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
+<spirit:design xmlns:spirit="http://www.spiritconsortium.org/XMLSchema/SPIRIT/1685-2009">
+  <spirit:vendor>xilinx.com</spirit:vendor>
+  <spirit:componentInstances>
+    <spirit:componentInstance>
+      <spirit:instanceName>{name}</spirit:instanceName>
+      <spirit:componentRef spirit:vendor="xilinx.com" spirit:library="ip" spirit:name="{type}" spirit:version="1.0"/>
+      <spirit:configurableElementValues>
+        <spirit:configurableElementValue spirit:referenceId="RUNTIME_PARAM.TIMESTAMP">{stamp}</spirit:configurableElementValue>
+      </spirit:configurableElementValues>
+    </spirit:componentInstance>
+  </spirit:componentInstances>
+</spirit:design>
+'''
+
+SIM_TEMPLATE = '''module {name}(input wire clk);
+endmodule
+'''
+
+XPR_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
+<!-- Product Version: Vivado v2020.2 (64-bit) -->
+<Project Version="7" Minor="54" Path="{path}">
+  <Configuration>
+    <Option Name="Part" Val="{part}"/>
+    <Option Name="WTXSimLaunchSim" Val="{count}"/>
+  </Configuration>
+</Project>
+'''
+
+def rewrite(path, pattern, repl):
+    if os.path.exists(path):
+        with open(path) as f:
+            text = f.read()
+        touch(path, re.sub(pattern, repl, text))
+
+class FakeVivado(object):
+
+    def __init__(self, log):
+        self.vars    = {}
+        self.ips     = []
+        self.project = None
+        self.log     = open(log, 'w') if log else None
+
+    def puts(self, text):
+        print(text)
+        if self.log:
+            self.log.write(text + '\n')
+
+    def subst(self, text):
+        text = re.sub(r'\$\{?(\w+)\}?', lambda m: self.vars.get(m.group(1), m.group(0)), text)
+        return re.sub(r'\[file join ([^\]]*)\]', lambda m: os.path.join(*m.group(1).split()), text)
+
+    def run(self, script):
+        with open(script) as f:
+            lines = f.read().replace('\\\n', ' ').splitlines()
+
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            args = self.subst(line).replace('[', ' ').replace(']', ' ').split()
+            cmd  = args[0]
+
+            if cmd == 'set' and len(args) >= 3:
+                self.vars[args[1]] = ' '.join(args[2:]).strip('{}')
+
+            elif cmd == 'create_ip':
+                name = option(args, '-module_name')
+                path = os.path.join(option(args, '-dir'), name, name + '.xci')
+                touch(path, XCI_TEMPLATE.format(name=name, type=option(args, '-name'), stamp=time.time()))
+                touch(os.path.join(os.path.dirname(path), 'sim', name + '.v'), SIM_TEMPLATE.format(name=name))
+                self.ips.append(path)
+
+            elif cmd == 'read_ip':
+                self.ips.append(args[-1])
+                rewrite(args[-1], r'(TIMESTAMP">)[^<]*', r'\g<1>' + str(time.time()))
+
+            elif cmd == 'synth_ip' or (cmd == 'launch_runs' and '_synth_1' in line and 'synth_1 ' not in line):
+                self.puts('Command: synth_design')
+                if self.ips:
+                    touch(os.path.splitext(self.ips[-1])[0] + '.dcp', 'dcp')
+
+            elif cmd in ('create_project', 'open_project'):
+                xpr = [a for a in args if a.endswith('.xpr')]
+                if xpr:
+                    self.project = os.path.abspath(xpr[0])
+                    if cmd == 'create_project':
+                        touch(self.project, XPR_TEMPLATE.format(path=self.project, part=option(args, '-part', ''), count=0))
+                    else:
+                        rewrite(self.project, r'(WTXSimLaunchSim" Val=")(\d+)', lambda m: m.group(1) + str(int(m.group(2)) + 1))
+
+            elif cmd == 'launch_runs' and self.project:
+                run  = 'impl_1' if 'impl_1' in args else 'synth_1'
+                top  = self.vars.get('TOP_NAME', 'top')
+                base = os.path.splitext(self.project)[0] + '.runs'
+                if run == 'synth_1':
+                    self.puts('Command: synth_design')
+                    touch(os.path.join(base, run, top + '.dcp'), 'dcp')
+                else:
+                    for c in ('opt_design', 'place_design', 'route_design', 'write_bitstream'):
+                        self.puts('Command: ' + c)
+                    touch(os.path.join(base, run, top + '_routed.dcp'), 'dcp')
+                    touch(os.path.join(base, run, top + '.bit'), 'bit')
+
+            elif cmd in ('synth_design', 'opt_design', 'place_design', 'phys_opt_design', 'route_design'):
+                self.puts('Command: ' + cmd)
+                self.puts('Phase 1 Initialization')
+
+            elif cmd in ('write_checkpoint', 'write_bitstream'):
+                touch(args[-1], cmd)
+
+            elif cmd == 'exit':
+                break
+
+#-------------------------------------------------------------------------------
+def vivado(args):
+    script = option(args, '-source')
+    if not script:
+        print('fake vivado: only batch mode (-source) is supported')
+        return 1
+    FakeVivado(option(args, '-log')).run(script)
+    return 0
+
+def vlib(args):
+    lib = args[-1]
+    os.makedirs(lib, exist_ok=True)
+    touch(os.path.join(lib, '_info'), 'lib')
+    return 0
+
+def vmap(args):
+    ini = 'modelsim.ini'
+    if '-c' in args:
+        touch(ini, '[Library]\n')
+    elif len(args) >= 2:
+        with open(ini, 'a') as f:
+            f.write(args[-2] + ' = ' + args[-1] + '\n')
+    return 0
+
+def vdel(args):
+    print('# fake vdel ' + ' '.join(args))
+    return 0
+
+def vsim(args):
+    print('# fake vsim ' + ' '.join(args))
+    return 0
+
+def vlog(args):
+    print('# fake vlog: ' + str(len(args)) + ' arguments')
+    return 0
+
+def vopt(args):
+    print('# fake vopt ' + ' '.join(a for a in args if not a.startswith('+')))
+    return 0
+
+TOOLS = { 'vivado' : vivado, 'vlib' : vlib, 'vmap' : vmap, 'vdel' : vdel, 'vsim' : vsim, 'vlog' : vlog, 'vopt' : vopt }
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    time.sleep(float(os.environ.get('FAKE_TOOL_DELAY', '0')))
+    tool = TOOLS.get(os.path.basename(sys.argv[0]))
+    if tool is None:
+        print('fake tool: unknown tool name ' + sys.argv[0])
+        sys.exit(1)
+    sys.exit(tool(sys.argv[1:]))
+
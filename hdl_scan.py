@@ -0,0 +1,402 @@
+#*******************************************************************************
+#*
+#*    HDL source scanning
+#*
+#*    Verilog/SystemVerilog files are tokenized with comments and strings
+#*    skipped. Facts extracted from a file (includes, declared design units
+#*    and references to other units) are kept in on-disk cache keyed by
+#*    content hash, file is not read while its mtime and size are unchanged.
+#*    Include files are resolved through per-directory listing index instead
+#*    of probing each include path. Design unit graph gives the set of files
+#*    reachable from top units and compilation units in compile order.
+#*
+#*******************************************************************************
+
+import os
+import json
+import atexit
+import hashlib
+import threading
+import collections
+
+from utils import *
+
+#-------------------------------------------------------------------------------
+HDL_SCAN_VERSION = 3
+
+#   Comments and strings are matched as whole tokens, so directives inside
+#   them are skipped. Includes in all `ifdef branches are taken: macro
+#   definitions are not known at scan time and superset of dependencies is safe
+#
+HDL_TOKEN = re.compile(r'''
+      //[^\n]*
+    | /\*.*?\*/
+    | "(?:\\.|[^"\\\n])*"
+    | `include\s*(?:"([^"\n]+)"|<([^>\n]+)>)
+    ''', re.S | re.X)
+
+HDL_STRIP = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"', re.S)
+
+#   Design unit declarations and candidate references: instantiations
+#   ('name #(', 'name inst ('), package scopes ('pkg::'), interface typed
+#   ports and variables ('intf.mp port', 'intf port,'). References are a
+#   superset, only names declared in the source set are used
+#
+HDL_DECL = re.compile(r'''
+    \b(virtual\s+|extern\s+)?
+    (module|macromodule|interface|package|program|primitive|checker)\s+
+    (?:(?:static|automatic)\s+)?
+    ([a-zA-Z_]\w*)
+    ''', re.X)
+
+HDL_REF  = re.compile(r'''
+      \b([a-zA-Z_]\w*)\s*(?:\#\s*\(|::)
+    | \b([a-zA-Z_]\w*)(?:\.\w+)?\s+[a-zA-Z_]\w*\s*[\[(,;)=]
+    ''', re.X)
+
+#   Package scopes ('pkg::name', 'import pkg::*') give compile order, macros
+#   defined and used give compilation unit grouping
+#
+HDL_SCOPE  = re.compile(r'\b([a-zA-Z_]\w*)\s*::')
+HDL_DEFINE = re.compile(r'`define\s+([a-zA-Z_]\w*)')
+HDL_MACRO  = re.compile(r'`([a-zA-Z_]\w*)')
+
+HDL_DIRECTIVES = set('''
+    include define undef undefineall ifdef ifndef elsif else endif timescale
+    default_nettype resetall celldefine endcelldefine pragma line
+    begin_keywords end_keywords unconnected_drive nounconnected_drive
+    __FILE__ __LINE__
+    '''.split())
+
+def hdl_facts(text):
+    includes = []
+    if '`include' in text:
+        for m in HDL_TOKEN.finditer(text):
+            inc = m.group(1) or m.group(2)
+            if inc and inc not in includes:
+                includes.append(inc)
+
+    code = HDL_STRIP.sub(' ', text)
+    defs = []
+    pkgs = []
+    for m in HDL_DECL.finditer(code):
+        if not m.group(1) and m.group(3) not in defs:
+            defs.append(m.group(3))
+            if m.group(2) == 'package':
+                pkgs.append(m.group(3))
+
+    refs = set()
+    for m in HDL_REF.finditer(code):
+        refs.add(m.group(1) or m.group(2))
+
+    macros = []
+    used   = set()
+    if '`' in code:
+        macros = sorted(set(HDL_DEFINE.findall(code)))
+        used   = set(HDL_MACRO.findall(code)) - HDL_DIRECTIVES
+
+    return { 'inc'    : includes,
+             'defs'   : defs,
+             'refs'   : sorted(refs - set(defs)),
+             'pkgs'   : pkgs,
+             'scopes' : sorted(set(HDL_SCOPE.findall(code)) - set(pkgs)),
+             'macros' : macros,
+             'umacros': sorted(used - set(macros)) }
+
+#-------------------------------------------------------------------------------
+class HdlScanCache(object):
+
+    def __init__(self, path):
+        self.path   = path
+        self.files  = {}          # path -> [mtime_ns, size, digest]
+        self.facts  = {}          # digest -> facts
+        self.dirty  = False
+        self.lock   = threading.Lock()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == HDL_SCAN_VERSION:
+                self.files = data['files']
+                self.facts = data['facts']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def get(self, fn):
+        st  = os.stat(fn)
+        sig = [st.st_mtime_ns, st.st_size]
+        rec = self.files.get(fn)
+        if rec and rec[:2] == sig and rec[2] in self.facts:
+            return self.facts[rec[2]]
+
+        with open(fn, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        facts  = self.facts.get(digest)
+        if facts is None:
+            facts = hdl_facts(data.decode('utf8', errors='replace'))
+
+        with self.lock:
+            self.facts[digest] = facts
+            self.files[fn]     = sig + [digest]
+            self.dirty         = True
+        return facts
+
+    def digest(self, fn):
+        self.get(fn)
+        return self.files[fn][2]
+
+    def save(self):
+        if not self.dirty:
+            return
+        with self.lock:
+            live = set(rec[2] for rec in self.files.values())
+            data = { 'version' : HDL_SCAN_VERSION,
+                     'files'   : self.files,
+                     'facts'   : { d : f for d, f in self.facts.items() if d in live } }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + '.' + str(os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+#-------------------------------------------------------------------------------
+#
+#    Directory listing index: include 'a/b.svh' is found in 'dir' when 'b.svh'
+#    is listed in 'dir/a'. Listings are refreshed only when a lookup fails and
+#    directory mtime has changed (e.g. header generated during the build)
+#
+class DirIndex(object):
+
+    def __init__(self):
+        self.dirs  = {}           # dir -> (mtime_ns, names)
+        self.found = {}           # (include, dirs) -> path
+        self.lock  = threading.Lock()
+
+    def listing(self, d, refresh=False):
+        entry = self.dirs.get(d)
+        if entry is None or refresh:
+            try:
+                mtime = os.stat(d).st_mtime_ns
+            except OSError:
+                mtime = None
+            if entry is None or entry[0] != mtime:
+                names = set(os.listdir(d)) if mtime is not None else set()
+                entry = (mtime, names)
+                with self.lock:
+                    self.dirs[d] = entry
+        return entry[1]
+
+    def lookup(self, inc, dirs, refresh=False):
+        head, tail = os.path.split(inc)
+        for d in dirs:
+            d = os.path.normpath(os.path.join(d, head))
+            if tail in self.listing(d, refresh):
+                return os.path.join(d, tail)
+        return None
+
+    def resolve(self, inc, dirs):
+        if os.path.isabs(inc):
+            return inc if os.path.exists(inc) else None
+
+        key  = (inc, dirs)
+        path = self.found.get(key)
+        if path is None:
+            path = self.lookup(inc, dirs) or self.lookup(inc, dirs, refresh=True)
+            if path:
+                self.found[key] = path
+        return path
+
+#-------------------------------------------------------------------------------
+hdl_scan_caches = {}
+dir_index       = DirIndex()
+
+def get_hdl_scan_cache(env):
+    path  = os.path.abspath(env['HDL_SCAN_CACHE'])
+    cache = hdl_scan_caches.get(path)
+    if cache is None:
+        cache = HdlScanCache(path)
+        hdl_scan_caches[path] = cache
+    return cache
+
+def save_hdl_scan_caches():
+    for cache in hdl_scan_caches.values():
+        try:
+            cache.save()
+        except OSError:
+            pass
+
+atexit.register(save_hdl_scan_caches)
+
+#-------------------------------------------------------------------------------
+def hdl_includes(env, fn, path):
+    facts = get_hdl_scan_cache(env).get(fn)
+    dirs  = (os.path.dirname(fn),) + tuple(path)
+    res   = []
+    for inc in facts['inc']:
+        p = dir_index.resolve(inc, dirs)
+        if p:
+            res.append(p)
+    return res
+
+#-------------------------------------------------------------------------------
+#
+#    Design unit graph: files reachable from top units in dependency order
+#    (used units before users). Files declaring no design units are kept
+#    and placed first. Returns (files, pruned), or (files, []) when any top
+#    unit is not declared in the file set
+#
+HDL_GRAPH_SUFFIXES = ['v', 'sv']
+
+def hdl_reachable(env, files, tops, path):
+    cache = get_hdl_scan_cache(env)
+    owner = {}                # unit -> file
+    refs  = {}                # file -> referenced units
+    keep  = []
+    for fn in files:
+        if os.path.splitext(fn)[1][1:] not in HDL_GRAPH_SUFFIXES or not os.path.exists(fn):
+            keep.append(fn)
+            continue
+        facts = cache.get(fn)
+        if not facts['defs']:
+            keep.append(fn)
+        for d in facts['defs']:
+            owner.setdefault(d, fn)
+        r = list(facts['refs'])
+        for inc in hdl_includes(env, fn, path):       # references made in headers
+            r += cache.get(inc)['refs']
+        refs[fn] = r
+
+    missing = [t for t in tops if t not in owner]
+    if missing:
+        print_info('top unit(s) ' + ', '.join(missing) + ' not found in sources, no pruning')
+        return list(files), []
+
+    order = []
+    state = {}
+    for t in tops:
+        stack = [(owner[t], iter(refs[owner[t]]))]
+        state[owner[t]] = 'open'
+        while stack:
+            fn, it = stack[-1]
+            for r in it:
+                dep = owner.get(r)
+                if dep and dep not in state:
+                    state[dep] = 'open'
+                    stack.append((dep, iter(refs[dep])))
+                    break
+            else:
+                stack.pop()
+                state[fn] = 'done'
+                order.append(fn)
+
+    used   = keep + [fn for fn in order if fn not in keep]
+    pruned = [fn for fn in files if fn not in used]
+    return used, pruned
+
+#-------------------------------------------------------------------------------
+#
+#    Compilation units. Files using macros defined in other source files (not
+#    through own includes) are compiled together with them, as '-mfcu' does
+#    for the whole source list. Unit depends on units declaring packages it
+#    uses. Returns units in compile order: [{ 'files', 'incs', 'defs', 'deps' }],
+#    'deps' are indices of earlier units. Units on dependency cycle and their
+#    dependents are merged into one unit
+#
+def hdl_include_closure(env, fn, path):
+    res   = []
+    stack = [fn]
+    while stack:
+        for inc in hdl_includes(env, stack.pop(), path):
+            if inc != fn and inc not in res:
+                res.append(inc)
+                stack.append(inc)
+    return res
+
+def hdl_compile_units(env, files, path):
+    cache  = get_hdl_scan_cache(env)
+    info   = {}
+    macros = {}               # macro -> files defining it
+    pkgs   = {}               # package -> file
+    for fn in files:
+        incs = hdl_include_closure(env, fn, path)
+        f    = { 'incs' : incs, 'defs' : [], 'macros' : set(), 'umacros' : set(), 'scopes' : set() }
+        for c in [fn] + incs:
+            facts = cache.get(c)
+            f['defs'] += [d for d in facts['defs'] if d not in f['defs']]
+            for k in ('macros', 'umacros', 'scopes'):
+                f[k].update(facts[k])
+            for p in facts['pkgs']:
+                pkgs.setdefault(p, fn)
+        info[fn] = f
+        for m in f['macros']:
+            macros.setdefault(m, []).append(fn)
+
+    parent = { fn : fn for fn in files }
+    def root(fn):
+        while parent[fn] != fn:
+            parent[fn] = parent[parent[fn]]
+            fn         = parent[fn]
+        return fn
+
+    for fn in files:
+        for m in info[fn]['umacros'] - info[fn]['macros']:
+            for d in macros.get(m, []):
+                parent[root(d)] = root(fn)
+
+    groups = collections.OrderedDict()
+    for fn in files:
+        groups.setdefault(root(fn), []).append(fn)
+    units   = list(groups.values())
+    unit_of = { fn : i for i, u in enumerate(units) for fn in u }
+    deps    = []
+    for i, u in enumerate(units):
+        d = set()
+        for fn in u:
+            d.update(unit_of[pkgs[s]] for s in info[fn]['scopes'] if s in pkgs)
+        d.discard(i)
+        deps.append(d)
+
+    order   = []
+    done    = set()
+    pending = list(range(len(units)))
+    while pending:
+        ready = [i for i in pending if deps[i] <= done]
+        if not ready:
+            units.append([fn for fn in files if unit_of[fn] in pending])
+            deps.append(set().union(*[deps[i] for i in pending]) - set(pending))
+            done.update(pending)
+            ready = [len(units) - 1]
+            print_info('package dependency cycle, ' + str(len(units[-1])) + ' files compiled as one unit')
+        order += ready
+        done.update(ready)
+        pending = [i for i in pending if i not in done]
+
+    pos = { i : k for k, i in enumerate(order) }
+    res = []
+    for i in order:
+        incs = []
+        defs = []
+        for fn in units[i]:
+            incs += [c for c in info[fn]['incs'] if c not in incs]
+            defs += [d for d in info[fn]['defs'] if d not in defs]
+        res.append({ 'files' : units[i],
+                     'incs'  : incs,
+                     'defs'  : defs,
+                     'deps'  : sorted(pos[d] for d in deps[i]) })
+    return res
+
+#-------------------------------------------------------------------------------
+def prune_hdl(env, files, tops, path, report):
+    used, pruned = hdl_reachable(env, files, tops, tuple(os.path.abspath(p) for p in path))
+    os.makedirs(os.path.dirname(report), exist_ok=True)
+    with open(report, 'w') as f:
+        f.write('# top: ' + ' '.join(tops) + os.linesep)
+        for fn in pruned:
+            f.write(fn + os.linesep)
+    if pruned:
+        print_info('pruned ' + str(len(pruned)) + ' of ' + str(len(files)) + ' HDL files unreachable from ' +
+                   ', '.join(tops) + ', see ' + report)
+    return used
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,304 @@
+#*******************************************************************************
+#*
+#*    OOC IP output cache
+#*
+#*    Content-addressed store of complete IP output trees (IP_OOC_PATH/<ip>).
+#*    Entries are written to a temporary directory and renamed into place, so
+#*    concurrent writers never expose partial entries. Cache size is bounded
+#*    by LRU eviction, last use is tracked by mtime of entry metadata file.
+#*    In link mode files matching 'copy' patterns (files the tool rewrites in
+#*    place) are still restored as copies, so the cache entry is not changed.
+#*
+#*    Entries are path-independent: absolute paths of given roots (output
+#*    root, project root, tool installation) in text files are replaced by
+#*    placeholders on store and by roots of restoring build on restore, so
+#*    one entry serves any checkout and configuration directory.
+#*
+#*******************************************************************************
+
+import os
+import re
+import json
+import time
+import shutil
+import atexit
+import fnmatch
+import hashlib
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:                    # no POSIX file locks: eviction is not serialized
+    fcntl = None
+
+from utils import *
+
+#-------------------------------------------------------------------------------
+IP_CACHE_VERSION = 2
+IP_CACHE_META    = 'meta.json'
+IP_CACHE_STAMP   = '.ip_cache_key'          # restored tree marker
+IP_CACHE_TOKEN   = b'@@IP_CACHE:%s@@'       # root path placeholder
+IP_CACHE_PROBE   = 8192                     # NUL in first bytes: binary file, not relocated
+
+#-------------------------------------------------------------------------------
+def tree_size(path):
+    size = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for f in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, f)).st_size
+            except OSError:
+                pass
+    return size
+
+#-------------------------------------------------------------------------------
+#
+#    Root path is replaced when not followed by file name characters, i.e.
+#    '/a/prj' is not replaced in '/a/prj2'. Longer roots go first, roots may
+#    be nested
+#
+def relocate_tree(tree, paths):
+    subs = []
+    for name, path in sorted(paths.items(), key=lambda p: -len(p[1])):
+        pattern = re.compile(re.escape(path.encode('utf8')) + rb'(?![\w.\-])')
+        subs.append((pattern, IP_CACHE_TOKEN % name.encode('utf8')))
+
+    relocated = []
+    for dirpath, dirnames, filenames in os.walk(tree):
+        for f in filenames:
+            fn = os.path.join(dirpath, f)
+            if os.path.islink(fn):
+                continue
+            with open(fn, 'rb') as fd:
+                data = fd.read(IP_CACHE_PROBE)
+                if b'\0' in data:
+                    continue
+                data += fd.read()
+            text = data
+            for pattern, token in subs:
+                text = pattern.sub(lambda m: token, text)
+            if text != data:
+                with open(fn, 'wb') as fd:
+                    fd.write(text)
+                relocated.append(os.path.relpath(fn, tree))
+    return relocated
+
+def place_file(src, dst, paths):
+    with open(src, 'rb') as f:
+        data = f.read()
+    for name, path in paths.items():
+        data = data.replace(IP_CACHE_TOKEN % name.encode('utf8'), path.encode('utf8'))
+    with open(dst, 'wb') as f:
+        f.write(data)
+    shutil.copymode(src, dst)
+
+#-------------------------------------------------------------------------------
+class IpCache(object):
+
+    def __init__(self, root, max_size, link=False, copy=()):
+        self.root     = os.path.abspath(root)
+        self.max_size = max_size
+        self.link     = link
+        self.copy     = list(copy)
+        self.missed   = set()             # keys counted as misses in this run
+        self.hits     = 0
+        self.misses   = 0
+        self.stores   = 0
+        self.lock     = threading.Lock()
+        for d in ('data', 'tmp'):
+            os.makedirs(os.path.join(self.root, d), exist_ok=True)
+
+    #---------------------------------------------------------------
+    def entry(self, key):
+        return os.path.join(self.root, 'data', key[:2], key)
+
+    def locked(self):
+        f = open(os.path.join(self.root, 'lock'), 'a')
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        return f
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def miss(self, key):                  # create and synthesis lookups of one IP count once
+        with self.lock:
+            if key in self.missed:
+                return
+            self.missed.add(key)
+            self.misses += 1
+
+    def restore_file(self, src, dst):
+        if self.link and not any(fnmatch.fnmatch(os.path.basename(dst), p) for p in self.copy):
+            os.link(src, dst)
+        else:
+            shutil.copy2(src, dst)
+
+    #---------------------------------------------------------------
+    def restore(self, key, dst, paths=None):
+        paths = { k : v for k, v in (paths or {}).items() if v }
+        entry = self.entry(key)
+        meta  = os.path.join(entry, IP_CACHE_META)
+        tree  = os.path.join(entry, 'tree')
+        try:
+            with open(meta) as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            info = None
+        if info is None or not set(info.get('paths', [])) <= set(paths):
+            self.miss(key)
+            return False
+
+        relocated = set(info.get('relocated', []))
+        def restore_file(src, dst):
+            if os.path.relpath(src, tree) in relocated:
+                place_file(src, dst, paths)
+            else:
+                self.restore_file(src, dst)
+
+        if os.path.exists(dst):
+            shutil.rmtree(dst)
+        try:
+            shutil.copytree(tree, dst, symlinks=True, copy_function=restore_file)
+            os.utime(meta)                                      # LRU stamp
+        except OSError:                                         # evicted meanwhile
+            shutil.rmtree(dst, ignore_errors=True)
+            self.miss(key)
+            return False
+
+        with open(os.path.join(dst, IP_CACHE_STAMP), 'w') as f:
+            f.write(key)
+
+        self.count('hits')
+        return True
+
+    #---------------------------------------------------------------
+    def store(self, key, src, info=None, paths=None):
+        paths = { k : v for k, v in (paths or {}).items() if v }
+        entry = self.entry(key)
+        if os.path.exists(os.path.join(entry, IP_CACHE_META)):
+            return
+
+        tmp = tempfile.mkdtemp(prefix=key + '-', dir=os.path.join(self.root, 'tmp'))
+        try:
+            shutil.copytree(src, os.path.join(tmp, 'tree'), symlinks=True,
+                            ignore=shutil.ignore_patterns(IP_CACHE_STAMP))
+            meta = dict(info or {})
+            meta['key']       = key
+            meta['paths']     = sorted(paths)
+            meta['relocated'] = relocate_tree(os.path.join(tmp, 'tree'), paths)
+            meta['size']      = tree_size(tmp)
+            meta['created']   = time.time()
+            with open(os.path.join(tmp, IP_CACHE_META), 'w') as f:
+                json.dump(meta, f, indent=4)
+
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            try:
+                os.rename(tmp, entry)
+            except OSError:                                     # stored by concurrent writer
+                return
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.count('stores')
+        self.evict()
+
+    #---------------------------------------------------------------
+    def entries(self):
+        res  = []
+        data = os.path.join(self.root, 'data')
+        for d in os.listdir(data):
+            for key in os.listdir(os.path.join(data, d)):
+                meta = os.path.join(data, d, key, IP_CACHE_META)
+                try:
+                    with open(meta) as f:
+                        size = json.load(f)['size']
+                    res.append((os.stat(meta).st_mtime, size, key))
+                except (OSError, ValueError, KeyError):
+                    pass
+        return res
+
+    def evict(self):
+        lock = self.locked()
+        try:
+            entries = sorted(self.entries())
+            total   = sum(e[1] for e in entries)
+            for mtime, size, key in entries:
+                if total <= self.max_size:
+                    break
+                trash = tempfile.mkdtemp(prefix='evict-', dir=os.path.join(self.root, 'tmp'))
+                try:
+                    os.rename(self.entry(key), os.path.join(trash, key))
+                except OSError:
+                    pass
+                shutil.rmtree(trash, ignore_errors=True)
+                total -= size
+        finally:
+            lock.close()
+
+    #---------------------------------------------------------------
+    def update_stats(self):
+        lock = self.locked()
+        try:
+            path  = os.path.join(self.root, 'stats.json')
+            stats = { 'hits' : 0, 'misses' : 0, 'stores' : 0 }
+            if os.path.exists(path):
+                with open(path) as f:
+                    stats.update(json.load(f))
+            stats['hits']   += self.hits
+            stats['misses'] += self.misses
+            stats['stores'] += self.stores
+            with open(path, 'w') as f:
+                json.dump(stats, f, indent=4)
+        finally:
+            lock.close()
+        return stats
+
+    def stats(self):
+        entries = self.entries()
+        return { 'hits'    : self.hits,
+                 'misses'  : self.misses,
+                 'stores'  : self.stores,
+                 'entries' : len(entries),
+                 'size'    : sum(e[1] for e in entries) }
+
+#-------------------------------------------------------------------------------
+ip_caches = {}
+
+def get_ip_cache(env):
+    if not env.get('IP_CACHE_PATH'):
+        return None
+
+    root  = os.path.abspath(env['IP_CACHE_PATH'])
+    cache = ip_caches.get(root)
+    if cache is None:
+        cache = IpCache(root, int(env['IP_CACHE_SIZE']*1024**3), env['IP_CACHE_LINK'], env.get('IP_CACHE_COPY', ()))
+        ip_caches[root] = cache
+    return cache
+
+def ip_cache_summary():
+    for cache in ip_caches.values():
+        if cache.hits or cache.misses or cache.stores:
+            cache.update_stats()
+            print_info('IP cache: ' + str(cache.hits) + ' hits, ' + str(cache.misses) + ' misses, ' +
+                       str(cache.stores) + ' stored')
+
+atexit.register(ip_cache_summary)
+
+#-------------------------------------------------------------------------------
+def ip_cache_key(data):
+    data = dict(data, version=IP_CACHE_VERSION)
+    text = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode('utf8')).hexdigest()
+
+#-------------------------------------------------------------------------------
+def restored_key(path):
+    try:
+        with open(os.path.join(path, IP_CACHE_STAMP)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,389 @@
+#*******************************************************************************
+#*
+#*    IP core and project file metadata
+#*
+#*    Vivado rewrites .xci and .xpr files when it opens them (timestamps,
+#*    output directories, run state, WebTalk counters) while IP configuration
+#*    and project contents stay the same. Normalized signature of such file
+#*    is computed from semantically relevant content only: component
+#*    reference, instance name and parameters (including part) of IP core in
+#*    XML or JSON format, project file without volatile elements/attributes.
+#*
+#*    IP metadata index: facts of IP core files (type, version, part,
+#*    parameters, output products) are extracted once and persisted keyed by
+#*    file signature, queries do not re-read .xci files.
+#*
+#*******************************************************************************
+
+import os
+import json
+import hashlib
+import atexit
+import threading
+import xml.etree.ElementTree as ET
+
+import SCons.Node
+
+from utils import *
+
+#-------------------------------------------------------------------------------
+XCI_VOLATILE_PARAMS  = ['RUNTIME_PARAM.']         # XML 'referenceId' prefixes
+XCI_JSON_SECTIONS    = ['component_parameters', 'model_parameters', 'project_parameters']
+
+XPR_VOLATILE_OPTIONS = ['WT']                     # 'Option' names prefixes: WebTalk counters
+XPR_VOLATILE_ATTRS   = ['State']                  # run state
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def local_attrs(elem):
+    return { local_name(k) : v for k, v in elem.attrib.items() }
+
+def is_json(path):
+    with open(path, 'rb') as f:
+        return f.read(64).lstrip()[:1] == b'{'
+
+#-------------------------------------------------------------------------------
+#
+#    IP core: list of [kind, name, value] items
+#
+def xci_xml_items(path):
+    items = []
+    for event, elem in ET.iterparse(path):
+        name = local_name(elem.tag)
+        if name == 'componentRef':
+            a = local_attrs(elem)
+            items.append(['component', ':'.join(a.get(k, '') for k in ('vendor', 'library', 'name', 'version'))])
+        elif name == 'instanceName':
+            items.append(['instance', (elem.text or '').strip()])
+        elif name == 'configurableElementValue':
+            ref = local_attrs(elem).get('referenceId', '')
+            if not any(ref.startswith(p) for p in XCI_VOLATILE_PARAMS):
+                items.append(['param', ref, (elem.text or '').strip()])
+    return items
+
+def xci_json_items(path):
+    with open(path) as f:
+        inst = json.load(f).get('ip_inst', {})
+
+    items  = [['component', inst.get('component_reference', ''), inst.get('ip_revision', '')],
+              ['instance',  inst.get('xci_name', '')]]
+    params = inst.get('parameters', {})
+    for sect in XCI_JSON_SECTIONS:
+        for name, values in params.get(sect, {}).items():
+            if isinstance(values, list):
+                values = [v.get('value') if isinstance(v, dict) else v for v in values]
+            items.append([sect, name, values])
+    return items
+
+def xci_items(path):
+    return xci_json_items(path) if is_json(path) else xci_xml_items(path)
+
+#-------------------------------------------------------------------------------
+def xci_digest(path):
+    items = sorted(json.dumps(i) for i in xci_items(path))
+    return hashlib.sha1('\n'.join(items).encode('utf8')).hexdigest()
+
+#-------------------------------------------------------------------------------
+def xpr_digest(path):
+    h    = hashlib.sha1()
+    skip = 0
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            name = elem.attrib.get('Name', '')
+            if skip or (local_name(elem.tag) == 'Option' and
+                        any(name.startswith(p) for p in XPR_VOLATILE_OPTIONS)):
+                skip += 1
+                continue
+            attrs = sorted((k, v) for k, v in elem.attrib.items() if k not in XPR_VOLATILE_ATTRS)
+            h.update(json.dumps([elem.tag, attrs]).encode('utf8'))
+        elif skip:
+            skip -= 1
+        else:
+            h.update((elem.text or '').strip().encode('utf8') + b'\0')
+            elem.clear()
+    return h.hexdigest()
+
+#-------------------------------------------------------------------------------
+#
+#    Normalized digest, 'kind' is 'xci' or 'xpr'. Unparsable file falls back
+#    to plain content digest. Results are kept while mtime/size unchanged
+#
+NORMALIZERS = { 'xci' : xci_digest, 'xpr' : xpr_digest }
+
+normalized_digests = {}           # path -> (mtime_ns, size, digest)
+normalized_lock    = threading.Lock()
+
+def normalized_digest(path, kind):
+    st  = os.stat(path)
+    sig = (st.st_mtime_ns, st.st_size)
+    rec = normalized_digests.get(path)
+    if rec and rec[:2] == sig:
+        return rec[2]
+
+    try:
+        digest = NORMALIZERS[kind](path)
+    except (ET.ParseError, ValueError, AttributeError):
+        digest = file_digest(path)
+
+    with normalized_lock:
+        normalized_digests[path] = sig + (digest,)
+    return digest
+
+#-------------------------------------------------------------------------------
+#
+#    Normalized signatures of target dependencies are kept apart from SCons
+#    node info (.sconsign keeps plain content signatures). Digests seen during
+#    the build are committed only for targets built or found up to date
+#
+class NormalizedSigs(object):
+
+    def __init__(self, path):
+        self.path    = path
+        self.sigs    = {}         # target path -> { dependency path : digest }
+        self.pending = []         # (target node, dependency path, digest)
+        self.lock    = threading.Lock()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == IP_META_VERSION:
+                self.sigs = data['sigs']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def get(self, target, dep):
+        return self.sigs.get(target.abspath, {}).get(dep.abspath)
+
+    def record(self, target, dep, digest):
+        with self.lock:
+            self.pending.append((target, dep.abspath, digest))
+
+    def save(self):
+        if not self.pending or GetOption('no_exec'):
+            return
+        done = (SCons.Node.executed, SCons.Node.up_to_date)
+        with self.lock:
+            for target, dep, digest in self.pending:
+                if target.get_state() in done:
+                    self.sigs.setdefault(target.abspath, {})[dep] = digest
+            self.pending = []
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + '.' + str(os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump({ 'version' : IP_META_VERSION, 'sigs' : self.sigs }, f)
+            os.replace(tmp, self.path)
+
+normalized_sigs = {}
+
+def get_normalized_sigs(env):
+    path = os.path.abspath(env['NORMALIZED_SIGS'])
+    sigs = normalized_sigs.get(path)
+    if sigs is None:
+        sigs = NormalizedSigs(path)
+        normalized_sigs[path] = sigs
+    return sigs
+
+def save_normalized_sigs():
+    for sigs in normalized_sigs.values():
+        try:
+            sigs.save()
+        except OSError:
+            pass
+
+atexit.register(save_normalized_sigs)
+
+#-------------------------------------------------------------------------------
+#
+#    IP core facts. XML is parsed as stream of elements, JSON format has
+#    no streaming parser in stdlib and is loaded as a whole (small files)
+#
+IP_META_VERSION = 1
+
+def xci_part(project):
+    if project.get('PART'):
+        return project['PART']
+    return ''.join(project.get(k, '') for k in ('DEVICE', 'PACKAGE', 'SPEEDGRADE'))
+
+def xci_xml_meta(path):
+    meta    = { 'format' : 'xml', 'params' : {} }
+    project = {}
+    for event, elem in ET.iterparse(path):
+        name = local_name(elem.tag)
+        if name == 'componentRef':
+            a = local_attrs(elem)
+            for k in ('vendor', 'library', 'version'):
+                meta[k] = a.get(k, '')
+            meta['type'] = a.get('name', '')
+        elif name == 'instanceName':
+            meta['name'] = (elem.text or '').strip()
+        elif name == 'configurableElementValue':
+            ref   = local_attrs(elem).get('referenceId', '')
+            value = (elem.text or '').strip()
+            kind, _, param = ref.partition('.')
+            if kind == 'PARAM_VALUE':
+                meta['params'][param] = value
+            elif kind == 'PROJECT_PARAM':
+                project[param] = value
+            elif ref == 'RUNTIME_PARAM.IPREVISION':
+                meta['revision'] = value
+        elem.clear()
+
+    meta['part'] = xci_part(project)
+    return meta
+
+def xci_json_meta(path):
+    with open(path) as f:
+        inst = json.load(f).get('ip_inst', {})
+
+    def values(sect):
+        res = {}
+        for name, v in inst.get('parameters', {}).get(sect, {}).items():
+            if isinstance(v, list) and v:
+                v = v[0].get('value') if isinstance(v[0], dict) else v[0]
+            res[name] = str(v)
+        return res
+
+    ref  = inst.get('component_reference', '').split(':')
+    ref += [''] * (4 - len(ref))
+    return { 'format'   : 'json',
+             'name'     : inst.get('xci_name', ''),
+             'vendor'   : ref[0],
+             'library'  : ref[1],
+             'type'     : ref[2],
+             'version'  : ref[3],
+             'revision' : inst.get('ip_revision', ''),
+             'part'     : xci_part(values('project_parameters')),
+             'params'   : values('component_parameters') }
+
+#-------------------------------------------------------------------------------
+#
+#    Output products: files and directories generated next to IP core file
+#
+def xci_outputs(path):
+    d = os.path.dirname(path)
+    try:
+        return sorted(n for n in os.listdir(d) if n != os.path.basename(path))
+    except OSError:
+        return []
+
+def xci_meta(path):
+    meta = xci_json_meta(path) if is_json(path) else xci_xml_meta(path)
+    meta.setdefault('name', drop_suffix(os.path.basename(path)))
+    meta['path']    = path
+    meta['outputs'] = xci_outputs(path)
+    return meta
+
+#-------------------------------------------------------------------------------
+#
+#    Index entry is valid while IP core file mtime/size and its directory
+#    mtime (output products set) are unchanged
+#
+class IpIndex(object):
+
+    def __init__(self, path):
+        self.path    = path
+        self.entries = {}         # xci path -> { 'sig' : [...], 'meta' : {...} }
+        self.dirty   = False
+        self.lock    = threading.Lock()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == IP_META_VERSION:
+                self.entries = data['entries']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def signature(self, path):
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size, os.stat(os.path.dirname(path)).st_mtime_ns]
+
+    #---------------------------------------------------------------
+    def get(self, path):
+        path = os.path.abspath(path)
+        try:
+            sig = self.signature(path)
+        except OSError:
+            return None
+        entry = self.entries.get(path)
+        if entry and entry['sig'] == sig:
+            return entry['meta']
+
+        try:
+            meta = xci_meta(path)
+        except (ET.ParseError, ValueError, OSError) as e:
+            print_error('E: IP core file ' + path + ' parse error: ' + str(e))
+            return None
+
+        with self.lock:
+            self.entries[path] = { 'sig' : sig, 'meta' : meta }
+            self.dirty         = True
+        return meta
+
+    #---------------------------------------------------------------
+    #
+    #    IP cores found under 'root' ('IP_OOC_PATH/<ip>/<ip>/<ip>.xci'),
+    #    filtered by meta fields: query(root, type='fifo_generator')
+    #    Filter value may be a predicate: query(root, part=lambda p: ...)
+    #
+    def scan(self, root, suffix='xci'):
+        res = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(('_', '.'))]
+            for fn in filenames:
+                if fn.endswith('.' + suffix):
+                    meta = self.get(os.path.join(dirpath, fn))
+                    if meta:
+                        res.append(meta)
+        return sorted(res, key=lambda m: m['path'])
+
+    def query(self, root, **filters):
+        res = []
+        for meta in self.scan(root):
+            ok = True
+            for k, v in filters.items():
+                value = meta.get(k)
+                if not (v(value) if callable(v) else value == v):
+                    ok = False
+                    break
+            if ok:
+                res.append(meta)
+        return res
+
+    #---------------------------------------------------------------
+    def save(self):
+        if not self.dirty:
+            return
+        with self.lock:
+            live = { p : e for p, e in self.entries.items() if os.path.exists(p) }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + '.' + str(os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump({ 'version' : IP_META_VERSION, 'entries' : live }, f)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+#-------------------------------------------------------------------------------
+ip_indices = {}
+
+def get_ip_index(env):
+    path  = os.path.abspath(env['IP_INDEX'])
+    index = ip_indices.get(path)
+    if index is None:
+        index = IpIndex(path)
+        ip_indices[path] = index
+    return index
+
+def save_ip_indices():
+    for index in ip_indices.values():
+        try:
+            index.save()
+        except OSError:
+            pass
+
+atexit.register(save_ip_indices)
+
+#-------------------------------------------------------------------------------
+def ip_query(env, **filters):
+    return get_ip_index(env).query(env['IP_OOC_PATH'], **filters)
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,240 @@
+#*******************************************************************************
+#*
+#*    Tool progress monitor
+#*
+#*    Analyzes tool output stream line by line: recognizes Vivado commands
+#*    ('Command: place_design'), top-level phases ('Phase 3 Detail Placement')
+#*    and synthesis steps ('Start Technology Mapping'), prints per-job status
+#*    line on each phase change. Phase offsets of the last successful run of
+#*    the same target are kept in history file and give ETA for the next one.
+#*
+#*    Runs started by 'launch_runs' (project mode) write their phases to
+#*    '<run dir>/runme.log' instead of the launcher output, such logs are
+#*    followed while the launcher runs and fed to the same monitor.
+#*
+#*******************************************************************************
+
+import os
+import json
+import time
+import atexit
+import threading
+
+from utils import *
+
+#-------------------------------------------------------------------------------
+PROGRESS_PATTERNS = [
+    ('cmd',   re.compile(r'^Command: (\w+)')),
+    ('phase', re.compile(r'^Phase (\d+) (\S.*?)\s*$')),
+    ('start', re.compile(r'^Start (\w.*?)\s*$'))
+]
+
+def fmt_time(t):
+    t = int(t)
+    return '%d:%02d:%02d' % (t//3600, t//60 % 60, t % 60)
+
+#-------------------------------------------------------------------------------
+class ProgressHistory(object):
+
+    def __init__(self, path):
+        self.path  = path
+        self.runs  = {}
+        self.dirty = False
+        self.lock  = threading.Lock()
+        try:
+            with open(path) as f:
+                self.runs = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def get(self, key):
+        return self.runs.get(key)
+
+    def record(self, key, run):
+        with self.lock:
+            self.runs[key] = run
+            self.dirty     = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + '.' + str(os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(self.runs, f, indent=1)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+progress_histories = {}
+
+def get_progress_history(path):
+    path    = os.path.abspath(path)
+    history = progress_histories.get(path)
+    if history is None:
+        history = ProgressHistory(path)
+        progress_histories[path] = history
+    return history
+
+def save_progress_histories():
+    for history in progress_histories.values():
+        try:
+            history.save()
+        except OSError:
+            pass
+
+atexit.register(save_progress_histories)
+
+#-------------------------------------------------------------------------------
+class PhaseMonitor(object):
+
+    def __init__(self, job, key, history, interval=60):
+        self.job         = job
+        self.key         = key
+        self.history     = history
+        self.interval    = interval
+        self.prev        = history.get(key)
+        self.start       = time.time()
+        self.last_status = self.start
+        self.cmd         = ''
+        self.phase       = None
+        self.phase_start = self.start
+        self.phases      = []                  # [name, offset]
+        self.seen        = {}
+        self.lock        = threading.Lock()    # launcher output and run logs
+
+    #---------------------------------------------------------------
+    def line(self, text):
+        with self.lock:
+            self.parse(text)
+
+    def parse(self, text):
+        for kind, pattern in PROGRESS_PATTERNS:
+            m = pattern.match(text)
+            if not m:
+                continue
+            if kind == 'cmd':
+                self.cmd = m.group(1)
+                self.enter(self.cmd)
+            elif kind == 'phase':
+                self.enter(self.cmd + ': Phase ' + m.group(1) + ' ' + m.group(2))
+            else:
+                self.enter(self.cmd + ': ' + m.group(1))
+            return
+
+        if self.interval and time.time() - self.last_status > self.interval:
+            self.status()
+
+    def enter(self, name):
+        now = time.time()
+        n   = self.seen.get(name, 0) + 1
+        self.seen[name] = n
+        if n > 1:
+            name += ' #' + str(n)
+
+        prev, prev_elapsed = self.phase, now - self.phase_start
+        self.phase       = name
+        self.phase_start = now
+        self.phases.append([name, round(now - self.start, 1)])
+        self.status(prev, prev_elapsed)
+
+    #---------------------------------------------------------------
+    def eta(self):
+        if not self.prev:
+            return None
+        now     = time.time()
+        offsets = dict(self.prev['phases'])
+        if self.phase in offsets:
+            remaining = self.prev['total'] - offsets[self.phase] - (now - self.phase_start)
+        else:
+            remaining = self.prev['total'] - (now - self.start)
+        return max(remaining, 0)
+
+    def status(self, prev=None, prev_elapsed=0):
+        self.last_status = time.time()
+        text  = '[' + self.job + '] ' + fmt_time(self.last_status - self.start) + ' '
+        text += (self.phase or 'starting')
+        if prev:
+            text += ' (previous phase ' + fmt_time(prev_elapsed) + ')'
+        eta = self.eta()
+        if eta is not None:
+            text += ', ETA ' + fmt_time(eta)
+        with console_lock:
+            print_info(text)
+
+    #---------------------------------------------------------------
+    def save(self):
+        self.history.record(self.key, { 'phases' : self.phases,
+                                        'total'  : round(time.time() - self.start, 1) })
+
+#-------------------------------------------------------------------------------
+#
+#    Follows log files and passes complete lines to 'line' callback. Log file
+#    left by previous run (same inode, size and mtime as at start) is skipped,
+#    log recreated or truncated by 'reset_run' is read from the beginning
+#
+class LogTail(object):
+
+    def __init__(self, paths, line, interval=1.0):
+        self.paths    = paths
+        self.line     = line
+        self.interval = interval
+        self.logs     = {}                     # path -> [file, inode, partial line]
+        self.stale    = {}
+        for path in paths:
+            try:
+                self.stale[path] = self.signature(os.stat(path))
+            except OSError:
+                pass
+        self.done   = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def signature(self, st):
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    #---------------------------------------------------------------
+    def poll(self):
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            log = self.logs.get(path)
+            if log and (log[1] != st.st_ino or st.st_size < log[0].tell()):
+                log[0].close()
+                log = None
+            if log is None:
+                if self.stale.get(path) == self.signature(st):
+                    continue
+                try:
+                    log = [open(path, 'rb'), st.st_ino, b'']
+                except OSError:
+                    continue
+                self.stale.pop(path, None)
+                self.logs[path] = log
+
+            lines  = (log[2] + log[0].read()).split(b'\n')
+            log[2] = lines.pop()
+            for l in lines:
+                self.line(l.decode('utf8', errors='replace').rstrip('\r'))
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.poll()
+
+    #---------------------------------------------------------------
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.done.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.poll()
+        for log in self.logs.values():
+            log[0].close()
+        self.logs = {}
+
+#-------------------------------------------------------------------------------
+
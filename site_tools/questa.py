@@ -8,11 +8,20 @@
 
 import os
 import re
+import json
+import hashlib
 
 import SCons.Builder
 import SCons.Scanner
 
 from utils import *
+from tcl_session import *
+from hdl_scan import *
+from ip_meta import *
+
+#-------------------------------------------------------------------------------
+QUESTA_ENV = { 'QUESTABIN' : 'point to "bin" directory',
+               'QUESTASIM' : 'point to "vsim" executable' }
 
 #-------------------------------------------------------------------------------
 #
@@ -31,12 +40,9 @@ def ip_simlib_script(target, source, env):
     print_action('generate script:           \'' + trg.name + '\'')
     
     # IP type
-    pattern = 'componentRef\s+.+spirit\:name=\"(\w+)\"'
-    with open(src_path) as f:
-        contents = f.read()
-    res = re.search(pattern, contents)
-    if res:
-        ip_type = res.groups()[0]
+    meta = get_ip_index(env).get(src_path)
+    if meta and meta.get('type'):
+        ip_type = meta['type']
     else:
         print('E: IP type not found in IP core file (xci)')
         return -1
@@ -53,8 +59,13 @@ def ip_simlib_script(target, source, env):
     'IP core "' + ip_name + '" simulation library compile script' + os.linesep*2 + \
     'This file is automatically generated. Do not edit the file manually.'
     
+    if env['IP_SIMLIB_PER_IP']:
+        work = ip_simlib_lib(env, ip_name)[1]
+    else:
+        work = env['IP_SIMLIB_NAME']
+
     text  = 'onerror {quit -f -code 255}' + os.linesep*2
-    text += 'vlog -work ipsimlib' + env['VLOG_FLAGS'] + env['VLOG_OPTIMIZATION'] + ' \\' + os.linesep
+    text += 'vlog -work ' + work + env['VLOG_FLAGS'] + env['VLOG_OPTIMIZATION'] + ' \\' + os.linesep
     for i in src_sim:
         text += ' '*4 + i.replace('${ip_name}', ip_name) + ' \\' + os.linesep
     
@@ -70,52 +81,156 @@ def ip_simlib_script(target, source, env):
     return None
 
 #-------------------------------------------------------------------------------
+@tool_action(QUESTA_ENV)
 def ip_simlib(target, source, env):
 
     trg = target[0]
 
-    trg_path = str(trg)
+    trg_path = os.path.abspath(str(trg))
     trg_dir  = str(trg.dir)
           
     print_action('compile library:           \'' + trg.name + '\'')
+
+    if env['IP_SIMLIB_PER_IP']:
+        return ip_simlib_per_ip(target, source, env)
     
-    if not os.path.exists(trg_path):
-        rcode = pexec(env['VLIBCOM'] + ' ' + trg.name, trg_dir)
+    if not os.path.exists(os.path.join(trg_path, '_info')):
+        if os.path.exists(trg_path):                     # left by per-IP mode
+            Execute( Delete(trg_path) )
+
+        rcode = tool_exec(env, env['VLIBCOM'] + ' ' + trg.name, trg_dir)
         if rcode: return rcode
         
-        rcode = pexec(env['VMAPCOM'] + ' -c', trg_dir)
+        rcode = tool_exec(env, env['VMAPCOM'] + ' -c', trg_dir)
         if rcode: return rcode
 
         cmd = []
         cmd.append(env['VMAPCOM'])
         cmd.append(trg.name)
-        cmd.append(os.path.abspath(trg_path))
+        cmd.append(trg_path)
         cmd = ' '.join(cmd)
 
         if env['VERBOSE']:
           print(cmd)
         
-        rcode = pexec(cmd, trg_dir)
+        rcode = tool_exec(env, cmd, trg_dir)
         if rcode: return rcode
-                            
-    for src in source:
-        cmd = []
-        cmd.append(env['VSIMCOM'])
-        cmd.append(' -batch')
-        cmd.append(' -do ' + os.path.abspath(str(src)))
-        cmd = ' '.join(cmd)
-        
-        ip_name = src.name.replace('-ipsim.'+env['SIM_SCRIPT_SUFFIX'], '')
+
+    manifest = read_lib_manifest(trg_path)
+    ips      = [ip_sim_name(env, src) for src in source]
+
+    # IPs removed from the list
+    for ip_name in [i for i in manifest if i not in ips]:
+        entry = manifest.pop(ip_name)
+        rcode = delete_lib_units(env, trg_path, entry['units'], manifest_units(manifest))
+        if rcode: return rcode
+        print_info('simlib ' + ip_name + ': removed')
+    write_lib_manifest(trg_path, manifest)
+
+    done = 0
+    for ip_name, src in zip(ips, source):
+        sig, srcs = ip_sim_signature(env, src)
+        prev      = manifest.get(ip_name)
+        if prev and prev['sig'] == sig:
+            done += 1
+            continue
+
         print('-'*80)
         print(' '*8, 'Compile', '\'' + ip_name + '\'', 'modules for simlib')
-        rcode = pexec(cmd, env['IP_OOC_PATH'])
+        logfile = drop_suffix(os.path.abspath(str(src))) + '.log'
+        rcode   = run_vsim(env, str(src), env['IP_OOC_PATH'], 'simlib ' + ip_name, logfile, 'questa_compile')
         print('-'*80)
         if rcode: 
+            manifest.pop(ip_name, None)
+            write_lib_manifest(trg_path, manifest)
             Execute( Delete(src) )        
             return rcode
+
+        manifest[ip_name] = { 'sig' : sig, 'units' : ip_sim_units(env, srcs) }
+        if prev:
+            stale = [u for u in prev['units'] if u not in manifest[ip_name]['units']]
+            rcode = delete_lib_units(env, trg_path, stale, manifest_units(manifest))
+            if rcode: return rcode
+        write_lib_manifest(trg_path, manifest)
+
+    if done:
+        print_info(str(done) + ' of ' + str(len(ips)) + ' IP simulation libraries up to date')
+
+    write_lib_map(ip_simlib_map_path(env), [(trg.name, trg_path)])
         
     return None
+
 #-------------------------------------------------------------------------------
+#
+#    Each IP is compiled into its own library '<IP_SIMLIB_PATH>/<ip>' by
+#    IP_SIMLIB_JOBS workers, first failure cancels the rest. Library mapping
+#    file '<IP_SIMLIB_PATH>.ini' lists libraries in source order
+#
+def ip_simlib_per_ip(target, source, env):
+
+    trg_path = os.path.abspath(str(target[0]))
+
+    if os.path.exists(os.path.join(trg_path, '_info')):  # shared library
+        Execute( Delete(trg_path) )
+    os.makedirs(trg_path, exist_ok=True)
+
+    manifest = read_lib_manifest(trg_path)
+    ips      = [ip_sim_name(env, src) for src in source]
+
+    # IPs removed from the list
+    for ip_name in [i for i in manifest if i not in ips]:
+        del manifest[ip_name]
+        Execute( Delete(ip_simlib_lib(env, ip_name)[1]) )
+    write_lib_manifest(trg_path, manifest)
+
+    stale = []
+    for ip_name, src in zip(ips, source):
+        sig, srcs = ip_sim_signature(env, src)
+        prev      = manifest.get(ip_name)
+        if prev and prev['sig'] == sig and os.path.exists(os.path.join(ip_simlib_lib(env, ip_name)[1], '_info')):
+            continue
+        manifest.pop(ip_name, None)
+        stale.append((ip_name, src, sig, srcs))
+
+    jobs = env['IP_SIMLIB_JOBS'] if env['IP_SIMLIB_JOBS'] else GetOption('num_jobs')
+    penv = env
+    if jobs > 1 and env['TOOL_OUTPUT_MODE'] == 'auto':
+        penv = env.Override({ 'TOOL_OUTPUT_MODE' : 'prefix' })
+
+    def task(ip_name, src):
+        def run(cancel):
+            lib_path = ip_simlib_lib(env, ip_name)[1]
+            if not os.path.exists(os.path.join(lib_path, '_info')):
+                rcode = tool_exec(penv, env['VLIBCOM'] + ' ' + lib_path, trg_path, 'vlib ' + ip_name, cancel=cancel)
+                if rcode: return rcode
+            logfile = drop_suffix(os.path.abspath(str(src))) + '.log'
+            return run_vsim(penv, str(src), env['IP_OOC_PATH'], 'simlib ' + ip_name, logfile, 'questa_compile', cancel)
+        return run
+
+    print_info('compile ' + str(len(stale)) + ' of ' + str(len(ips)) + ' IP simulation libraries, ' +
+               str(max(1, min(jobs, len(stale)))) + ' workers')
+    results, failed = run_parallel([task(ip_name, src) for ip_name, src, sig, srcs in stale], jobs)
+
+    for (ip_name, src, sig, srcs), rcode in zip(stale, results):
+        if rcode is None:
+            print_info('simlib ' + ip_name + ': skipped')
+        elif not rcode:
+            manifest[ip_name] = { 'sig' : sig, 'units' : ip_sim_units(env, srcs) }
+    write_lib_manifest(trg_path, manifest)
+
+    if failed is not None:
+        ip_name, src = stale[failed][:2]
+        print_error('E: IP \'' + ip_name + '\' simulation library compile failed, see ' +
+                    drop_suffix(os.path.abspath(str(src))) + '.log')
+        Execute( Delete(src) )
+        return results[failed]
+
+    write_lib_map(ip_simlib_map_path(env), [ip_simlib_lib(env, ip_name) for ip_name in ips])
+
+    return None
+
+#-------------------------------------------------------------------------------
+@tool_action(QUESTA_ENV)
 def work_lib(target, source, env):
     
     trg      = target[0]
@@ -127,10 +242,10 @@ def work_lib(target, source, env):
     #   Create work library
     #
     if not os.path.exists(trg_path):
-        rcode = pexec(env['VLIBCOM'] + ' ' + trg.name, trg_dir)   # create lib
+        rcode = tool_exec(env, env['VLIBCOM'] + ' ' + trg.name, trg_dir)   # create lib
         if rcode: return rcode
 
-        rcode = pexec(env['VMAPCOM'] + ' -c', trg_dir)            # copy modelsim.ini from queta
+        rcode = tool_exec(env, env['VMAPCOM'] + ' -c', trg_dir)            # copy modelsim.ini from queta
         if rcode: return rcode
     
         # map IP simulation library
@@ -143,7 +258,7 @@ def work_lib(target, source, env):
         if env['VERBOSE']:
           print(cmd)
         
-        rcode = pexec(cmd, trg_dir)                               # map logical name to physical lib
+        rcode = tool_exec(env, cmd, trg_dir)                      # map logical name to physical lib
         if rcode: return rcode
         
         # map work library      
@@ -156,20 +271,39 @@ def work_lib(target, source, env):
         if env['VERBOSE']:
             print(cmd)
         
-        rcode = pexec(cmd, trg_dir)                               # map logical name to physical lib
+        rcode = tool_exec(env, cmd, trg_dir)                      # map logical name to physical lib
         if rcode: return rcode
              
     
+    ip_libs = []
+    if env['IP_SIMLIB_PER_IP']:
+        ip_libs = read_lib_map(ip_simlib_map_path(env))
+        mapped  = dict(read_lib_map(os.path.join(trg_dir, 'modelsim.ini')))
+        for lib_name, lib_path in ip_libs:
+            if mapped.get(lib_name) != lib_path:
+                cmd = env['VMAPCOM'] + ' ' + lib_name + ' ' + lib_path
+                if env['VERBOSE']:
+                    print(cmd)
+                rcode = tool_exec(env, cmd, trg_dir)
+                if rcode: return rcode
+
     #-----------------------------------------------------------------
     #
     #   Create handoff file
     #
+    src_list = [f.abspath for f in source]
+    if env['HDL_PRUNE']:
+        incdirs  = [os.path.dirname(f) for f in src_list] + [env['CFG_PATH']] + Split(env['SIM_INC_PATH'])
+        report   = os.path.join(trg_dir, env['TESTBENCH_NAME'] + '-pruned.txt')
+        src_list = prune_hdl(env, src_list, [env['TESTBENCH_NAME']] + env['HDL_EXTRA_TOPS'], incdirs, report)
+
     if 'vivado' in env['TOOLS']:
         glbl_path = File(os.path.join(env['XILINX_VIVADO'], 'data/verilog/src/glbl.v'))
-        source.append(glbl_path)
+        src_list.append(glbl_path.abspath)
         
-    src_list = ' '.join(['{' + os.path.join(f.abspath) + '}' for f in source])
-    incpath  = ' '.join(env['SIM_INC_PATH'])
+    src_files = src_list
+    src_list  = ' '.join(['{' + f + '}' for f in src_files])
+    incpath   = ' '.join(env['SIM_INC_PATH'])
     
     out = ''
 
@@ -181,6 +315,7 @@ def work_lib(target, source, env):
     out += 'set VLOG_FLAGS {' + env['VLOG_FLAGS'] + '}'       + os.linesep
     out += 'set VOPT_FLAGS {' + env['VOPT_FLAGS'] + '}'       + os.linesep
     out += 'set VSIM_FLAGS {' + env['VSIM_FLAGS'] + '}'       + os.linesep
+    out += 'set IP_LIBS {'    + ' '.join(lib for lib, path in ip_libs) + '}' + os.linesep
     
     handoff_path = os.path.join( str(trg.dir), 'handoff.do')
     with open(handoff_path, 'w') as ofile:
@@ -190,16 +325,23 @@ def work_lib(target, source, env):
     #
     #   Compile work library
     #
-    cmd  = env['VSIMCOM'] + ' -c'
-    cmd += ' -do ' + env['SIM_CMD_SCRIPT']
-    cmd += ' -do c'             
-    cmd += ' -do exit'          
-
-    #print(cmd)
     msg = colorize('Compile project work library', 'yellow')
     print(colorize('-'*80, 'yellow'))
     print(' '*20, msg, os.linesep)
-    rcode = pexec(cmd, trg_dir)
+    logfile = os.path.join(trg_dir, 'compile.log')
+    if env['SIM_INCREMENTAL']:
+        rcode = work_lib_units(env, trg, src_files, ip_libs)
+    elif env['VSIM_SERVER']:
+        script_path = os.path.join(trg_dir, 'compile.do')
+        with open(script_path, 'w') as ofile:
+            ofile.write('do {' + sim_cmd_script(env) + '}' + os.linesep + 'c' + os.linesep)
+        rcode = run_vsim(env, script_path, trg_dir, 'compile ' + trg.name, logfile, 'questa_compile')
+    else:
+        cmd  = env['VSIMCOM'] + ' -c'
+        cmd += ' -do ' + sim_cmd_script(env)
+        cmd += ' -do c'             
+        cmd += ' -do exit'          
+        rcode = tool_exec(env, cmd, trg_dir, 'compile ' + trg.name, logfile, 'questa_compile')
     print(colorize('-'*80, 'yellow'))
     if rcode:
         return rcode
@@ -207,25 +349,285 @@ def work_lib(target, source, env):
     return None
 
 #-------------------------------------------------------------------------------
+#
+#    Incremental work library compile. Sources are split into compilation
+#    units (see hdl_compile_units), unit signature covers its files, included
+#    files, vlog command and signatures of units it depends on, so package
+#    change recompiles its users. Stale units are compiled in dependency
+#    order, one vlog run per unit: vlog runs into the same library contend for
+#    its lock and '-mfcu' run of several units shares macros and timescale
+#    between them. Other libraries (IP, see ip_simlib) are built by parallel
+#    SCons jobs meanwhile. Then design is optimized. Design units no longer
+#    declared in sources are deleted. SIM_COMPILE_JOBS (parallel vlog runs)
+#    is deprecated and ignored
+#
+def work_lib_units(env, trg, src_files, ip_libs):
+
+    trg_path = os.path.abspath(str(trg))
+    trg_dir  = str(trg.dir)
+    log_dir  = os.path.join(trg_dir, 'vlog')
+    incdirs  = [os.path.dirname(f) for f in src_files] + [env['CFG_PATH']] + Split(env['SIM_INC_PATH'])
+    incdirs  = sorted(set(os.path.abspath(d) for d in incdirs))
+    vlog     = env['VLOGCOM'] + ' -work ' + trg.name + ' +incdir+' + '+'.join(incdirs) + env['VLOG_FLAGS']
+    units    = hdl_compile_units(env, src_files, tuple(incdirs))
+    cache    = get_hdl_scan_cache(env)
+    manifest = read_lib_manifest(trg_path)
+    entries  = manifest.get('units', {})
+
+    keys = [u['files'][0] for u in units]
+    sigs = []
+    for u in units:
+        h = hashlib.sha1(vlog.encode('utf8'))
+        for fn in u['files'] + u['incs']:
+            h.update((fn + ':' + cache.digest(fn)).encode('utf8'))
+        for d in u['deps']:
+            h.update(sigs[d].encode('utf8'))
+        sigs.append(h.hexdigest())
+
+    # design units of removed sources
+    keep    = set(d for u in units for d in u['defs'])
+    gone    = sorted(manifest_units(entries) - keep)
+    entries = { k : e for k, e in entries.items() if k in keys }
+    rcode   = delete_lib_units(env, trg_path, gone, keep)
+    if rcode: return rcode
+
+    stale = [i for i, k in enumerate(keys) if k not in entries or entries[k]['sig'] != sigs[i]]
+    for i in stale:
+        entries.pop(keys[i], None)
+
+    manifest['units'] = entries
+    write_lib_manifest(trg_path, manifest)
+
+    if env.get('SIM_COMPILE_JOBS'):
+        print_info('W: SIM_COMPILE_JOBS is deprecated and ignored, work library units are compiled one at a time')
+    print_info('compile ' + str(len(stale)) + ' of ' + str(len(units)) + ' compilation units')
+    os.makedirs(log_dir, exist_ok=True)
+    for i in stale:                                          # units are in dependency order
+        name    = os.path.basename(keys[i])
+        logfile = os.path.join(log_dir, name + '.log')
+        rcode   = tool_exec(env, vlog + ' ' + ' '.join(units[i]['files']), trg_dir, 'vlog ' + name,
+                            logfile, 'questa_compile')
+        if rcode:
+            print_error('E: compile of \'' + keys[i] + '\' failed, see ' + logfile)
+            return rcode
+        entries[keys[i]] = { 'sig' : sigs[i], 'files' : units[i]['files'], 'units' : units[i]['defs'] }
+        write_lib_manifest(trg_path, manifest)
+
+    # optimized design
+    tb   = env['TESTBENCH_NAME']
+    vopt = env['VOPTCOM'] + ' -work ' + trg.name + ''.join(' -L ' + lib for lib, path in ip_libs) + \
+           ' +acc' + env['VOPT_FLAGS'] + ' ' + tb + ' -o opt_' + tb
+    osig = hashlib.sha1((vopt + ' '.join(sigs)).encode('utf8')).hexdigest()
+    if stale or manifest.get('opt') != osig:
+        manifest['opt'] = None
+        write_lib_manifest(trg_path, manifest)
+        rcode = tool_exec(env, vopt, trg_dir, 'vopt ' + tb, os.path.join(trg_dir, 'compile.log'), 'questa_compile')
+        if rcode: return rcode
+        manifest['opt'] = osig
+        write_lib_manifest(trg_path, manifest)
+
+    return None
+
+#-------------------------------------------------------------------------------
+@tool_action(QUESTA_ENV)
 def questa_gui(target, source, env):
-    cmd = env['QUESTASIM'] + ' -gui ' + ' -do ' + env['SIM_CMD_SCRIPT']
+    cmd = env['QUESTASIM'] + ' -gui ' + ' -do ' + sim_cmd_script(env)
     print(cmd)
-    env.Execute('cd ' + env['BUILD_SIM_PATH'] + ' && ' + cmd)
+    tool_exec(env, cmd, env['BUILD_SIM_PATH'], 'questa gui')
     
     return None
     
 #-------------------------------------------------------------------------------
+@tool_action(QUESTA_ENV)
 def questa_run(target, source, env):
-    cmd = env['QUESTASIM'] + ' -batch ' + ' -do ' + env['SIM_CMD_SCRIPT'] + ' -do run_sim'
+    cmd = env['QUESTASIM'] + ' -batch ' + ' -do ' + sim_cmd_script(env) + ' -do run_sim'
     print(cmd)
-    env.Execute('cd ' + env['BUILD_SIM_PATH'] + ' && ' + cmd)
+    rcode = tool_exec(env, cmd, env['BUILD_SIM_PATH'], 'questa run', cost='questa_sim')
 
-    return None
+    return rcode if rcode else None
 
 #-------------------------------------------------------------------------------
 #
 #    Helper functions
 #
+#   'quit' called by scripts (e.g. from 'onerror') must not terminate vsim
+#   session, 'quit -sim' is passed to original command. Otherwise it acts as
+#   session 'exit' (see tcl_session.py): exit code is recorded and the script
+#   is unwound with SESSION_EXIT error
+#
+VSIM_SESSION_PRELUDE = '''
+rename quit __session_quit
+proc quit {args} {
+    if {[lsearch $args -sim] >= 0} {
+        return [uplevel 1 __session_quit $args]
+    }
+    set code 0
+    set i [lsearch $args -code]
+    if {$i >= 0} {
+        set code [lindex $args [expr {$i + 1}]]
+    }
+    set ::__session_exit_code $code
+    return -code error -errorcode %s "quit $code"
+}
+''' % SESSION_EXIT
+
+#-------------------------------------------------------------------------------
+#
+#    Run vsim 'do' script: either as separate batch process or in one of
+#    persistent 'vsim -c' sessions when VSIM_SERVER is enabled. Sessions are
+#    pooled per working directory so vsim picks up local modelsim.ini
+#
+def run_vsim(env, script_path, wdir, job, logfile=None, cost=None, cancel=None):
+
+    script_path = os.path.abspath(str(script_path))
+    wdir        = os.path.abspath(str(wdir))
+
+    if not env['VSIM_SERVER']:
+        cmd = env['VSIMCOM'] + ' -batch' + ' -do ' + script_path
+        if env['VERBOSE']:
+            print(cmd)
+        return tool_exec(env, cmd, wdir, job, logfile, cost, cancel=cancel)
+
+    size = env['VSIM_SERVER_POOL'] if env['VSIM_SERVER_POOL'] else GetOption('num_jobs')
+    pool = get_session_pool('vsim:' + wdir,
+                            env['VSIMCOM'] + ' -c',
+                            size       = size,
+                            max_jobs   = env['VSIM_SERVER_MAX_JOBS'],
+                            prelude    = VSIM_SESSION_PRELUDE,
+                            reset      = 'catch {__session_quit -sim}',
+                            source_cmd = 'do',
+                            cwd        = wdir,
+                            admission  = get_admission(env) if env['ADMISSION_CONTROL'] else None,
+                            resident   = env['JOB_COSTS'].get('vsim_session'))
+
+    if env['VERBOSE']:
+        print(pool.name + ': do ' + script_path)
+
+    with admitted(env, cost):
+        rcode = pool.run(script_path, wdir,
+                         job     = job,
+                         mode    = output_mode(env),
+                         logfile = logfile,
+                         timeout = env.get('TOOL_TIMEOUT'),
+                         cancel  = cancel)
+    return rcode
+
+#-------------------------------------------------------------------------------
+#
+#    IP simulation libraries
+#
+def ip_sim_name(env, src):
+    return src.name.replace('-ipsim.'+env['SIM_SCRIPT_SUFFIX'], '')
+
+def ip_simlib_lib(env, ip_name):
+    return env['IP_SIMLIB_NAME'] + '_' + ip_name, os.path.abspath(os.path.join(env['IP_SIMLIB_PATH'], ip_name))
+
+def ip_simlib_map_path(env):
+    return env['IP_SIMLIB_PATH'] + '.ini'
+
+#-------------------------------------------------------------------------------
+#
+#    Library manifest '<lib>/.manifest.json'. IP simulation library: per IP
+#    signature of compile script and sources it references, design units
+#    compiled from them. Only IPs with changed signature are recompiled.
+#    Map file '<IP_SIMLIB_PATH>.ini' is File target of the builder: Dir
+#    target alone is not rebuilt on removed sources or changed referenced
+#    sources. Work library: per compilation unit entries, see work_lib_units
+#
+LIB_MANIFEST = '.manifest.json'
+
+def ip_sim_sources(script, wdir):
+    res = []
+    with open(script) as f:
+        for tok in f.read().replace('\\' + os.linesep, ' ').split():
+            path = os.path.abspath(os.path.join(wdir, tok))
+            if not tok.startswith(('-', '+')) and os.path.isfile(path) and path not in res:
+                res.append(path)
+    return res
+
+def ip_sim_signature(env, src):
+    script = os.path.abspath(str(src))
+    h      = hashlib.sha1(file_digest(script).encode('utf8'))
+    srcs   = ip_sim_sources(script, env['IP_OOC_PATH'])
+    for fn in srcs:
+        h.update((fn + ':' + file_digest(fn)).encode('utf8'))
+    return h.hexdigest(), srcs
+
+def ip_sim_units(env, srcs):
+    cache = get_hdl_scan_cache(env)
+    units = []
+    for fn in srcs:
+        if os.path.splitext(fn)[1][1:] in HDL_GRAPH_SUFFIXES:
+            units += [u for u in cache.get(fn)['defs'] if u not in units]
+    return units
+
+def read_lib_manifest(lib_path):
+    try:
+        with open(os.path.join(lib_path, LIB_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_lib_manifest(lib_path, manifest):
+    path = os.path.join(lib_path, LIB_MANIFEST)
+    tmp  = path + '.' + str(os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+#-------------------------------------------------------------------------------
+#
+#    Delete design units from library, except units listed in 'keep'
+#
+def manifest_units(entries):
+    return set(u for e in entries.values() for u in e['units'])
+
+def delete_lib_units(env, lib_path, units, keep):
+    units = [u for u in units if u not in keep]
+    if not units:
+        return None
+    cmd = env['VDELCOM'] + ' -lib ' + lib_path + ' ' + ' '.join(units)
+    if env['VERBOSE']:
+        print(cmd)
+    return tool_exec(env, cmd, os.path.dirname(lib_path))
+
+def write_lib_map(path, libs):
+    out = '[Library]' + os.linesep
+    for lib_name, lib_path in libs:
+        out += lib_name + ' = ' + lib_path + os.linesep
+
+    with open(path, 'w') as ofile:
+        ofile.write(out)
+
+def read_lib_map(path):
+    libs = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                m = re.match(r'^\s*([^;\[\s=]+)\s*=\s*(.+?)\s*$', line)
+                if m:
+                    libs.append((m.group(1), m.group(2)))
+    return libs
+
+#-------------------------------------------------------------------------------
+#
+#    Questa command script is resolved on first use, not at tool setup:
+#    copy next to this tool is taken before searching the project tree
+#
+sim_cmd_scripts = {}
+
+def sim_cmd_script(env):
+    if env['SIM_CMD_SCRIPT']:
+        return env['SIM_CMD_SCRIPT']
+
+    root = str(env.Dir('#'))
+    path = sim_cmd_scripts.get(root)
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'questa.tcl')
+        if not os.path.exists(path):
+            path = os.path.abspath(search_file('questa.tcl', root))
+        sim_cmd_scripts[root] = path
+    return path
 
 #-------------------------------------------------------------------------------
 
@@ -237,6 +639,26 @@ def questa_run(target, source, env):
 #
 #    Scanner functions
 #
+def scan_sim_hdl_files(node, env, path):
+
+    if not node.rexists():
+        return []
+
+    fname   = node.rfile().get_abspath()
+    dirs    = tuple(os.path.abspath(str(p)) for p in path)
+    inclist = hdl_includes(env, fname, dirs)
+
+    return env.File(inclist)
+
+def sim_inc_dirs(env, dir, target=None, source=None, argument=None):
+    return tuple(env.Dir(d) for d in Split(env['SIM_INC_PATH']) + [env['CFG_PATH']])
+
+def scan_ip_sim_script(node, env, path):
+
+    if not node.rexists():
+        return []
+
+    return env.File(ip_sim_sources(node.rfile().get_abspath(), env['IP_OOC_PATH']))
 
 #-------------------------------------------------------------------------------
 #
@@ -274,14 +696,17 @@ def ip_simlib_scripts(env, src):
 #-------------------------------------------------------------------------------
 def compile_simlib(env, src):
     trg = os.path.join(env['IP_OOC_PATH'], env['IP_SIMLIB_NAME'])
-    return env.IpSimlib(trg, src)
+    return env.IpSimlib([env.Dir(trg), env.File(ip_simlib_map_path(env))], src)
 
 #-------------------------------------------------------------------------------
 def compile_worklib(env, src):
     trg     = env.Dir(os.path.join(env['BUILD_SIM_PATH'], env['SIM_WORKLIB_NAME']))
     trg_dir = str(trg.dir)
     create_dirs([trg_dir])
-    return env.WorkLib(trg, src)
+    res = env.WorkLib([trg, env.File(os.path.join(trg_dir, 'handoff.do'))], src)
+    if env['IP_SIMLIB_PER_IP']:
+        env.Depends(res, env.File(ip_simlib_map_path(env)))
+    return res
 
 #-------------------------------------------------------------------------------
 def launch_questa_gui(env):
@@ -306,16 +731,14 @@ def generate(env):
     #
     #    External Environment
     #
+    #    Installation is checked when Questa actions run (QUESTA_ENV)
+    #
     if not 'XILINX_VIVADO' in env:
-        env['XILINX_VIVADO'] = os.environ['XILINX_VIVADO']
-    
+        env['XILINX_VIVADO'] = os.environ.get('XILINX_VIVADO', '')
     if 'QUESTABIN' not in env:
-        print_error('E: "QUESTABIN" construction environment variable must be defined and point to "bin" directory')
-        Exit(-2)
-        
+        env['QUESTABIN'] = ''
     if 'QUESTASIM' not in env:
-        print_error('E: "QUESTASIM" construction environment variable must be defined and point to "vsim" executable')
-        Exit(-2)
+        env['QUESTASIM'] = ''
         
         
     #-----------------------------------------------------------------
@@ -330,6 +753,8 @@ def generate(env):
     env['VLOGCOM']        = os.path.join(env['QUESTABIN'], 'vlog')
     env['VLIBCOM']        = os.path.join(env['QUESTABIN'], 'vlib')
     env['VMAPCOM']        = os.path.join(env['QUESTABIN'], 'vmap')
+    env['VDELCOM']        = os.path.join(env['QUESTABIN'], 'vdel')
+    env['VOPTCOM']        = os.path.join(env['QUESTABIN'], 'vopt')
     env['VSIMCOM']        = os.path.join(env['QUESTABIN'], 'vsim')
     
     env['VLOG_FLAGS']        = ' -incr -sv -mfcu'
@@ -348,19 +773,57 @@ def generate(env):
     env['BUILD_SIM_PATH']       = os.path.join(root_dir, 'build', cfg_name, 'sim')
     env['IP_SIMLIB_PATH']       = os.path.join(env['IP_OOC_PATH'], env['IP_SIMLIB_NAME'])
     env['IP_SIM_SRC_LIST_PATH'] = os.path.join(root_dir, 'site_scons', 'ip_simsrc_list_xilinx')
-    env['SIM_CMD_SCRIPT']       = os.path.abspath(search_file('questa.tcl', root_dir))
+    env['SIM_CMD_SCRIPT']       = ''            # empty: 'questa.tcl' next to this tool, resolved on first use
     
     env['VERBOSE'] = True
 
+    env['VSIM_SERVER']          = False         # run 'do' scripts in persistent 'vsim -c' sessions
+    env['VSIM_SERVER_POOL']     = 0             # sessions count per directory, 0: '-j' value
+    env['VSIM_SERVER_MAX_JOBS'] = 50            # recycle session after N scripts
+
+    env['IP_SIMLIB_PER_IP']     = False         # compile each IP into its own library, in parallel
+    env['IP_SIMLIB_JOBS']       = 0             # parallel IP library compiles, 0: '-j' value
+    env['SIM_INCREMENTAL']      = False         # compile work library by compilation units, stale ones only
+    env['SIM_COMPILE_JOBS']     = 0             # deprecated, ignored: units are compiled one at a time
+
+    if 'IP_INDEX' not in env:
+        env['IP_INDEX']         = os.path.join(env['IP_OOC_PATH'], '.ip_index.json')
+    job_costs = {
+        'questa_compile' : { 'mem' : 1, 'cpu' : 1, 'lic' : { 'questa' : 1 } },
+        'questa_sim'     : { 'mem' : 2, 'cpu' : 1, 'lic' : { 'questa' : 1 } },
+        'vsim_session'   : { 'mem' : 1, 'cpu' : 0, 'lic' : { 'questa' : 1 } }   # idle pooled session (VSIM_SERVER)
+    }
+    set_shared_defaults(env, job_costs)
+
+    #-----------------------------------------------------------------
+    #
+    #   Scanners
+    #
+    IpSimScriptScanner = Scanner(name  = 'IpSimScriptScanner',
+                         function      = scan_ip_sim_script,
+                         skeys         = ['.' + env['SIM_SCRIPT_SUFFIX']]
+                        )
+
+    SimHdlScanner      = Scanner(name  = 'SimHdlScanner',
+                         function      = scan_sim_hdl_files,
+                         skeys         = ['.v', '.sv', '.vh', '.svh'],
+                         recursive     = True,
+                         path_function = sim_inc_dirs
+                        )
+
     #-----------------------------------------------------------------
     #
     #   Builders
     #
-    IpSimLibScript = Builder(action = ip_simlib_script)
-    IpSimLib       = Builder(action = ip_simlib, target_factory = env.fs.Dir)
-    WorkLib        = Builder(action = work_lib,  target_factory = env.fs.Dir)
-    QuestaGui      = Builder(action = questa_gui)
-    QuestaRun      = Builder(action = questa_run)
+    IpSimLibScript = Builder(action = Action(traced(ip_simlib_script), varlist = ['IP_SIMLIB_PER_IP']))
+    IpSimLib       = Builder(action = Action(traced(ip_simlib), varlist = ['IP_SIMLIB_PER_IP']),
+                             target_factory = env.fs.Dir,
+                             source_scanner = IpSimScriptScanner)
+    WorkLib        = Builder(action = Action(traced(work_lib), varlist = ['SIM_INCREMENTAL', 'VLOG_FLAGS', 'VOPT_FLAGS']),
+                             target_factory = env.fs.Dir,
+                             source_scanner = SimHdlScanner)
+    QuestaGui      = Builder(action = traced(questa_gui))
+    QuestaRun      = Builder(action = traced(questa_run))
     
     Builders = {
         'IpSimLibScript' : IpSimLibScript,
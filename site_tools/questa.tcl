@@ -89,6 +89,11 @@ quietly set vopt_flags {}
 if {[info exists WorkLib]} {
     quietly append vopt_flags " -work $WorkLib";
 }
+if {[info exists IP_LIBS]} {
+    foreach lib $IP_LIBS {
+        quietly append vopt_flags " -L $lib";
+    }
+}
 quietly append vopt_flags " +acc";          # (!) deprecated - see replacements 
 quietly append vopt_flags " " ${VOPT_FLAGS}
 quietly append vopt_flags " " $DesignName 
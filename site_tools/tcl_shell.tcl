@@ -0,0 +1,24 @@
+#-------------------------------------------------------------------------------
+#
+#     Interactive Tcl shell stand-in
+#
+#     Reads commands from stdin and evaluates them as soon as a command is
+#     complete, like 'vivado -mode tcl' or 'vsim -c' do. Used to check
+#     persistent tool sessions without the tools, e.g.:
+#
+#         env['SYNSHELL'] = 'tclsh site_scons/site_tools/tcl_shell.tcl'
+#
+#-------------------------------------------------------------------------------
+
+set buf ""
+while {[gets stdin line] >= 0} {
+    append buf $line "\n"
+    if {[info complete $buf]} {
+        if {[catch {uplevel #0 $buf} msg]} {
+            puts "ERROR: $msg"
+        }
+        set buf ""
+        flush stdout
+    }
+}
+#-------------------------------------------------------------------------------
@@ -8,12 +8,23 @@
 
 import os
 import re
+import json
+import glob
+import time
+import shutil
 
 import SCons.Builder
 import SCons.Scanner
 
 from utils import *
+from tcl_session import *
+from ip_cache import *
+from hdl_scan import *
+from progress import *
+from ip_meta import *
 
+#-------------------------------------------------------------------------------
+VIVADO_ENV = { 'XILINX_VIVADO' : 'point to Vivado installation directory' }
 
 #-------------------------------------------------------------------------------
 #
@@ -43,39 +54,13 @@ def ip_create_script(target, source, env):
     'This file is automatically generated. Do not edit the file manually,' + os.linesep + \
     'change parameters of IP in corresponing configuration file (cfg/ip/<IP name>)'
 
-    text  = 'set ip_name    ' + ip_name                                   + os.linesep
+    text  = IP_CACHE_KEY_COMMENT + ip_key(env, ip_name, ip_cfg, param_sect) + os.linesep*2
+    text += 'set ip_name    ' + ip_name                                   + os.linesep
     text += 'set DEVICE     ' + env['DEVICE']                             + os.linesep
-    text += 'set IP_OOC_DIR ' + os.path.join(env['IP_OOC_PATH'], ip_name) + os.linesep*2
+    text += 'set IP_OOC_DIR ' + os.path.join(env['IP_OOC_PATH'], ip_name) + os.linesep
+    text += threads_tcl(env)                                              + os.linesep
     text += 'set_part  ${DEVICE}'                                         + os.linesep
-    text += 'create_ip -name ' + ip_cfg['type']
-    text += ' -vendor xilinx.com'
-    text += ' -library ip'
-    text += ' -module_name ${ip_name}'
-    text += ' -dir ${IP_OOC_DIR}'                                         + os.linesep*2
-
-    ip_params  = ip_cfg[param_sect]
-    max_pn_len = max_str_len(ip_params.keys())
-
-    text += 'set_property -dict {' + os.linesep
-    
-    for p in ip_params:
-        v = str(ip_params[p])
-        if v == 'True' or v == 'False':
-            v =  v.lower()
-        v = '{' + v + '}'
-        name_len      = len(p)
-        value_len     = len(v)
-        name_padding  = len(param_sect) + max_pn_len - name_len + 2
-        line  = ' '*4 + param_sect + '.' + p + ' '*name_padding + v
-
-        text += line + os.linesep
-
-    text += '} [get_ips ${ip_name}]' + os.linesep
-    
-    text += os.linesep
-    text += 'generate_target all [get_ips  ${ip_name}]'              + os.linesep
-    text += 'export_ip_user_files -of_objects [get_ips ${ip_name}] '
-    text += '-sync -force -quiet'                                    + os.linesep
+    text += ip_create_tcl(env, ip_cfg, param_sect)
     text += 'exit'
 
     out = generate_title(title_text, '#')
@@ -100,35 +85,21 @@ def ip_syn_script(target, source, env):
 
     print_action('generate script:           \'' + trg.name + '\'')
 
-    with open(src_path) as src_f:
-        ip_create_script = src_f.read()
-
     ip_name = drop_suffix(src.name)
+    ip_cfg  = read_ip_config(src_path, 'config', env['CFG_PATH'])
 
     title_text =\
     'IP core "' + ip_name + '" synthesize script' + os.linesep*2 + \
     'This file is automatically generated. Do not edit the file manually,' + os.linesep + \
     'change parameters of IP in corresponing configuration file (cfg/ip/<IP name>)'
 
-    text  = 'set ip_name    ' + ip_name                                     + os.linesep
+    text  = IP_CACHE_KEY_COMMENT + ip_key(env, ip_name, ip_cfg)          + os.linesep*2
+    text += 'set ip_name    ' + ip_name                                     + os.linesep
     text += 'set DEVICE     ' + env['DEVICE']                               + os.linesep
     text += 'set IP_OOC_DIR ' + env['IP_OOC_PATH']                          + os.linesep
-    text += 'set OUT_DIR    [file join ${IP_OOC_DIR} ${ip_name}]'           + os.linesep*2
-    text += 'set_part  ${DEVICE}'                                           + os.linesep
-
-    if env['VIVADO_PROJECT_MODE']:
-        text += 'create_project -force managed_ip_project '
-        text += '${OUT_DIR}/ip_managed_project -p ${DEVICE} -ip'            + os.linesep
-
-    text += 'read_ip   [file join ${IP_OOC_DIR} '
-    text += '${ip_name} ${ip_name} ${ip_name}.' + env['IP_CORE_SUFFIX']+']' + os.linesep
-    if env['VIVADO_PROJECT_MODE']:
-        text += 'create_ip_run [get_ips ${ip_name}]'                        + os.linesep
-        text += 'launch_runs -job 6 ${ip_name}_synth_1'                     + os.linesep
-        text += 'wait_on_run ${ip_name}_synth_1'                            + os.linesep
-        text += 'close_project'                                             + os.linesep
-    else:
-        text += 'synth_ip  [get_ips ${ip_name}]'                            + os.linesep
+    text += 'set OUT_DIR    [file join ${IP_OOC_DIR} ${ip_name}]'           + os.linesep
+    text += threads_tcl(env)                                                + os.linesep
+    text += ip_syn_tcl(env)
     text += 'exit'
 
     out = generate_title(title_text, '#')
@@ -145,6 +116,7 @@ def ip_syn_script(target, source, env):
 #
 #    Generate IP
 #
+@tool_action(VIVADO_ENV)
 def ip_create(target, source, env):
 
     src      = source[0]
@@ -158,20 +130,16 @@ def ip_create(target, source, env):
 
     print_action('create IP core:            \'' + trg.name + '\'')
 
+    key   = script_cache_key(src_path)
+    cache = get_ip_cache(env)
+    if cache and key and cache.restore(key, trg_dir, ip_cache_paths(env)):
+        print_info('IP cache hit:              \'' + ip_name + '\'')
+        return None
+
     Execute( Delete(trg_dir) )
     Execute( Mkdir(trg_dir) )
 
-    cmd = []
-    cmd.append(env['SYNCOM'])
-    cmd.append(env['SYNFLAGS'])
-    cmd.append('-log ' + logfile)
-    cmd.append(' -source ' + os.path.abspath(src_path))
-    cmd = ' '.join(cmd)
-
-    if env['VERBOSE']:
-        print(cmd)
-
-    rcode = pexec(cmd, trg_dir)
+    rcode = run_vivado(env, src_path, trg_dir, logfile, 'create ' + ip_name, 'vivado_ip')
 
     return rcode
 
@@ -179,6 +147,7 @@ def ip_create(target, source, env):
 #
 #    Run OOC IP synthesis
 #
+@tool_action(VIVADO_ENV)
 def ip_synthesize(target, source, env):
 
     src      = source[0]
@@ -192,16 +161,123 @@ def ip_synthesize(target, source, env):
 
     print_action('synthesize IP core:        \'' + trg.name + '\'')
 
-    cmd = []
-    cmd.append(env['SYNCOM'])
-    cmd.append(env['SYNFLAGS'])
-    cmd.append('-log ' + logfile)
-    cmd.append(' -source ' + os.path.abspath(src_path))
-    cmd = ' '.join(cmd)
+    pin_normalized_signatures(env, target, source)   # Vivado rewrites the IP core file
 
-    if env['VERBOSE']:
-        print(cmd)
-    rcode = pexec(cmd, trg_dir)
+    key   = script_cache_key(src_path)
+    cache = get_ip_cache(env)
+    if cache and key:
+        if restored_key(trg_dir) == key and os.path.exists(trg_path):
+            print_info('IP cache hit:              \'' + ip_name + '\'')
+            return None
+        if cache.restore(key, trg_dir, ip_cache_paths(env)):
+            print_info('IP cache hit:              \'' + ip_name + '\'')
+            return None
+
+    rcode = run_vivado(env, src_path, trg_dir, logfile, 'synth ' + ip_name, 'vivado_ip_synth')
+
+    if cache and key and not rcode:
+        cache.store(key, trg_dir, ip_cache_info(env, ip_name), ip_cache_paths(env))
+
+    return rcode
+
+#---------------------------------------------------------------------
+#
+#    Create and synthesize batch of OOC IPs in single Vivado run
+#
+@tool_action(VIVADO_ENV)
+def ip_batch(target, source, env):
+
+    param_sect = 'config'
+    ip_names   = [drop_suffix(src.name) for src in source]
+    batch_name = 'batch-' + ip_names[0] + '-' + str(len(ip_names))
+    script_dir = os.path.join(env['IP_OOC_PATH'], env['IP_SCRIPT_DIRNAME'])
+    batch_dir  = os.path.join(env['IP_OOC_PATH'], '_batch', batch_name)
+
+    print_action('create/synthesize IPs:     \'' + '\', \''.join(ip_names) + '\'')
+
+    title_text =\
+    'IP cores batch "' + batch_name + '" create and synthesize script' + os.linesep*2 + \
+    'This file is automatically generated. Do not edit the file manually,' + os.linesep + \
+    'change parameters of IP in corresponing configuration file (cfg/ip/<IP name>)'
+
+    text  = 'set DEVICE      ' + env['DEVICE']                                  + os.linesep
+    text += 'set IP_OOC_PATH ' + env['IP_OOC_PATH']                             + os.linesep
+    text += threads_tcl(env)                                                    + os.linesep
+    if env['VIVADO_PROJECT_MODE']:
+        text += 'create_project -force managed_ip_project ' + batch_dir + ' -p ${DEVICE} -ip' + os.linesep
+    else:
+        text += 'set_part  ${DEVICE}'                                           + os.linesep
+
+    cache = get_ip_cache(env)
+    todo  = []
+    for src, ip_name in zip(source, ip_names):
+        trg_dir = os.path.join(env['IP_OOC_PATH'], ip_name)
+        ip_cfg  = read_ip_config(str(src), param_sect, env['CFG_PATH'])
+        key     = ip_key(env, ip_name, ip_cfg, param_sect)
+        if cache and cache.restore(key, trg_dir, ip_cache_paths(env)):
+            print_info('IP cache hit:              \'' + ip_name + '\'')
+            continue
+        todo.append((ip_name, key))
+
+        Execute( Delete(trg_dir) )
+        Execute( Mkdir(trg_dir) )
+
+        text += os.linesep
+        text += 'puts "' + IP_BATCH_MARKER + ' ' + ip_name + ' create"'         + os.linesep
+        text += 'set ip_name    ' + ip_name                                     + os.linesep
+        text += 'set IP_OOC_DIR [file join ${IP_OOC_PATH} ${ip_name}]'          + os.linesep
+        text += ip_create_tcl(env, ip_cfg, param_sect)
+
+    text += 'puts "' + IP_BATCH_MARKER + ' - -"'                                + os.linesep*2
+
+    if not todo:
+        return None
+
+    ip_names = [i[0] for i in todo]
+    runs     = [i + '_synth_1' for i in ip_names]
+    if env['VIVADO_PROJECT_MODE']:
+        for ip_name in ip_names:
+            text += 'create_ip_run [get_ips ' + ip_name + ']'                   + os.linesep
+        text += 'launch_runs -jobs ${JOBS} ' + ' '.join(runs)                   + os.linesep
+        text += 'set failed {}'                                                 + os.linesep
+        text += 'foreach {ip_name run} {' + ' '.join([i + ' ' + r for i, r in zip(ip_names, runs)]) + '} {' + os.linesep
+        text += '    wait_on_run $run'                                          + os.linesep
+        text += '    set runlog [file join [get_property DIRECTORY [get_runs $run]] runme.log]' + os.linesep
+        text += '    if {[file exists $runlog]} {'                              + os.linesep
+        text += '        file copy -force $runlog [file join ${IP_OOC_PATH} ${ip_name} syn.log]' + os.linesep
+        text += '    }'                                                         + os.linesep
+        text += '    if {[get_property PROGRESS [get_runs $run]] != "100%"} {'  + os.linesep
+        text += '        lappend failed $ip_name'                               + os.linesep
+        text += '    }'                                                         + os.linesep
+        text += '}'                                                             + os.linesep
+        text += 'close_project'                                                 + os.linesep
+        text += 'if {[llength $failed]} {'                                      + os.linesep
+        text += '    error "IP synthesis failed: $failed"'                      + os.linesep
+        text += '}'                                                             + os.linesep
+    else:
+        for ip_name in ip_names:
+            text += 'puts "' + IP_BATCH_MARKER + ' ' + ip_name + ' syn"'        + os.linesep
+            text += 'synth_ip  [get_ips ' + ip_name + ']'                       + os.linesep
+        text += 'puts "' + IP_BATCH_MARKER + ' - -"'                            + os.linesep
+    text += 'exit'
+
+    out = generate_title(title_text, '#')
+    out += text
+    out += generate_footer('#')
+
+    script_path = os.path.join(script_dir, batch_name + '.' + env['TOOL_SCRIPT_SUFFIX'])
+    with open(script_path, 'w') as ofile:
+        ofile.write(out)
+
+    logfile = os.path.join(script_dir, batch_name + '.log')
+    rcode   = run_vivado(env, script_path, env['IP_OOC_PATH'], logfile, 'ip ' + batch_name, 'vivado_ip_batch')
+
+    split_batch_log(logfile, env['IP_OOC_PATH'])
+
+    if cache and not rcode:
+        for ip_name, key in todo:
+            trg_dir = os.path.join(env['IP_OOC_PATH'], ip_name)
+            cache.store(key, trg_dir, ip_cache_info(env, ip_name), ip_cache_paths(env))
 
     return rcode
 
@@ -278,160 +354,114 @@ def cfg_params_tcl(target, source, env):
 
 #---------------------------------------------------------------------
 #
-#    Create Vivado project
+#    Create or update Vivado project
 #
+#    Project contents are recorded in '<project>-manifest.json'. When the
+#    project exists and none of PROJECT_RECREATE_KEYS changed, only the
+#    differences are applied to the existing project, so run state is kept
+#
+PROJECT_MANIFEST_VERSION = 1
+PROJECT_RECREATE_KEYS    = ['version', 'device', 'top', 'vivado', 'flags']
+
+@tool_action(VIVADO_ENV)
 def vivado_project(target, source, env):
 
-    trg          = str(target[0])
-    trg_path     = os.path.abspath(trg)
-    project_name = env['VIVADO_PROJECT_NAME']
-    project_dir  = env['BUILD_SYN_PATH']
-    project_path = os.path.join( project_dir, project_name + '.' + env['VIVADO_PROJECT_SUFFIX'] )
+    trg           = str(target[0])
+    trg_path      = os.path.abspath(trg)
+    project_name  = env['VIVADO_PROJECT_NAME']
+    project_dir   = env['BUILD_SYN_PATH']
+    project_path  = os.path.join( project_dir, project_name + '.' + env['VIVADO_PROJECT_SUFFIX'] )
+    manifest_path = os.path.join( project_dir, project_name + '-manifest.json' )
 
-    print_action('create Vivado project:     \'' + project_name + '\'')
+    srcs = classify_sources(env, source)
+    if srcs is None:
+        return -1
+    hdl, xdc, ip, tcl, incpath = srcs
 
-    #-------------------------------------------------------
-    #
-    #   Classify sources
-    #
-    hdl     = []
-    ip      = []
-    xdc     = []
-    tcl     = []
-    incpath = env['INC_PATH']
+    pin_normalized_signatures(env, target, source)   # 'read_ip' rewrites IP core files
 
-    for s in source:
-        s = str(s)
-        if get_suffix(s) != env['IP_CORE_SUFFIX']:
-            path   = search_file(s, env['CFG_PATH'])
-            suffix = get_suffix(path)
-            if suffix == env['TOOL_SCRIPT_SUFFIX']:
-                tcl.append( os.path.abspath(path) )
+    index = get_ip_index(env)
+    for i in ip:
+        meta = index.get(i)
+        if meta and meta['part'] and meta['part'] != env['DEVICE']:
+            print_info('W: IP core \'' + meta['name'] + '\' is generated for part ' + meta['part'] +
+                       ', project part is ' + env['DEVICE'])
 
-            elif suffix == env['CONFIG_SUFFIX']:
-                with open( path ) as f:
-                    contents = yaml.safe_load(f)
-                    if 'sources' in contents:
-                        for item in contents['sources']:
-                            src_suffix = get_suffix(item)
-                            if src_suffix in [env['V_SUFFIX'], env['SV_SUFFIX']]:
-                                fullpath = os.path.abspath(item)
-                                hdl.append(fullpath)
-                                incpath.append(os.path.dirname(fullpath))
-
-                            if src_suffix in env['CONSTRAINTS_SUFFIX']:
-                                xdc.append( os.path.abspath(item))
-            else:
-                print_error('E: unsupported file type. Only \'yml\', \'tcl\' file types supported')
-                return -1
+    user_params = env['USER_DEFINED_PARAMS']
+    manifest = {
+        'version' : PROJECT_MANIFEST_VERSION,
+        'device'  : env['DEVICE'],
+        'top'     : env['TOP_NAME'],
+        'vivado'  : vivado_version(env),
+        'flags'   : env['PROJECT_CREATE_FLAGS'],
+        'hdl'     : hdl,
+        'xdc'     : xdc,
+        'ip'      : ip,
+        'incpath' : incpath,
+        'params'  : { key : str(user_params[key]) for key in user_params },
+        'tcl'     : [ [t, file_digest(t)] for t in tcl ]
+    }
 
-        else:
-            ip.append(os.path.abspath(s))
+    prev = None
+    if os.path.exists(project_path) and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            prev = json.load(f)
+        if any(prev.get(key) != manifest[key] for key in PROJECT_RECREATE_KEYS):
+            prev = None
 
     #-------------------------------------------------------
     #
-    #   Delete old project
+    #   Project script
     #
-    project_items = glob.glob(os.path.join(project_dir, project_name) + '*')
-    for item in project_items:
-        Execute( Delete(item) )
+    if prev:
+        print_action('update Vivado project:     \'' + project_name + '\'')
+        action = 'update'
+        text   = project_update_tcl(env, project_path, prev, manifest)
+        if not text:
+            Execute( Copy(trg_path, project_path) )
+            print_info('Vivado project is up to date')
+            return None
+    else:
+        print_action('create Vivado project:     \'' + project_name + '\'')
+        action = 'create'
+        project_items = glob.glob(os.path.join(project_dir, project_name) + '*')
+        for item in project_items:
+            Execute( Delete(item) )
+        text = project_create_tcl(env, manifest)
 
-    #-------------------------------------------------------
-    #
-    #   Project create script
-    #
     title_text =\
-    'Vivado project "' + project_name + '" create script' + os.linesep*2 + \
+    'Vivado project "' + project_name + '" ' + action + ' script' + os.linesep*2 + \
     'This file is automatically generated. Do not edit the file manually.'
 
-    text  = 'set PROJECT_NAME ' + env['VIVADO_PROJECT_NAME'] + os.linesep
-    text += 'set TOP_NAME '     + env['TOP_NAME']            + os.linesep
-    text += 'set DEVICE '       + env['DEVICE']              + os.linesep*2
-
-    user_params = env['USER_DEFINED_PARAMS']
-    for key in user_params:
-        text += 'set ' + key + ' ' + user_params[key] + os.linesep
-
-    project_create_args = [env['PROJECT_CREATE_FLAGS'], '${PROJECT_NAME}.' + env['VIVADO_PROJECT_SUFFIX'], '.']
-        
-    text += os.linesep
-    text += '# Project structure'                                                                      + os.linesep
-    text += 'create_project ' + ' '.join(project_create_args)                                          + os.linesep*2
-    text += 'set_property FLOW "Vivado Synthesis ' + env['VIVADO_VERNUM'] + '" [get_runs synth_1]'     + os.linesep
-    text += 'set_property FLOW "Vivado Implementation ' + env['VIVADO_VERNUM'] + '" [get_runs impl_1]' + os.linesep*2
-
-    text += '# Add sources' + os.linesep
-    text += 'puts "add HDL sources"' + os.linesep
-    flist = ['    ' + h for h in hdl]
-    text += 'add_files -scan_for_includes \\' + os.linesep
-    text += (' \\' + os.linesep).join(flist)
-    text += os.linesep*2
-
-    text += '# Add constraints' + os.linesep
-    text += 'puts "add constraints"' + os.linesep
-    flist = ['    ' + x for x in xdc]
-    text += 'add_files -fileset constrs_1 -norecurse \\'  + os.linesep
-    text += (' \\' + os.linesep).join(flist)
-    text += os.linesep*2
-
-    text += os.linesep
-    text += '# Add IP' + os.linesep
-    text += 'puts "add IPs"' + os.linesep
-    for i in ip:
-        text += 'read_ip ' + i + os.linesep
-
-    text += os.linesep
-    text += '# Properties'                                                     + os.linesep
-    text += 'set_property part ${DEVICE} [current_project]'                    + os.linesep
-    text += 'set_property include_dirs [lsort -unique [lappend incpath ' + \
-             ' '.join(incpath) + ']] [get_filesets sources_1]'                 + os.linesep
-    text += 'set_property top ${TOP_NAME} [get_filesets sources_1]'            + os.linesep
-    text += os.linesep
-    text += 'set_property used_in_simulation false [get_files  -filter {file_type == systemverilog} -of [get_filesets sources_1]]' + os.linesep
-    text += 'set_property used_in_simulation false [get_files  -filter {file_type == verilog} -of [get_filesets sources_1]]'       + os.linesep
-    text += os.linesep
-    text += '# User-defined scripts' + os.linesep
-    for t in tcl:
-        text += 'source ' + t + os.linesep
-
-    text += 'close_project' + os.linesep
-
     out = generate_title(title_text, '#')
     out += text
     out += generate_footer('#')
 
-    script_name = project_name + '-project-create.' + env['TOOL_SCRIPT_SUFFIX']
+    script_name = project_name + '-project-' + action + '.' + env['TOOL_SCRIPT_SUFFIX']
     script_path = os.path.join(str(project_dir), script_name)
     with open(script_path, 'w') as ofile:
         ofile.write(out)
 
     #-------------------------------------------------------
     #
-    #   Create project
+    #   Create/update project
     #
-    logfile  = os.path.join(project_dir, project_name + '-project-create.log')
-    cmd = []
-    cmd.append(env['SYNCOM'])
-    cmd.append(env['SYNFLAGS'])
-    cmd.append('-log ' + logfile)
-    cmd.append('-source ' + os.path.abspath(script_path))
-    cmd = ' '.join(cmd)
-
-    if env['VERBOSE']:
-        print(cmd)
-
-    rcode = pexec(cmd, project_dir)
+    logfile  = os.path.join(project_dir, project_name + '-project-' + action + '.log')
+    rcode = run_vivado(env, script_path, project_dir, logfile, action + ' ' + project_name, 'vivado_project')
     if rcode:
         print_error('\n' + '*'*60)
-        print_error('E: project create ends with error code, see log for details')
+        print_error('E: project ' + action + ' ends with error code, see log for details')
         print_error('*'*60 + '\n')
         Execute( Delete(project_path) )
+        Execute( Delete(manifest_path) )
         Execute( Delete(trg_path) )
         return -2
     else:
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=4)
         Execute( Copy(trg_path, project_path) )
         print_success('\n' + '*'*35)
-        print_success('Vivado project successfully created')
+        print_success('Vivado project successfully ' + action + 'd')
         print_success('*'*35 + '\n')
 
     return None
@@ -440,6 +470,7 @@ def vivado_project(target, source, env):
 #
 #    Synthesize Vivado project
 #
+@tool_action(VIVADO_ENV)
 def synth_vivado_project(target, source, env):
 
     project_name = env['VIVADO_PROJECT_NAME']
@@ -455,7 +486,10 @@ def synth_vivado_project(target, source, env):
     'Vivado project "' + project_name + '" sythesize script' + os.linesep*2 + \
     'This file is automatically generated. Do not edit the file manually.'
 
-    text  = 'open_project ' + project_path                                          + os.linesep
+    ref   = incr_ref(env, 'synth') if env['INCREMENTAL_SYNTH'] else None
+
+    text  = threads_tcl(env)
+    text += 'open_project ' + project_path                                          + os.linesep
 
     text += os.linesep
     text += 'puts ""' + os.linesep
@@ -463,8 +497,10 @@ def synth_vivado_project(target, source, env):
     text += 'puts ""' + os.linesep
 
     text += os.linesep
+    if env['INCREMENTAL_SYNTH']:
+        text += 'set_property incremental_checkpoint {' + (ref or '') + '} [get_runs synth_1]' + os.linesep
     text += 'reset_run synth_1'                                                 + os.linesep
-    text += 'launch_runs synth_1 -jobs 6'                                       + os.linesep
+    text += 'launch_runs synth_1 -jobs ${JOBS}'                                 + os.linesep
     text += 'wait_on_run synth_1'                                               + os.linesep
     text += 'if {[get_property PROGRESS [get_runs synth_1]] != "100%" } {'      + os.linesep
     text += '    error "\[XILINX_PRJ_BUILD:ERROR\] synth_1 failed"'             + os.linesep
@@ -492,17 +528,9 @@ def synth_vivado_project(target, source, env):
     if os.path.exists(logfile):
         Execute( Delete(logfile))
 
-    cmd = []
-    cmd.append(env['SYNCOM'])
-    cmd.append(env['SYNFLAGS'])
-    cmd.append('-log ' + logfile)
-    cmd.append('-source ' + os.path.abspath(script_path))
-    cmd = ' '.join(cmd)
-
-    if env['VERBOSE']:
-        print(cmd)
-
-    rcode = pexec(cmd, project_dir)
+    runlog = os.path.join(project_dir, project_name + '.runs', 'synth_1', 'runme.log')
+    start  = time.time()
+    rcode  = run_vivado(env, script_path, project_dir, logfile, 'synth ' + project_name, 'vivado_synth', [runlog])
     if rcode:
         msg = 'E: project synthesis ends with error code, see log for details'
         print_error('\n' + '*'*len(msg))
@@ -510,6 +538,11 @@ def synth_vivado_project(target, source, env):
         print_error('*'*len(msg) + '\n')
         return -2
     else:
+        if env['INCREMENTAL_SYNTH']:
+            reuse = incr_synth_reuse(runlog) if ref else {}
+            incr_record(env, 'synth', 'synth', bool(ref), time.time() - start, reuse)
+            if os.path.exists(str(target[0])):
+                incr_ref_update(env, 'synth', str(target[0]))
         msg = 'Vivado project successfully synthesized'
         print_success(os.linesep + '*'*len(msg))
         print_success(msg)
@@ -521,6 +554,7 @@ def synth_vivado_project(target, source, env):
 #
 #    Implement Vivado project
 #
+@tool_action(VIVADO_ENV)
 def impl_vivado_project(target, source, env):
 
     project_name = env['VIVADO_PROJECT_NAME']
@@ -535,7 +569,13 @@ def impl_vivado_project(target, source, env):
     'Vivado project "' + project_name + '" implement script' + os.linesep*2 + \
     'This file is automatically generated. Do not edit the file manually.'
 
-    text  = 'open_project ' + project_path                                      + os.linesep
+    ref       = incr_ref(env, 'impl') if env['INCREMENTAL_IMPL'] else None
+    reuse_rpt = os.path.join(env['BUILD_SYN_PATH'], project_name + '-impl-reuse.rpt')
+    if os.path.exists(reuse_rpt):
+        os.remove(reuse_rpt)
+
+    text  = threads_tcl(env)
+    text += 'open_project ' + project_path                                      + os.linesep
 
     text += os.linesep
     text += 'puts ""' + os.linesep
@@ -543,14 +583,19 @@ def impl_vivado_project(target, source, env):
     text += 'puts ""' + os.linesep
 
     text += os.linesep
+    if env['INCREMENTAL_IMPL']:
+        text += 'set_property incremental_checkpoint {' + (ref or '') + '} [get_runs impl_1]' + os.linesep
     text += 'reset_run impl_1'                                                  + os.linesep
-    text += 'launch_runs impl_1 -jobs 6 -to_step write_bitstream'               + os.linesep
+    text += 'launch_runs impl_1 -jobs ${JOBS} -to_step write_bitstream'         + os.linesep
     text += 'wait_on_run impl_1'                                                + os.linesep
     text += 'if {[get_property PROGRESS [get_runs impl_1]] != "100%" } {'       + os.linesep
     text += '    error "\[XILINX_PRJ_BUILD:ERROR\] impl_1 failed"'              + os.linesep
     text += '} else {'                                                          + os.linesep
     text += '    puts "\[XILINX_PRJ_BUILD:INFO\] impl_1 completed. Ok."'        + os.linesep
     text += '}'                                                                 + os.linesep
+    if ref:
+        text += 'open_run impl_1'                                               + os.linesep
+        text += 'report_incremental_reuse -file ' + reuse_rpt                   + os.linesep
 
     text += os.linesep
     text += 'close_project'
@@ -572,23 +617,23 @@ def impl_vivado_project(target, source, env):
     if os.path.exists(logfile):
         Execute( Delete(logfile))
 
-    cmd = []
-    cmd.append(env['SYNCOM'])
-    cmd.append(env['SYNFLAGS'])
-    cmd.append('-log ' + logfile)
-    cmd.append('-source ' + os.path.abspath(script_path))
-    cmd = ' '.join(cmd)
-
-    if env['VERBOSE']:
-        print(cmd)
-        
-    rcode = pexec(cmd, env['BUILD_SYN_PATH'])
+    runlog = os.path.join(env['BUILD_SYN_PATH'], project_name + '.runs', 'impl_1', 'runme.log')
+    start  = time.time()
+    rcode  = run_vivado(env, script_path, env['BUILD_SYN_PATH'], logfile, 'impl ' + project_name, 'vivado_impl', [runlog])
     if rcode:
         msg = 'E: project build ends with error code, see log for details'
         print_error('\n' + '*'*len(msg))
         print_error(msg)
         print_error('*'*len(msg) + '\n')
+        return -2
     else:
+        if env['INCREMENTAL_IMPL']:
+            routed = os.path.join(env['BUILD_SYN_PATH'], project_name + '.runs', 'impl_1',
+                                  env['TOP_NAME'] + '_routed.' + env['DCP_SUFFIX'])
+            incr_record(env, 'impl', 'impl', bool(ref), time.time() - start, incr_reuse(reuse_rpt))
+            if os.path.exists(routed):
+                incr_ref_update(env, 'impl', routed)
+
         msg = 'Vivado project successfully implemented'
         print_success(os.linesep + '*'*len(msg))
         print_success(msg)
@@ -600,6 +645,7 @@ def impl_vivado_project(target, source, env):
 #
 #    Launch Vivado
 #
+@tool_action(VIVADO_ENV)
 def open_vivado_project(target, source, env):
     
     project_name = env['VIVADO_PROJECT_NAME']
@@ -631,6 +677,85 @@ def open_vivado_project(target, source, env):
     
     return None
 
+#---------------------------------------------------------------------
+#
+#    Non-project flow stage: synth_design, opt, place, phys_opt, route
+#    and bitstream run as separate Vivado jobs, each stage starts from
+#    checkpoint of the previous one
+#
+NONPROJECT_STAGES   = ['synth', 'opt', 'place', 'phys_opt', 'route', 'bitstream']
+
+NONPROJECT_COMMANDS = {
+    'opt'      : 'opt_design',
+    'place'    : 'place_design',
+    'phys_opt' : 'phys_opt_design',
+    'route'    : 'route_design'
+}
+
+NONPROJECT_REPORTS  = {
+    'synth'    : ['report_utilization'],
+    'place'    : ['report_utilization'],
+    'route'    : ['report_timing_summary', 'report_route_status']
+}
+
+@tool_action(VIVADO_ENV)
+def nonproject_stage(target, source, env):
+
+    trg      = os.path.abspath(str(target[0]))
+    trg_dir  = os.path.dirname(trg)
+    stage    = env['NONPROJECT_STAGE']
+    top_name = env['TOP_NAME']
+
+    print_action('run Vivado stage:          \'' + top_name + ' ' + stage + '\'')
+
+    ref  = nonproject_ref(env, stage)
+    text = nonproject_stage_tcl(env, stage, trg, source, ref)
+    if text is None:
+        return -1
+
+    title_text =\
+    'Vivado non-project flow "' + top_name + '" ' + stage + ' script' + os.linesep*2 + \
+    'This file is automatically generated. Do not edit the file manually.'
+
+    out = generate_title(title_text, '#')
+    out += text
+    out += generate_footer('#')
+
+    script_path = os.path.join(trg_dir, top_name + '_' + stage + '.' + env['TOOL_SCRIPT_SUFFIX'])
+    with open(script_path, 'w') as ofile:
+        ofile.write(out)
+
+    logfile = os.path.join(trg_dir, top_name + '_' + stage + '.log')
+    cost    = 'vivado_synth' if stage == 'synth' else 'vivado_impl'
+    start   = time.time()
+    rcode   = run_vivado(env, script_path, trg_dir, logfile, stage + ' ' + top_name, cost)
+    if rcode or not os.path.exists(trg):
+        msg = 'E: ' + stage + ' stage ends with error code, see log for details'
+        print_error('\n' + '*'*len(msg))
+        print_error(msg)
+        print_error('*'*len(msg) + '\n')
+        if os.path.exists(trg):
+            Execute( Delete(trg) )
+        return -2
+
+    if env['INCREMENTAL_SYNTH'] and stage == 'synth':
+        reuse = incr_synth_reuse(logfile) if ref else {}
+        incr_record(env, 'synth', stage, bool(ref), time.time() - start, reuse)
+        incr_ref_update(env, 'synth', trg)
+
+    if env['INCREMENTAL_IMPL'] and stage in ['place', 'route']:
+        reuse = incr_reuse(os.path.join(trg_dir, top_name + '_' + stage + '_incremental_reuse.rpt'))
+        incr_record(env, 'impl', stage, bool(ref or reuse), time.time() - start, reuse)
+        if stage == 'route':
+            incr_ref_update(env, 'impl', trg)
+
+    msg = 'Vivado ' + stage + ' stage successfully completed'
+    print_success(os.linesep + '*'*len(msg))
+    print_success(msg)
+    print_success('*'*len(msg) + os.linesep)
+
+    return None
+
 #-------------------------------------------------------------------------------
 #
 #    Scanners
@@ -642,8 +767,7 @@ def open_vivado_project(target, source, env):
 def scan_cfg_files(node, env, path):
 
     fname = str(node)
-    with open(fname) as f:
-        cfg = yaml.safe_load(f)
+    cfg   = load_yaml(fname)
 
     if 'import' in cfg:
         imports = []
@@ -672,25 +796,13 @@ def scan_cfg_files(node, env, path):
 #
 def scan_hdl_files(node, env, path):
 
-    pattern = '`include\s+\"(\w+\.\w+)\"'
-           
-    inclist = [] 
-    contents = node.get_text_contents()
-    includes = re.findall(pattern, contents)
-    
-    for i in includes:
-        found = False
-        for p in path:
-            full_path = os.path.join( os.path.abspath(str(p)), i)
-            if os.path.exists(full_path):
-                inclist.append(full_path)
-                found = True
-                break
-
-#       if not found:
-#           print_error('E: include file ' + i + ' not found')
-#           sys.exit(-2)
-    
+    if not node.rexists():
+        return []
+
+    fname   = node.rfile().get_abspath()
+    dirs    = tuple(os.path.abspath(str(p)) for p in path)
+    inclist = hdl_includes(env, fname, dirs)
+
     return env.File(inclist)
 
 #-------------------------------------------------------------------------------
@@ -777,6 +889,31 @@ def syn_ips(env, src, deps=None):
 
     return res
 #---------------------------------------------------------------------
+def batch_ips(env, src, batch_size=None):
+
+    if not batch_size:
+        batch_size = env['IP_BATCH_SIZE']
+
+    create_dirs([os.path.join(env['IP_OOC_PATH'], env['IP_SCRIPT_DIRNAME'])])
+
+    ips  = []
+    dcps = []
+    for b in range(0, len(src), batch_size):
+        batch   = src[b:b + batch_size]
+        targets = []
+        for i in batch:
+            ip_name = get_name(str(i[0]) if SCons.Util.is_List(i) else str(i))
+            trg_dir = os.path.join(env['IP_OOC_PATH'], ip_name, ip_name)
+            targets.append(os.path.join(trg_dir, ip_name + '.' + env['IP_CORE_SUFFIX']))
+            targets.append(os.path.join(trg_dir, ip_name + '.' + env['DCP_SUFFIX']))
+
+        nodes = env.IpBatch(targets, batch)
+        for k in range(len(batch)):
+            ips.append([nodes[2*k]])
+            dcps.append([nodes[2*k + 1]])
+
+    return ips, dcps
+#---------------------------------------------------------------------
 def create_cfg_params_header(env, trg, src):
 
     if not SCons.Util.is_List(src):
@@ -853,6 +990,44 @@ def launch_open_vivado_project(env, src):
     
     return env.OpenVivadoProject('open_vivado_project', src)
 
+#---------------------------------------------------------------------
+#
+#    Non-project flow: returns list of stage targets, the last one is
+#    bitstream. Stage directives and flags: <STAGE>_DIRECTIVE, <STAGE>_FLAGS,
+#    stage Tcl hooks: NONPROJECT_HOOKS
+#
+def launch_nonproject_flow(env, src, ip_cores=None):
+
+    if not SCons.Util.is_List(src):
+        src = src.split()
+
+    source = []
+    for s in src:
+        path = s if os.path.isabs(s) else os.path.abspath(search_file(s))
+        source.append(path)
+        if get_suffix(path) == env['CONFIG_SUFFIX']:
+            contents = load_yaml(path)
+            for item in contents.get('sources', []):
+                source.append(os.path.abspath(item))
+
+    top_name = env['TOP_NAME']
+    trg_dir  = env['NONPROJECT_PATH']
+    deps     = source + (ip_cores or [])
+    targets  = []
+    for stage in NONPROJECT_STAGES:
+        suffix = env['BITSTREAM_SUFFIX'] if stage == 'bitstream' else env['DCP_SUFFIX']
+        trg    = os.path.join(trg_dir, top_name + '_' + stage + '.' + suffix)
+        hooks  = [os.path.abspath(search_file(h)) for h in env['NONPROJECT_HOOKS'].get(stage, [])]
+        deps   = env.NonProjectStage(trg, deps,
+                                     NONPROJECT_STAGE       = stage,
+                                     NONPROJECT_DIRECTIVE   = env.get(stage.upper() + '_DIRECTIVE', ''),
+                                     NONPROJECT_FLAGS       = env.get(stage.upper() + '_FLAGS', ''),
+                                     NONPROJECT_STAGE_HOOKS = hooks)
+        env.Depends(deps, hooks)
+        targets += deps
+
+    return targets
+
 #---------------------------------------------------------------------
 
 #---------------------------------------------------------------------
@@ -864,10 +1039,708 @@ def vivado_vernum(path):
 
     return re.search(pattern, path).groups()[0]
 
+def vivado_version(env):
+    if not env['VIVADO_VERNUM']:
+        if not check_tool_env(env, VIVADO_ENV):
+            Exit(-2)
+        env['VIVADO_VERNUM'] = vivado_vernum(env['XILINX_VIVADO'])
+    return env['VIVADO_VERNUM']
+
 #---------------------------------------------------------------------
 def get_suffix(path):
     return os.path.splitext(path)[1][1:]
 
+#---------------------------------------------------------------------
+#
+#    Normalized signatures: IP core and project files are compared by
+#    semantically relevant content (see ip_meta), so Vivado rewrites of
+#    volatile fields do not invalidate dependent targets. Enabled by
+#    NORMALIZED_SIGNATURES, other nodes and dependencies without stored
+#    normalized digest are passed to previous decider
+#
+def normalized_kind(env, node):
+    if get_suffix(str(node)) == env['IP_CORE_SUFFIX']:
+        return 'xci'
+    if get_suffix(str(node)) == env['VIVADO_PROJECT_SUFFIX']:
+        return 'xpr'
+    return None
+
+def pin_normalized_signatures(env, target, source):
+    if not env['NORMALIZED_SIGNATURES']:
+        return
+    sigs = get_normalized_sigs(env)
+    for s in source:
+        kind = normalized_kind(env, s)
+        if kind and os.path.isfile(s.abspath):
+            digest = normalized_digest(s.abspath, kind)
+            for t in target:
+                sigs.record(t, s, digest)
+
+def normalized_decider(prev_decider):
+    def decide(dependency, target, prev_ni, repo_node=None):
+        env  = target.get_build_env()
+        kind = normalized_kind(env, dependency)
+        if kind is None or not os.path.isfile(dependency.abspath):
+            return prev_decider(dependency, target, prev_ni, repo_node)
+
+        sigs   = get_normalized_sigs(env)
+        digest = normalized_digest(dependency.abspath, kind)
+        sigs.record(target, dependency, digest)
+        stored = sigs.get(target, dependency)
+        if stored is None:
+            return prev_decider(dependency, target, prev_ni, repo_node)
+        return digest != stored
+
+    return decide
+
+def use_normalized_decider(env):
+    env['NORMALIZED_SIGNATURES'] = True
+    env.decide_source = normalized_decider(env.decide_source)
+    env.decide_target = normalized_decider(env.decide_target)
+
+#---------------------------------------------------------------------
+#
+#    Run Vivado script: either as separate batch process or in one of
+#    persistent Vivado Tcl sessions when VIVADO_SERVER is enabled. Logs of
+#    runs launched by the script ('runlogs') are followed by progress monitor
+#
+def run_vivado(env, script_path, wdir, logfile, job, cost=None, runlogs=()):
+
+    script_path = os.path.abspath(str(script_path))
+
+    if not env['VIVADO_SERVER']:
+        cmd = []
+        cmd.append(env['SYNCOM'])
+        cmd.append(env['SYNFLAGS'])
+        cmd.append('-log ' + logfile)
+        cmd.append('-source ' + script_path)
+        cmd = ' '.join(cmd)
+
+        if env['VERBOSE']:
+            print(cmd)
+
+        monitor = vivado_monitor(env, job, logfile)
+        tail    = LogTail(runlogs, monitor.line).start() if monitor and runlogs else None
+        try:
+            rcode = tool_exec(env, cmd, wdir, job, cost=cost, monitor=monitor)
+        finally:
+            if tail:
+                tail.stop()
+        if monitor and rcode == 0:
+            monitor.save()
+        return rcode
+
+    size = env['VIVADO_SERVER_POOL'] if env['VIVADO_SERVER_POOL'] else GetOption('num_jobs')
+    pool = get_session_pool('vivado',
+                            env['SYNSHELL'] + env['SYNFLAGS'] + ' -nolog',
+                            size       = size,
+                            max_jobs   = env['VIVADO_SERVER_MAX_JOBS'],
+                            reset      = env['VIVADO_SERVER_RESET'],
+                            source_cmd = env['VIVADO_SERVER_SOURCE'],
+                            admission  = get_admission(env) if env['ADMISSION_CONTROL'] else None,
+                            resident   = env['JOB_COSTS'].get('vivado_session'))
+
+    if env['VERBOSE']:
+        print(pool.name + ': source ' + script_path)
+
+    monitor = vivado_monitor(env, job, logfile)
+    sampler = resource_sampler(env, cost)
+    start   = time.time()
+    with admitted(env, cost) as grant:
+        tclvars = { '::env(TOOL_THREADS)' : grant['cpu'] } if grant else {}
+        tail    = LogTail(runlogs, monitor.line).start() if monitor and runlogs else None
+        try:
+            rcode = pool.run(script_path, wdir,
+                             job     = job,
+                             mode    = output_mode(env),
+                             logfile = logfile,
+                             timeout = env.get('TOOL_TIMEOUT'),
+                             tclvars = tclvars,
+                             monitor = monitor,
+                             sampler = sampler)
+        finally:
+            if tail:
+                tail.stop()
+    record_metrics(env, job, sampler, rcode, time.time() - start)
+    if monitor and rcode == 0:
+        monitor.save()
+    return rcode
+
+#---------------------------------------------------------------------
+#
+#    Phase progress monitor, history is keyed by log file path, i.e. per
+#    target
+#
+def vivado_monitor(env, job, logfile):
+    if not env['VIVADO_PROGRESS']:
+        return None
+    history = get_progress_history(env['PROGRESS_HISTORY'])
+    return PhaseMonitor(job, os.path.abspath(logfile), history, env['PROGRESS_INTERVAL'])
+
+#---------------------------------------------------------------------
+#
+#    IP create commands, expects 'ip_name' and 'IP_OOC_DIR' Tcl variables
+#
+def ip_create_tcl(env, ip_cfg, param_sect):
+
+    text  = 'create_ip -name ' + ip_cfg['type']
+    text += ' -vendor xilinx.com'
+    text += ' -library ip'
+    text += ' -module_name ${ip_name}'
+    text += ' -dir ${IP_OOC_DIR}'                                         + os.linesep*2
+
+    ip_params  = ip_cfg[param_sect]
+    max_pn_len = max_str_len(ip_params.keys())
+
+    text += 'set_property -dict {' + os.linesep
+    
+    for p in ip_params:
+        v = str(ip_params[p])
+        if v == 'True' or v == 'False':
+            v =  v.lower()
+        v = '{' + v + '}'
+        name_len      = len(p)
+        value_len     = len(v)
+        name_padding  = len(param_sect) + max_pn_len - name_len + 2
+        line  = ' '*4 + param_sect + '.' + p + ' '*name_padding + v
+
+        text += line + os.linesep
+
+    text += '} [get_ips ${ip_name}]' + os.linesep
+    
+    text += os.linesep
+    text += 'generate_target all [get_ips  ${ip_name}]'              + os.linesep
+    text += 'export_ip_user_files -of_objects [get_ips ${ip_name}] '
+    text += '-sync -force -quiet'                                    + os.linesep
+
+    return text
+
+#---------------------------------------------------------------------
+#
+#    Split IP batch log into per-IP '<stage>.log' files by marker lines
+#
+IP_BATCH_MARKER = '@@IP_BATCH'
+
+def split_batch_log(logfile, ip_ooc_path):
+
+    if not os.path.exists(logfile):
+        return
+
+    pattern = re.compile('^' + IP_BATCH_MARKER + r' (\S+) (\S+)$')
+    out     = None
+    with open(logfile, errors='replace') as f:
+        for line in f:
+            res = pattern.match(line.rstrip())
+            if res:
+                if out:
+                    out.close()
+                    out = None
+                ip_name, stage = res.groups()
+                if ip_name != '-':
+                    out = open(os.path.join(ip_ooc_path, ip_name, stage + '.log'), 'w')
+            elif out:
+                out.write(line)
+    if out:
+        out.close()
+
+#---------------------------------------------------------------------
+#
+#    IP synthesize commands, expects 'ip_name', 'IP_OOC_DIR' and 'OUT_DIR'
+#    Tcl variables
+#
+def ip_syn_tcl(env):
+
+    text = 'set_part  ${DEVICE}'                                            + os.linesep
+
+    if env['VIVADO_PROJECT_MODE']:
+        text += 'create_project -force managed_ip_project '
+        text += '${OUT_DIR}/ip_managed_project -p ${DEVICE} -ip'            + os.linesep
+
+    text += 'read_ip   [file join ${IP_OOC_DIR} '
+    text += '${ip_name} ${ip_name} ${ip_name}.' + env['IP_CORE_SUFFIX']+']' + os.linesep
+    if env['VIVADO_PROJECT_MODE']:
+        text += 'create_ip_run [get_ips ${ip_name}]'                        + os.linesep
+        text += 'launch_runs -jobs ${JOBS} ${ip_name}_synth_1'              + os.linesep
+        text += 'wait_on_run ${ip_name}_synth_1'                            + os.linesep
+        text += 'close_project'                                             + os.linesep
+    else:
+        text += 'synth_ip  [get_ips ${ip_name}]'                            + os.linesep
+
+    return text
+
+#---------------------------------------------------------------------
+#
+#    IP cache entry metadata, IP core facts are taken from IP index
+#
+def ip_cache_info(env, ip_name):
+    info = { 'ip' : ip_name, 'device' : env['DEVICE'], 'vivado' : vivado_version(env) }
+    xci  = os.path.join(env['IP_OOC_PATH'], ip_name, ip_name, ip_name + '.' + env['IP_CORE_SUFFIX'])
+    meta = get_ip_index(env).get(xci)
+    if meta:
+        for k in ('type', 'version', 'revision', 'part', 'outputs'):
+            info[k] = meta.get(k)
+    return info
+
+#---------------------------------------------------------------------
+#
+#    IP output cache key: IP name, type and evaluated parameters, target
+#    device, Vivado version and path-independent create/synthesize commands.
+#    Absolute paths in IP outputs are relocated by the cache (see ip_cache)
+#    relative to ip_cache_paths roots
+#
+IP_CACHE_KEY_COMMENT = '# IP cache key: '
+
+def ip_key(env, ip_name, ip_cfg, param_sect='config'):
+    return ip_cache_key({ 'ip'     : ip_name,
+                          'type'   : ip_cfg['type'],
+                          'params' : ip_cfg[param_sect],
+                          'device' : env['DEVICE'],
+                          'vivado' : vivado_version(env),
+                          'create' : ip_create_tcl(env, ip_cfg, param_sect),
+                          'syn'    : ip_syn_tcl(env) })
+
+def ip_cache_paths(env):
+    return { 'OOC'    : os.path.abspath(env['IP_OOC_PATH']),
+             'ROOT'   : env['ROOT_PATH'],
+             'VIVADO' : env['XILINX_VIVADO'] }
+
+def script_cache_key(path):
+    with open(path) as f:
+        for line in f:
+            if line.startswith(IP_CACHE_KEY_COMMENT):
+                return line[len(IP_CACHE_KEY_COMMENT):].strip()
+    return None
+
+#---------------------------------------------------------------------
+#
+#    Classify design sources: source list configs, Tcl scripts, IP cores,
+#    HDL and constraints files. Returns (hdl, xdc, ip, tcl, incpath). With
+#    HDL_PRUNE only HDL files reachable from TOP_NAME are returned
+#
+def classify_sources(env, source):
+
+    hdl     = []
+    ip      = []
+    xdc     = []
+    tcl     = []
+    incpath = env['INC_PATH']
+    incpath = list(incpath) if SCons.Util.is_List(incpath) else incpath.split()
+    hdl_suffix = [env['V_SUFFIX'], env['SV_SUFFIX']]
+    xdc_suffix = env['CONSTRAINTS_SUFFIX']
+    xdc_suffix = xdc_suffix if SCons.Util.is_List(xdc_suffix) else xdc_suffix.split()
+
+    def add_hdl(fullpath):
+        if fullpath not in hdl:
+            hdl.append(fullpath)
+        if os.path.dirname(fullpath) not in incpath:
+            incpath.append(os.path.dirname(fullpath))
+
+    def add_xdc(fullpath):
+        if fullpath not in xdc:
+            xdc.append(fullpath)
+
+    for s in source:
+        s = str(s)
+        suffix = get_suffix(s)
+        if suffix == env['IP_CORE_SUFFIX']:
+            ip.append(os.path.abspath(s))
+
+        elif suffix in hdl_suffix:
+            add_hdl(os.path.abspath(s))
+
+        elif suffix in xdc_suffix:
+            add_xdc(os.path.abspath(s))
+
+        else:
+            path   = search_file(s, env['CFG_PATH'])
+            suffix = get_suffix(path)
+            if suffix == env['TOOL_SCRIPT_SUFFIX']:
+                tcl.append( os.path.abspath(path) )
+
+            elif suffix == env['CONFIG_SUFFIX']:
+                contents = load_yaml(path)
+                if 'sources' in contents:
+                    for item in contents['sources']:
+                        src_suffix = get_suffix(item)
+                        fullpath   = os.path.abspath(item)
+                        if src_suffix in hdl_suffix:
+                            add_hdl(fullpath)
+
+                        if src_suffix in xdc_suffix:
+                            add_xdc(fullpath)
+            else:
+                print_error('E: unsupported file type. Only \'yml\', \'tcl\' file types supported')
+                return None
+
+    if env['HDL_PRUNE']:
+        report = os.path.join(env['BUILD_SYN_PATH'], env['TOP_NAME'] + '-pruned.txt')
+        hdl    = prune_hdl(env, hdl, [env['TOP_NAME']] + env['HDL_EXTRA_TOPS'], incpath, report)
+
+    return hdl, xdc, ip, tcl, incpath
+
+#---------------------------------------------------------------------
+#
+#    Vivado project scripts
+#
+def project_vars_tcl(env, manifest):
+
+    text  = 'set PROJECT_NAME ' + env['VIVADO_PROJECT_NAME'] + os.linesep
+    text += 'set TOP_NAME '     + manifest['top']            + os.linesep
+    text += 'set DEVICE '       + manifest['device']         + os.linesep*2
+
+    user_params = manifest['params']
+    for key in user_params:
+        text += 'set ' + key + ' ' + user_params[key] + os.linesep
+
+    return text
+
+def project_files_tcl(cmd, files):
+    flist = ['    ' + f for f in files]
+    text  = cmd + ' \\' + os.linesep
+    text += (' \\' + os.linesep).join(flist)
+    text += os.linesep*2
+    return text
+
+def project_props_tcl(manifest):
+    text  = 'set_property include_dirs [lsort -unique [lappend incpath ' + \
+             ' '.join(manifest['incpath']) + ']] [get_filesets sources_1]' + os.linesep
+    text += 'set_property used_in_simulation false [get_files  -filter {file_type == systemverilog} -of [get_filesets sources_1]]' + os.linesep
+    text += 'set_property used_in_simulation false [get_files  -filter {file_type == verilog} -of [get_filesets sources_1]]'       + os.linesep
+    return text
+
+#---------------------------------------------------------------------
+def project_create_tcl(env, manifest):
+
+    text = project_vars_tcl(env, manifest)
+
+    project_create_args = [manifest['flags'], '${PROJECT_NAME}.' + env['VIVADO_PROJECT_SUFFIX'], '.']
+
+    text += os.linesep
+    text += '# Project structure'                                                                      + os.linesep
+    text += 'create_project ' + ' '.join(project_create_args)                                          + os.linesep*2
+    text += 'set_property FLOW "Vivado Synthesis ' + manifest['vivado'] + '" [get_runs synth_1]'       + os.linesep
+    text += 'set_property FLOW "Vivado Implementation ' + manifest['vivado'] + '" [get_runs impl_1]'   + os.linesep*2
+
+    text += '# Add sources' + os.linesep
+    text += 'puts "add HDL sources"' + os.linesep
+    text += project_files_tcl('add_files -scan_for_includes', manifest['hdl'])
+
+    text += '# Add constraints' + os.linesep
+    text += 'puts "add constraints"' + os.linesep
+    text += project_files_tcl('add_files -fileset constrs_1 -norecurse', manifest['xdc'])
+
+    text += os.linesep
+    text += '# Add IP' + os.linesep
+    text += 'puts "add IPs"' + os.linesep
+    for i in manifest['ip']:
+        text += 'read_ip ' + i + os.linesep
+
+    text += os.linesep
+    text += '# Properties'                                                     + os.linesep
+    text += 'set_property part ${DEVICE} [current_project]'                    + os.linesep
+    text += 'set_property top ${TOP_NAME} [get_filesets sources_1]'            + os.linesep
+    text += project_props_tcl(manifest)
+    text += os.linesep
+    text += '# User-defined scripts' + os.linesep
+    for t, digest in manifest['tcl']:
+        text += 'source ' + t + os.linesep
+
+    text += 'close_project' + os.linesep
+
+    return text
+
+#---------------------------------------------------------------------
+#
+#    Project update commands: differences between previous and current
+#    manifests. Returns empty string when the project is up to date
+#
+def project_update_tcl(env, project_path, prev, manifest):
+
+    def diff(key):
+        old = set(prev[key])
+        new = set(manifest[key])
+        return [f for f in prev[key] if f not in new], [f for f in manifest[key] if f not in old]
+
+    text = ''
+
+    hdl_removed, hdl_added = diff('hdl')
+    if hdl_removed:
+        text += project_files_tcl('remove_files -quiet -fileset sources_1', hdl_removed)
+    if hdl_added:
+        text += 'puts "add HDL sources"' + os.linesep
+        text += project_files_tcl('add_files -scan_for_includes', hdl_added)
+
+    xdc_removed, xdc_added = diff('xdc')
+    if xdc_removed:
+        text += project_files_tcl('remove_files -quiet -fileset constrs_1', xdc_removed)
+    if xdc_added:
+        text += 'puts "add constraints"' + os.linesep
+        text += project_files_tcl('add_files -fileset constrs_1 -norecurse', xdc_added)
+
+    ip_removed, ip_added = diff('ip')
+    if ip_removed:
+        text += project_files_tcl('remove_files -quiet', ip_removed)
+    for i in ip_added:
+        text += 'read_ip ' + i + os.linesep
+
+    if hdl_added or prev['incpath'] != manifest['incpath']:
+        text += project_props_tcl(manifest)
+
+    #   Scripts effects can not be reverted: when user parameters change all
+    #   scripts are sourced again, otherwise only new and modified ones
+    prev_tcl = [tuple(t) for t in prev['tcl']]
+    if prev['params'] != manifest['params']:
+        tcl = [t for t, digest in manifest['tcl']]
+    else:
+        tcl = [t for t, digest in manifest['tcl'] if (t, digest) not in prev_tcl]
+    if tcl:
+        text += '# User-defined scripts' + os.linesep
+        for t in tcl:
+            text += 'source ' + t + os.linesep
+
+    if not text:
+        return ''
+
+    head  = project_vars_tcl(env, manifest)
+    head += os.linesep
+    head += 'open_project ' + os.path.abspath(project_path) + os.linesep*2
+    return head + text + 'close_project' + os.linesep
+
+#---------------------------------------------------------------------
+#
+#    Non-project flow stage commands
+#
+#    No project is open in non-project flow, so Tcl scripts of source lists
+#    (project hooks, sourced after project creation) are not sourced there.
+#    Stage hooks from NONPROJECT_HOOKS are sourced after the stage input is
+#    loaded (sources read or checkpoint opened), right before stage command
+#
+def nonproject_ref(env, stage):
+    if stage == 'synth' and env['INCREMENTAL_SYNTH']:
+        return incr_ref(env, 'synth')
+    if stage == 'place' and env['INCREMENTAL_IMPL']:
+        return incr_ref(env, 'impl')
+    return None
+
+def nonproject_stage_tcl(env, stage, trg, source, ref=None):
+
+    trg_dir   = os.path.dirname(trg)
+    top_name  = env['TOP_NAME']
+    directive = env['NONPROJECT_DIRECTIVE']
+    flags     = env['NONPROJECT_FLAGS']
+    args      = (('-directive ' + directive + ' ' if directive else '') + flags).strip()
+
+    text = threads_tcl(env)
+    text += project_vars_tcl(env, { 'top'    : top_name,
+                                    'device' : env['DEVICE'],
+                                    'params' : env['USER_DEFINED_PARAMS'] })
+    text += os.linesep
+
+    if stage == 'synth':
+        srcs = classify_sources(env, source)
+        if srcs is None:
+            return None
+        hdl, xdc, ip, tcl, incpath = srcs
+
+        text += 'set_part ${DEVICE}' + os.linesep*2
+        sv = [h for h in hdl if get_suffix(h) == env['SV_SUFFIX']]
+        v  = [h for h in hdl if get_suffix(h) != env['SV_SUFFIX']]
+        if sv:
+            text += project_files_tcl('read_verilog -sv', sv)
+        if v:
+            text += project_files_tcl('read_verilog', v)
+        for i in ip:
+            text += 'read_ip ' + i + os.linesep
+        if xdc:
+            text += project_files_tcl('read_xdc', xdc)
+        if tcl:
+            print_info('W: project Tcl hooks are not sourced in non-project flow (use NONPROJECT_HOOKS): ' +
+                       ', '.join(os.path.basename(t) for t in tcl))
+        for t in env['NONPROJECT_STAGE_HOOKS']:
+            text += 'source ' + t + os.linesep
+
+        if ref:
+            text += 'read_checkpoint -incremental ' + ref                       + os.linesep
+
+        text += os.linesep
+        text += 'synth_design -top ${TOP_NAME} -part ${DEVICE} '
+        text += '-include_dirs {' + ' '.join(incpath) + '} ' + args            + os.linesep
+
+    else:
+        text += 'open_checkpoint ' + os.path.abspath(str(source[0]))            + os.linesep
+        for t in env['NONPROJECT_STAGE_HOOKS']:
+            text += 'source ' + t + os.linesep
+        if stage == 'bitstream':
+            text += 'write_bitstream -force ' + flags + ' ' + trg               + os.linesep
+            return text
+        if ref:
+            text += 'read_checkpoint -incremental ' + ref                       + os.linesep
+        text += NONPROJECT_COMMANDS[stage] + ' ' + args                         + os.linesep
+
+    text += 'write_checkpoint -force ' + trg                                    + os.linesep
+    reports = NONPROJECT_REPORTS.get(stage, [])
+    if env['INCREMENTAL_IMPL'] and stage in ['place', 'route']:
+        reports = reports + ['report_incremental_reuse']
+    for r in reports:
+        rpt   = top_name + '_' + stage + '_' + r[len('report_'):] + '.rpt'
+        rpt   = os.path.join(trg_dir, rpt)
+        if r == 'report_incremental_reuse':
+            if os.path.exists(rpt):
+                os.remove(rpt)
+            text += 'catch {' + r + ' -file ' + rpt + '}'                       + os.linesep
+        else:
+            text += r + ' -file ' + rpt                                         + os.linesep
+
+    return text
+
+#---------------------------------------------------------------------
+#
+#    Incremental flow reference checkpoints
+#
+#    '<INCR_REF_PATH>/<top>_<kind>_ref.dcp' is the last good checkpoint of
+#    the given kind ('synth', 'impl'), its metadata keeps configuration the
+#    reference was built with. The reference is dropped as stale when the
+#    configuration changes
+#
+def incr_ref_paths(env, kind):
+    dcp = os.path.join(env['INCR_REF_PATH'], env['TOP_NAME'] + '_' + kind + '_ref.' + env['DCP_SUFFIX'])
+    return dcp, dcp + '.json'
+
+def incr_ref_config(env, kind):
+    config = { 'device' : env['DEVICE'],
+               'top'    : env['TOP_NAME'],
+               'vivado' : vivado_version(env) }
+    if kind == 'synth':
+        config['params'] = { key : str(val) for key, val in env['USER_DEFINED_PARAMS'].items() }
+        if not env['VIVADO_PROJECT_MODE']:           # stage settings of non-project flow only
+            config['directive'] = env['SYNTH_DIRECTIVE']
+            config['flags']     = env['SYNTH_FLAGS']
+    return config
+
+def incr_ref(env, kind):
+    dcp, meta = incr_ref_paths(env, kind)
+    if not os.path.exists(dcp) or not os.path.exists(meta):
+        return None
+
+    with open(meta) as f:
+        config = json.load(f)
+    if config != incr_ref_config(env, kind):
+        print_info('stale ' + kind + ' reference checkpoint, run full ' + kind)
+        os.remove(dcp)
+        os.remove(meta)
+        return None
+
+    return dcp
+
+def incr_ref_update(env, kind, src):
+    dcp, meta = incr_ref_paths(env, kind)
+    os.makedirs(os.path.dirname(dcp), exist_ok=True)
+    shutil.copy2(src, dcp + '.tmp')
+    os.replace(dcp + '.tmp', dcp)
+    with open(meta, 'w') as f:
+        json.dump(incr_ref_config(env, kind), f, indent=4)
+
+#---------------------------------------------------------------------
+#
+#    Reuse percentages from 'report_incremental_reuse' summary table:
+#    { 'cells' : %, 'nets' : %, ... }
+#
+def incr_reuse(rpt):
+    res = {}
+    if not os.path.exists(rpt):
+        return res
+
+    col = None
+    with open(rpt, errors='replace') as f:
+        for line in f:
+            cells = [c.strip() for c in line.strip().strip('|').split('|')]
+            if col is None:
+                for i, c in enumerate(cells):
+                    if c.startswith('Reuse %'):
+                        col = i
+                continue
+            if len(cells) <= col or cells[0] == '':
+                if res:
+                    break
+                continue
+            try:
+                res[cells[0].lower()] = float(cells[col])
+            except ValueError:
+                pass
+    return res
+
+#---------------------------------------------------------------------
+#
+#    Incremental synthesis reuse from synthesis log: reuse percentage row
+#    of 'Incremental Synthesis Report Summary' section (up to the next
+#    synthesis phase line), { 'design' : % }
+#
+INCR_SYNTH_SUMMARY = re.compile(r'^\s*Incremental Synthesis Report Summary')
+INCR_SYNTH_PHASE   = re.compile(r'^(Start|Finished) ')
+INCR_SYNTH_REUSE   = re.compile(r'^\s*\|?\s*[^|:%]*\breuse\w*[^|:%]*[|:]\s*(\d+(?:\.\d+)?)\s*%', re.I)
+
+def incr_synth_reuse(logfile):
+    res = {}
+    if not os.path.exists(logfile):
+        return res
+    summary = False
+    with open(logfile, errors='replace') as f:
+        for line in f:
+            if INCR_SYNTH_SUMMARY.match(line):
+                summary = True
+            elif INCR_SYNTH_PHASE.match(line):
+                summary = False
+            elif summary:
+                m = INCR_SYNTH_REUSE.match(line)
+                if m:
+                    res['design'] = float(m.group(1))
+    return res
+
+#---------------------------------------------------------------------
+#
+#    Record incremental run statistics in '<top>_<kind>_stats.json': run
+#    history and reuse, runtime saved against the last full run of the
+#    same stage
+#
+def incr_record(env, kind, stage, incremental, elapsed, reuse):
+    path = os.path.join(env['INCR_REF_PATH'], env['TOP_NAME'] + '_' + kind + '_stats.json')
+    stats = { 'full' : {}, 'runs' : [] }
+    if os.path.exists(path):
+        with open(path) as f:
+            stats = json.load(f)
+
+    run = { 'stage'       : stage,
+            'time'        : time.time(),
+            'incremental' : incremental,
+            'elapsed'     : round(elapsed, 1),
+            'reuse'       : reuse }
+
+    full = stats['full'].get(stage)
+    if not incremental:
+        stats['full'][stage] = run['elapsed']
+    elif full:
+        run['saved'] = round(full - elapsed, 1)
+
+    stats['runs'] = (stats['runs'] + [run])[-env['INCR_STATS_DEPTH']:]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(stats, f, indent=4)
+
+    if incremental:
+        text = 'incremental ' + stage + ':'
+        for r in reuse:
+            text += ' ' + r + ' ' + str(reuse[r]) + '%'
+        if 'saved' in run:
+            text += ', runtime saved ' + str(run['saved']) + ' s'
+        print_info(text)
+
+#---------------------------------------------------------------------
+def threads_tcl(env):
+    text  = 'set JOBS ' + str(env['VIVADO_JOBS'])                              + os.linesep
+    text += 'if {[info exists ::env(TOOL_THREADS)]} { set JOBS $::env(TOOL_THREADS) }' + os.linesep
+    text += 'set_param general.maxThreads [expr {min($JOBS, 8)}]'             + os.linesep
+    return text
+
 #-------------------------------------------------------------------------------
 #
 #    Set up tool construction environment
@@ -881,8 +1754,11 @@ def generate(env):
     #
     #    External Environment
     #
+    #    Installation is checked when Vivado actions run (VIVADO_ENV),
+    #    version is probed on first use
+    #
     if not 'XILINX_VIVADO' in env:
-        env['XILINX_VIVADO'] = os.environ['XILINX_VIVADO']
+        env['XILINX_VIVADO'] = os.environ.get('XILINX_VIVADO', '')
         
     VIVADO = os.path.join(env['XILINX_VIVADO'], 'bin', 'vivado')
     
@@ -893,7 +1769,7 @@ def generate(env):
     root_dir                     = str(env.Dir('#'))
     cfg_name                     = os.path.basename( os.getcwd() )
 
-    env['VIVADO_VERNUM']         = vivado_vernum(env['XILINX_VIVADO'])
+    env['VIVADO_VERNUM']         = ''            # empty: taken from XILINX_VIVADO path on first use
     env['VIVADO_PROJECT_NAME']   = 'vivado_project'
     env['TOP_NAME']              = 'top'
     env['DEVICE']                = 'xc7a200tfbg676-2'
@@ -910,12 +1786,62 @@ def generate(env):
 
     env['VERBOSE']               = True
 
+    job_costs = {
+        'vivado_ip'       : { 'mem' : 2,  'cpu' : 1, 'max_threads' : 2 },
+        'vivado_ip_synth' : { 'mem' : 4,  'cpu' : 1, 'max_threads' : 4 },
+        'vivado_ip_batch' : { 'mem' : 8,  'cpu' : 2, 'max_threads' : 8 },
+        'vivado_project'  : { 'mem' : 2,  'cpu' : 1 },
+        'vivado_synth'    : { 'mem' : 8,  'cpu' : 2, 'max_threads' : 8 },
+        'vivado_impl'     : { 'mem' : 12, 'cpu' : 2, 'max_threads' : 8 },
+        'vivado_session'  : { 'mem' : 1,  'cpu' : 0 }       # idle pooled session (VIVADO_SERVER)
+    }
+    set_shared_defaults(env, job_costs)
+
+    env['VIVADO_JOBS']           = 6             # default when admission control is off
+
+    env['VIVADO_PROGRESS']       = True          # phase status lines and ETA from Vivado output
+    env['PROGRESS_INTERVAL']     = 60            # s, status line period within long phases, 0: phase changes only
+    env['PROGRESS_HISTORY']      = os.path.join(root_dir, 'build', '.progress.json')
+    env['IP_BATCH_SIZE']         = 8             # IPs per Vivado run in 'BatchIps'
+
+    env['IP_CACHE_PATH']         = os.environ.get('IP_CACHE_PATH', '')   # empty: cache disabled
+    env['IP_CACHE_SIZE']         = 20            # GB
+    env['IP_CACHE_LINK']         = False         # restore by hardlinks instead of copies
+    env['IP_CACHE_COPY']         = ['*.xci', '*.xcix', '*.xml', '*.log', '*.jou']   # rewritten by Vivado in place: copied in link mode
+
+    env['VIVADO_SERVER']          = False        # run scripts in persistent 'SYNSHELL' sessions
+    env['VIVADO_SERVER_POOL']     = 0            # sessions count, 0: '-j' value
+    env['VIVADO_SERVER_MAX_JOBS'] = 20           # recycle session after N scripts
+    env['VIVADO_SERVER_SOURCE']   = 'source -notrace'
+    env['VIVADO_SERVER_RESET']    = 'catch {close_design -quiet}; ' + \
+                                    'foreach p [get_projects -quiet] { catch {current_project $p; close_project} }'
+
+    env['INCREMENTAL_SYNTH']     = False         # synthesis with the last synthesized checkpoint as reference
+    env['INCREMENTAL_IMPL']      = False         # place&route from the last routed checkpoint
+    env['INCR_STATS_DEPTH']      = 50            # incremental runs kept in statistics
+
+    env['SYNTH_DIRECTIVE']       = 'default'     # non-project flow stage directives, empty: not passed
+    env['OPT_DIRECTIVE']         = 'Default'
+    env['PLACE_DIRECTIVE']       = 'Default'
+    env['PHYS_OPT_DIRECTIVE']    = 'Default'
+    env['ROUTE_DIRECTIVE']       = 'Default'
+    env['SYNTH_FLAGS']           = ''            # extra stage command options
+    env['OPT_FLAGS']             = ''
+    env['PLACE_FLAGS']           = ''
+    env['PHYS_OPT_FLAGS']        = ''
+    env['ROUTE_FLAGS']           = ''
+    env['BITSTREAM_FLAGS']       = ''
+    env['NONPROJECT_HOOKS']      = {}            # stage : [Tcl scripts] sourced before stage command, no project open
+
     env['ROOT_PATH']             = os.path.abspath(str(Dir('#')))
     env['CFG_PATH']              = os.path.abspath(os.curdir)  # current configuration path
     env['SETTINGS_SEARCH_PATH']  = env['CFG_PATH']
     env['BUILD_SRC_PATH']        = os.path.join(root_dir, 'build', cfg_name, 'src')
     env['BUILD_SYN_PATH']        = os.path.join(root_dir, 'build', cfg_name, 'syn')
     env['IP_OOC_PATH']           = os.path.join(env['BUILD_SYN_PATH'], 'ip_ooc')
+    env['IP_INDEX']              = os.path.join(env['IP_OOC_PATH'], '.ip_index.json')
+    env['NONPROJECT_PATH']       = os.path.join(env['BUILD_SYN_PATH'], 'nonprj')
+    env['INCR_REF_PATH']         = os.path.join(env['BUILD_SYN_PATH'], 'incr')
     env['INC_PATH']              = ''
 
     env['IP_SCRIPT_DIRNAME']     = '_script'
@@ -934,6 +1860,12 @@ def generate(env):
 
     env['USER_DEFINED_PARAMS']   = {}
 
+    env['NORMALIZED_SIGS']       = os.path.join(env['BUILD_SYN_PATH'], '.normalized_sigs.json')
+    if env.get('NORMALIZED_SIGNATURES'):       # compare IP core and project files by normalized content
+        use_normalized_decider(env)
+    else:
+        env['NORMALIZED_SIGNATURES'] = False
+
     env.Append(SYNFLAGS = env['SYN_TRACE'])
     env.Append(SYNFLAGS = env['SYN_JOURNAL'])
 
@@ -951,7 +1883,8 @@ def generate(env):
 
     HdlSourceScanner = Scanner(name  = 'HldSourceScanner',
                        function      = scan_hdl_files,
-                       skeys         = ['.' + env['V_SUFFIX'], '.' + env['SV_SUFFIX']],
+                       skeys         = ['.' + env['V_SUFFIX'], '.' + env['SV_SUFFIX'],
+                                        '.' + env['V_HEADER_SUFFIX'], '.' + env['SV_HEADER_SUFFIX']],
                        recursive     = True,
                        path_function = SCons.Scanner.FindPathDirs('INC_PATH')
                       )
@@ -959,40 +1892,50 @@ def generate(env):
     #
     #   Builders
     #
-    IpCreateScript     = Builder(action         = ip_create_script,
+    IpCreateScript     = Builder(action         = traced(ip_create_script),
                                  suffix         = env['TOOL_SCRIPT_SUFFIX'],
                                  #src_suffix     = env['IP_CONFIG_SUFFIX'],
                                  source_scanner = CfgImportScanner)
 
-    IpSynScript        = Builder(action         = ip_syn_script,
+    IpSynScript        = Builder(action         = traced(ip_syn_script),
                                  suffix         = env['TOOL_SCRIPT_SUFFIX'],
                                  source_scanner = CfgImportScanner)
 
 
-    IpCreate           = Builder(action     = ip_create,
+    IpCreate           = Builder(action     = traced(ip_create),
                                  suffix     = env['IP_CORE_SUFFIX'],
                                  src_suffix = env['TOOL_SCRIPT_SUFFIX'])
 
-    IpSyn              = Builder(action     = ip_synthesize,
+    IpSyn              = Builder(action     = traced(ip_synthesize),
                                  suffix     = env['DCP_SUFFIX'],
                                  src_suffix = env['IP_CORE_SUFFIX'])
 
-    CfgParamsHeader    = Builder(action = cfg_params_header, source_scanner = CfgImportScanner)
-    CfgParamsTcl       = Builder(action = cfg_params_tcl,    source_scanner = CfgImportScanner)
+    IpBatch            = Builder(action         = Action(traced(ip_batch), varlist = ['DEVICE', 'VIVADO_PROJECT_MODE']),
+                                 source_scanner = CfgImportScanner)
+
+    CfgParamsHeader    = Builder(action = traced(cfg_params_header), source_scanner = CfgImportScanner)
+    CfgParamsTcl       = Builder(action = traced(cfg_params_tcl),    source_scanner = CfgImportScanner)
 
-    VivadoProject      = Builder(action = vivado_project)
+    VivadoProject      = Builder(action = traced(vivado_project))
 
-    SynthVivadoProject = Builder(action = synth_vivado_project, source_scanner = HdlSourceScanner)
-    ImplVivadoProject  = Builder(action = impl_vivado_project)
+    SynthVivadoProject = Builder(action = traced(synth_vivado_project), source_scanner = HdlSourceScanner)
+    ImplVivadoProject  = Builder(action = traced(impl_vivado_project))
     
     
-    OpenVivadoProject  = Builder(action = open_vivado_project)
+    OpenVivadoProject  = Builder(action = traced(open_vivado_project))
+
+    NonProjectStage    = Builder(action         = Action(traced(nonproject_stage),
+                                                         varlist = ['DEVICE', 'TOP_NAME', 'USER_DEFINED_PARAMS',
+                                                                    'NONPROJECT_STAGE', 'NONPROJECT_DIRECTIVE',
+                                                                    'NONPROJECT_FLAGS', 'NONPROJECT_STAGE_HOOKS']),
+                                 source_scanner = HdlSourceScanner)
 
     Builders = {
         'IpCreateScript'      : IpCreateScript,
         'IpSynScript'         : IpSynScript,
         'IpCreate'            : IpCreate,
         'IpSyn'               : IpSyn,
+        'IpBatch'             : IpBatch,
         'CfgParamsHeader'     : CfgParamsHeader,
         'CfgParamsTcl'        : CfgParamsTcl,
         'VivadoProject'       : VivadoProject,
@@ -1000,7 +1943,9 @@ def generate(env):
         'SynthVivadoProject'  : SynthVivadoProject,
         'ImplVivadoProject'   : ImplVivadoProject,
         
-        'OpenVivadoProject'   : OpenVivadoProject
+        'OpenVivadoProject'   : OpenVivadoProject,
+
+        'NonProjectStage'     : NonProjectStage
     }
 
     env.Append(BUILDERS = Builders)
@@ -1013,6 +1958,7 @@ def generate(env):
     env.AddMethod(ip_syn_scripts,    'IpSynScripts')
     env.AddMethod(create_ips,        'CreateIps')
     env.AddMethod(syn_ips,           'SynIps')
+    env.AddMethod(batch_ips,         'BatchIps')
 
     env.AddMethod(create_cfg_params_header,    'CreateCfgParamsHeader')
     env.AddMethod(create_cfg_params_tcl,       'CreateCfgParamsTcl')
@@ -1023,6 +1969,10 @@ def generate(env):
 
     env.AddMethod(launch_open_vivado_project,  'LaunchOpenVivadoProject')
 
+    env.AddMethod(launch_nonproject_flow,      'LaunchNonProjectFlow')
+
+    env.AddMethod(use_normalized_decider,      'NormalizedDecider')
+
 
 #-------------------------------------------------------------------------------
 def exists(env):
@@ -0,0 +1,315 @@
+#*******************************************************************************
+#*
+#*    Persistent Tcl tool sessions
+#*
+#*    Long-lived interactive tool processes ('vivado -mode tcl', 'vsim -c')
+#*    that accept generated scripts over stdin. Each script is wrapped so that
+#*    its completion status is reported back with a marker line, output
+#*    between markers is a per-job transcript slice.
+#*
+#*******************************************************************************
+
+import os
+import re
+import time
+import atexit
+import threading
+import selectors
+import subprocess
+
+from utils import *
+
+#-------------------------------------------------------------------------------
+SESSION_MARKER          = '@@SCONS_SESSION'
+SESSION_START_TIMEOUT   = 300         # s
+SESSION_PING_TIMEOUT    = 30          # s
+
+#   Tcl prelude: 'exit' called by scripts must not terminate the session.
+#   It records exit code and unwinds the script with an error carrying
+#   SESSION_EXIT errorcode, so it stops the script from within procs as well.
+#   Recorded exit code wins over the script result, i.e. exit swallowed by
+#   a 'catch' in the script is still reported.
+#
+SESSION_EXIT = 'SCONS_SESSION_EXIT'
+
+SESSION_PRELUDE = '''
+rename exit __session_exit
+proc exit {{code 0}} {
+    set ::__session_exit_code $code
+    return -code error -errorcode %s "exit $code"
+}
+''' % SESSION_EXIT
+
+class SessionError(Exception):
+    pass
+
+#-------------------------------------------------------------------------------
+class TclSession(object):
+
+    def __init__(self, cmd, name='session', prelude='', reset='', source_cmd='source', environ=None, cwd=None):
+        self.cmd        = cmd
+        self.cwd        = cwd
+        self.name       = name
+        self.prelude    = prelude
+        self.reset      = reset
+        self.source_cmd = source_cmd
+        self.environ    = environ
+        self.proc       = None
+        self.partial    = b''
+        self.lines      = []
+        self.seq        = 0
+        self.jobs       = 0
+
+    #---------------------------------------------------------------
+    def start(self):
+        args = self.cmd.split() if isinstance(self.cmd, str) else list(self.cmd)
+        self.proc = subprocess.Popen(args,
+                                     stdin  = subprocess.PIPE,
+                                     stdout = subprocess.PIPE,
+                                     stderr = subprocess.STDOUT,
+                                     env    = self.environ,
+                                     cwd    = self.cwd)
+        register_proc(self.proc)
+        self.partial = b''
+        self.lines   = []
+        self.jobs    = 0
+        self.send(SESSION_PRELUDE + self.prelude)
+        if not self.ping(SESSION_START_TIMEOUT):
+            self.close()
+            raise SessionError(self.name + ': session did not start')
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def close(self):
+        if self.proc is None:
+            return
+        if self.alive():
+            try:
+                self.send('__session_exit')
+                self.proc.wait(TOOL_KILL_GRACE)
+            except (OSError, subprocess.TimeoutExpired):
+                kill_proc_tree(self.proc)
+        release_proc(self.proc)
+        self.proc.stdin.close()
+        self.proc.stdout.close()
+        self.proc = None
+
+    def kill(self):                # busy session: no graceful exit
+        if self.alive():
+            kill_proc_tree(self.proc)
+        self.close()
+
+    #---------------------------------------------------------------
+    def send(self, text):
+        self.proc.stdin.write((text + '\n').encode('utf8'))
+        self.proc.stdin.flush()
+
+    def marker(self):
+        self.seq += 1
+        return SESSION_MARKER + ' ' + str(self.seq)
+
+    def wait_marker(self, marker, timeout=None, out=None, sampler=None, cancel=None):
+        pattern  = re.compile(re.escape(marker) + r' (-?\d+)')
+        deadline = time.time() + timeout if timeout else None
+        fd       = self.proc.stdout.fileno()
+        with selectors.DefaultSelector() as sel:
+            sel.register(fd, selectors.EVENT_READ)
+            while True:
+                while self.lines:
+                    line = self.lines.pop(0)
+                    res  = pattern.search(line)
+                    if res:
+                        return int(res.groups()[0])
+                    if out:
+                        out.line(line)
+
+                if deadline and time.time() > deadline:
+                    raise SessionError(self.name + ': timeout')
+                if cancel is not None and cancel.is_set():
+                    raise SessionError(self.name + ': cancelled')
+                if sampler and sampler.sample(self.proc.pid):
+                    raise SessionError(self.name + ': session killed, memory ' + mem_limit_text(sampler))
+
+                if sel.select(TOOL_POLL_INTERVAL):
+                    data = os.read(fd, 65536)
+                    if not data:
+                        raise SessionError(self.name + ': session terminated')
+                    lines, self.partial = split_lines(self.partial, data)
+                    self.lines += lines
+
+    def ping(self, timeout=SESSION_PING_TIMEOUT):
+        marker = self.marker()
+        try:
+            self.send('puts "' + marker + ' 0"; flush stdout')
+            self.wait_marker(marker, timeout)
+        except (OSError, SessionError):
+            return False
+        return True
+
+    #---------------------------------------------------------------
+    def run(self, script, wdir=os.curdir, out=None, timeout=None, tclvars=None, sampler=None, cancel=None):
+
+        marker = self.marker()
+        text   = 'set ::__session_exit_code {}' + '\n'
+        for v in (tclvars or {}):
+            text += 'set ' + v + ' {' + str(tclvars[v]) + '}' + '\n'
+        text += 'cd {' + os.path.abspath(str(wdir)) + '}' + '\n'
+        text += 'set ::__session_rc [catch {' + self.source_cmd + ' {' + os.path.abspath(script) + '}} ::__session_msg]' + '\n'
+        text += 'if {$::__session_exit_code ne {}} {'                                    + '\n'
+        text += '    set ::__session_rc $::__session_exit_code'                          + '\n'
+        text += '} elseif {$::__session_rc == 1} {'                                      + '\n'
+        text += '    puts "ERROR: $::errorInfo"'                                         + '\n'
+        text += '} elseif {$::__session_rc == 2} {'                                      + '\n'
+        text += '    set ::__session_rc 0'                                               + '\n'
+        text += '}'                                                                      + '\n'
+        for v in (tclvars or {}):
+            text += 'catch {unset ' + v + '}' + '\n'
+        text += self.reset + '\n'
+        text += 'puts "' + marker + ' $::__session_rc"; flush stdout'
+
+        self.jobs += 1
+        self.send(text)
+        return self.wait_marker(marker, timeout, out, sampler, cancel)
+
+#-------------------------------------------------------------------------------
+class TclSessionPool(object):
+
+    def __init__(self, cmd, size=1, max_jobs=0, name='session', admission=None, resident=None, **kwargs):
+        self.cmd       = cmd
+        self.size      = size
+        self.max_jobs  = max_jobs
+        self.name      = name
+        self.kwargs    = kwargs
+        self.idle      = []
+        self.count     = 0
+        self.cond      = threading.Condition()
+        self.admission = admission
+        self.resident  = resident          # cost held by idle session
+        if admission and resident:
+            admission.reclaimers.append(self.reclaim)
+
+    def charge(self, sign):
+        if self.admission and self.resident:
+            self.admission.reserve(self.resident, sign)
+
+    def acquire(self):
+        session = None
+        with self.cond:
+            while not self.idle and self.count >= self.size:
+                self.cond.wait()
+            if self.idle:
+                session = self.idle.pop()
+            else:
+                self.count += 1
+                n = self.count
+
+        if session:
+            self.charge(-1)        # busy session is charged by job cost
+            return session
+
+        session = TclSession(self.cmd, self.name + '-' + str(n), **self.kwargs)
+        try:
+            session.start()
+        except BaseException:
+            self.discard(session)
+            raise
+        return session
+
+    def release(self, session):
+        if self.max_jobs and session.jobs >= self.max_jobs:    # recycle
+            session.close()
+        if not session.alive():
+            self.discard(session)
+            return
+        self.charge(1)
+        with self.cond:
+            self.idle.append(session)
+            self.cond.notify()
+
+    def reclaim(self):
+        with self.cond:
+            if not self.idle:
+                return False
+            session = self.idle.pop(0)
+        self.charge(-1)
+        self.discard(session)
+        return True
+
+    def discard(self, session):
+        session.close()
+        with self.cond:
+            self.count -= 1
+            self.cond.notify()
+
+    def checkout(self):
+        session = self.acquire()
+        if session.alive() and session.ping():                # health check
+            return session
+        print_info(session.name + ': session not responding, restart')
+        session.close()
+        try:
+            session.start()
+        except BaseException:
+            self.discard(session)
+            raise
+        return session
+
+    def run(self, script, wdir=os.curdir, job='', mode='stream', logfile=None, timeout=None, tclvars=None,
+            monitor=None, sampler=None, cancel=None):
+        if cancel is not None and cancel.is_set():
+            print_error('E: ' + job + ': cancelled')
+            return -1
+
+        out = ToolOutput(job, mode, logfile, monitor)
+        try:
+            session = self.checkout()
+        except SessionError as e:
+            print_error('E: ' + job + ': ' + str(e))
+            out.close()
+            return -1
+
+        start = time.time()
+        try:
+            rcode = session.run(script, wdir, out, timeout, tclvars, sampler, cancel)
+        except SessionError as e:
+            print_error('E: ' + job + ': ' + str(e))
+            session.kill()
+            rcode = -1
+        except BaseException:
+            session.kill()
+            raise
+        finally:
+            out.close()
+            self.release(session)
+            trace_event(job or self.name, 'session', start, time.time(),
+                        session = session.name, script = script)
+
+        return rcode
+
+    def close(self):
+        with self.cond:
+            idle, self.idle = self.idle, []
+        for s in idle:
+            self.charge(-1)
+            s.close()
+
+#-------------------------------------------------------------------------------
+session_pools = {}
+session_lock  = threading.Lock()
+
+def get_session_pool(key, cmd, size=1, max_jobs=0, **kwargs):
+    with session_lock:
+        pool = session_pools.get(key)
+        if pool is None:
+            pool = TclSessionPool(cmd, size, max_jobs, name=key, **kwargs)
+            session_pools[key] = pool
+    return pool
+
+def close_session_pools():
+    for key in list(session_pools):
+        session_pools.pop(key).close()
+
+atexit.register(close_session_pools)
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,14 @@
+#*******************************************************************************
+#*
+#*    Test setup: site_scons modules are imported as SCons does it, from
+#*    site_scons and site_scons/site_tools directories
+#*
+#*******************************************************************************
+
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for d in (root, os.path.join(root, 'site_tools')):
+    if d not in sys.path:
+        sys.path.insert(0, d)
@@ -0,0 +1,31 @@
+#*******************************************************************************
+#*
+#*    Config expression evaluator
+#*
+#*******************************************************************************
+
+import pytest
+
+from utils import eval_cfg_dict
+
+#-------------------------------------------------------------------------------
+def test_helper_functions_visible():
+    res = eval_cfg_dict({ 'DEPTH' : 16, 'AW' : '=clog2(DEPTH)' })
+    assert res['AW'] == 4
+
+def test_modules_visible():
+    res = eval_cfg_dict({ 'NAME' : 'a/b.v', 'BASE' : '=os.path.basename(NAME)', 'X' : '=re.sub("b", "c", BASE)' })
+    assert res['BASE'] == 'b.v'
+    assert res['X'] == 'c.v'
+
+def test_forward_reference():
+    res = eval_cfg_dict({ 'A' : '=B * 2', 'B' : '=C + 1', 'C' : 3 })
+    assert (res['A'], res['B']) == (8, 4)
+
+def test_comprehension_names_are_local():
+    res = eval_cfg_dict({ 'W' : 2, 'L' : '=[x * W for x in range(3)]' })
+    assert res['L'] == [0, 2, 4]
+
+def test_cycle_reported():
+    with pytest.raises(SystemExit):
+        eval_cfg_dict({ 'A' : '=B', 'B' : '=A' })
@@ -0,0 +1,57 @@
+#*******************************************************************************
+#*
+#*    Config cache: evaluated parameters and parsed documents
+#*
+#*******************************************************************************
+
+import os
+
+from utils import ConfigCache, read_config, load_yaml
+
+CFG = '''
+parameters:
+    DEPTH   : 16
+    AW      : =clog2(DEPTH)
+    SOURCES : [a.sv, b.sv]
+    OPTS    : { mode : fast }
+'''
+
+def config(tmp_path):
+    path = tmp_path / 'top.yml'
+    path.write_text(CFG)
+    return str(path)
+
+#-------------------------------------------------------------------------------
+def test_returned_params_are_copies(tmp_path):
+    path  = config(tmp_path)
+    cache = ConfigCache()
+
+    res = cache.evaluate(path)
+    res['SOURCES'].append('c.sv')
+    res['OPTS']['mode'] = 'slow'
+
+    res = cache.evaluate(path)                   # cache hit
+    assert res['SOURCES'] == ['a.sv', 'b.sv']
+    assert res['OPTS'] == { 'mode' : 'fast' }
+    assert res['AW'] == 4
+    assert cache.stats()['hits']['params'] == 1
+
+def test_read_config_after_mutation(tmp_path):
+    path = config(tmp_path)
+    read_config(path, search_root=str(tmp_path))['SOURCES'].append('c.sv')
+    assert read_config(path, search_root=str(tmp_path))['SOURCES'] == ['a.sv', 'b.sv']
+
+def test_changed_file_reevaluated(tmp_path):
+    path  = config(tmp_path)
+    cache = ConfigCache()
+    cache.evaluate(path)
+
+    with open(path, 'a') as f:
+        f.write('    EXTRA   : 1\n')
+    os.utime(path, ns=(0, 0))
+    assert cache.evaluate(path)['EXTRA'] == 1
+
+def test_documents_are_copies(tmp_path):
+    path = config(tmp_path)
+    load_yaml(path)['parameters']['SOURCES'].append('c.sv')
+    assert load_yaml(path)['parameters']['SOURCES'] == ['a.sv', 'b.sv']
@@ -0,0 +1,103 @@
+#*******************************************************************************
+#*
+#*    HDL design unit graph: reachability, pruning and compilation units
+#*
+#*******************************************************************************
+
+import os
+
+from hdl_scan import hdl_reachable, hdl_compile_units, prune_hdl
+
+def sources(tmp_path, files):
+    for name, text in files.items():
+        (tmp_path / name).write_text(text)
+    return [str(tmp_path / name) for name in files if name.endswith('.sv')]
+
+def scan_env(tmp_path):
+    return { 'HDL_SCAN_CACHE' : str(tmp_path / 'scan' / 'cache.json') }
+
+def names(files):
+    return [os.path.basename(f) for f in files]
+
+#-------------------------------------------------------------------------------
+def test_package_before_user(tmp_path):
+    env   = scan_env(tmp_path)
+    files = sources(tmp_path, {
+        'top.sv' : 'module top; import cfg_pkg::*; sub u0 (.a(W)); endmodule\n',
+        'sub.sv' : 'module sub(input a); endmodule\n',
+        'pkg.sv' : 'package cfg_pkg; parameter W = 8; endpackage\n',
+    })
+
+    used, pruned = hdl_reachable(env, files, ['top'], ())
+    assert pruned == []
+    assert names(used)[-1] == 'top.sv'
+
+    units = hdl_compile_units(env, files, ())
+    order = [names(u['files']) for u in units]
+    assert order.index(['pkg.sv']) < order.index(['top.sv'])
+    top = order.index(['top.sv'])
+    assert units[top]['deps'] == [order.index(['pkg.sv'])]
+
+def test_include_driven_dependencies(tmp_path):
+    env   = scan_env(tmp_path)
+    files = sources(tmp_path, {
+        'inst.svh' : 'sub u0 (.a(a));\n`define WIDTH 8\n',
+        'top.sv'   : 'module top; `include "inst.svh"\nendmodule\n',
+        'sub.sv'   : 'module sub(input a); endmodule\n',
+        'user.sv'  : 'module user; logic [`WIDTH-1:0] x; endmodule\n',
+        'extra.sv' : 'module extra; endmodule\n',
+    })
+
+    used, pruned = hdl_reachable(env, files, ['top'], ())
+    assert 'sub.sv' in names(used)                         # referenced in header only
+    assert names(used).index('sub.sv') < names(used).index('top.sv')
+    assert sorted(names(pruned)) == ['extra.sv', 'user.sv']
+
+    units = hdl_compile_units(env, files, ())
+    unit  = [u for u in units if 'top.sv' in names(u['files'])][0]
+    assert names(unit['files']) == ['top.sv', 'user.sv']  # macro from header included by top.sv
+    assert names(unit['incs']) == ['inst.svh']
+    assert 'sub' not in unit['defs']
+
+def test_unresolved_top_prunes_nothing(tmp_path):
+    env    = scan_env(tmp_path)
+    files  = sources(tmp_path, {
+        'top.sv'   : 'module top; endmodule\n',
+        'extra.sv' : 'module extra; endmodule\n',
+    })
+    report = str(tmp_path / 'rpt' / 'pruned.txt')
+
+    assert hdl_reachable(env, files, ['tb_top'], ()) == (files, [])
+    assert prune_hdl(env, files, ['tb_top'], [], report) == files
+    with open(report) as f:
+        assert f.read().splitlines() == ['# top: tb_top']
+
+def test_unknown_instances_kept_conservative(tmp_path):
+    env   = scan_env(tmp_path)
+    files = sources(tmp_path, {
+        'top.sv'  : 'module top; vendor_prim u0 (.a(a)); sub u1 (.a(a)); endmodule\n',
+        'sub.sv'  : 'module sub(input a); endmodule\n',
+        'defs.sv' : '`timescale 1ns/1ps\n',
+    })
+
+    used, pruned = hdl_reachable(env, files, ['top'], ())
+    assert pruned == []
+    assert names(used)[0] == 'defs.sv'                     # files without design units first
+
+def test_cycles(tmp_path):
+    env   = scan_env(tmp_path)
+    files = sources(tmp_path, {
+        'a.sv'   : 'package a_pkg; typedef b_pkg::t t2; endpackage\nmodule ma; mb u0 (.x(x)); endmodule\n',
+        'b.sv'   : 'package b_pkg; typedef a_pkg::t t3; endpackage\nmodule mb; ma u0 (.x(x)); endmodule\n',
+        'top.sv' : 'module top; import a_pkg::*; ma u0 (.x(x)); endmodule\n',
+        'ind.sv' : 'package ind_pkg; endpackage\n',
+    })
+
+    used, pruned = hdl_reachable(env, files, ['top'], ())
+    assert sorted(names(used)) == ['a.sv', 'b.sv', 'top.sv']
+    assert names(pruned) == ['ind.sv']
+
+    units = hdl_compile_units(env, files, ())
+    assert names(units[0]['files']) == ['ind.sv']
+    assert sorted(names(units[-1]['files'])) == ['a.sv', 'b.sv', 'top.sv']   # cycle and its users
+    assert sum(len(u['files']) for u in units) == len(files)
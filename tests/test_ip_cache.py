@@ -0,0 +1,121 @@
+#*******************************************************************************
+#*
+#*    OOC IP output cache
+#*
+#*******************************************************************************
+
+import os
+import threading
+
+import pytest
+
+from ip_cache import IpCache, IP_CACHE_STAMP
+
+KEY = 'ab' + '0'*62
+
+def ip_tree(root, name='fifo'):
+    d = root / 'ip_ooc' / name
+    (d / name).mkdir(parents=True)
+    (d / name / (name + '.xci')).write_text('<path>' + str(d / name) + '/' + name + '.xci</path>\n')
+    (d / name / (name + '_stub.v')).write_text('// ' + str(root) + '2/other.v\n')
+    (d / name / (name + '.dcp')).write_bytes(b'PK\0\0' + str(d).encode('utf8'))
+    return d
+
+def roots(root):
+    return { 'OOC' : str(root / 'ip_ooc'), 'ROOT' : str(root) }
+
+#-------------------------------------------------------------------------------
+def test_restore_into_other_directory(tmp_path):
+    cache = IpCache(str(tmp_path / 'cache'), 1 << 30)
+    a, b  = tmp_path / 'a', tmp_path / 'b'
+    src   = ip_tree(a)
+    cache.store(KEY, str(src), paths=roots(a))
+
+    dst = b / 'ip_ooc' / 'fifo'
+    assert cache.restore(KEY, str(dst), roots(b))
+    xci = (dst / 'fifo' / 'fifo.xci').read_text()
+    assert xci == '<path>' + str(dst / 'fifo') + '/fifo.xci</path>\n'
+    assert str(a) not in xci
+
+    # root prefix of other path is not replaced, binary files are copied as is
+    assert (dst / 'fifo' / 'fifo_stub.v').read_text() == '// ' + str(a) + '2/other.v\n'
+    assert (dst / 'fifo' / 'fifo.dcp').read_bytes() == b'PK\0\0' + str(src).encode('utf8')
+    assert (dst / IP_CACHE_STAMP).read_text() == KEY
+
+    # source tree is not changed by store
+    assert str(src) in (src / 'fifo' / 'fifo.xci').read_text()
+
+def test_restore_needs_all_roots(tmp_path):
+    cache = IpCache(str(tmp_path / 'cache'), 1 << 30)
+    src   = ip_tree(tmp_path / 'a')
+    cache.store(KEY, str(src), paths=roots(tmp_path / 'a'))
+
+    assert not cache.restore(KEY, str(tmp_path / 'b'), { 'OOC' : str(tmp_path / 'b') })
+    assert cache.misses == 1
+
+def test_relocated_files_copied_in_link_mode(tmp_path):
+    cache = IpCache(str(tmp_path / 'cache'), 1 << 30, link=True)
+    a, b  = tmp_path / 'a', tmp_path / 'b'
+    cache.store(KEY, str(ip_tree(a)), paths=roots(a))
+
+    dst = b / 'ip_ooc' / 'fifo'
+    assert cache.restore(KEY, str(dst), roots(b))
+    assert os.stat(str(dst / 'fifo' / 'fifo.xci')).st_nlink == 1
+    assert os.stat(str(dst / 'fifo' / 'fifo.dcp')).st_nlink == 2
+
+#-------------------------------------------------------------------------------
+def key(n):
+    return '%02x' % n + '0'*62
+
+def data_tree(root, name, size=1000):
+    d = root / name
+    d.mkdir(parents=True)
+    (d / (name + '.xci')).write_text('<xml/>\n')
+    (d / (name + '.dcp')).write_bytes(b'\0' * size)
+    return str(d)
+
+def test_atomic_store(tmp_path):
+    cache = IpCache(str(tmp_path / 'cache'), 1 << 30)
+    tmp   = tmp_path / 'cache' / 'tmp'
+
+    threads = [threading.Thread(target=cache.store, args=(KEY, data_tree(tmp_path, 'ip' + str(i))))
+               for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.stores == 1
+    assert os.listdir(str(tmp)) == []
+    assert len(cache.entries()) == 1
+
+    with pytest.raises(OSError):                           # failed store leaves nothing behind
+        cache.store(key(1), str(tmp_path / 'missing'))
+    assert os.listdir(str(tmp)) == []
+    assert not cache.restore(key(1), str(tmp_path / 'out'))
+
+def test_lru_eviction_by_size(tmp_path):
+    cache = IpCache(str(tmp_path / 'cache'), 2500)
+    for n in (1, 2):
+        cache.store(key(n), data_tree(tmp_path, 'ip' + str(n)))
+        meta = os.path.join(cache.entry(key(n)), 'meta.json')
+        os.utime(meta, (1000 * n, 1000 * n))
+
+    assert cache.restore(key(1), str(tmp_path / 'out1'))   # key 1 is recently used now
+    cache.store(key(3), data_tree(tmp_path, 'ip3'))
+
+    kept = sorted(k for mtime, size, k in cache.entries())
+    assert kept == [key(1), key(3)]
+    assert sum(size for mtime, size, k in cache.entries()) <= 2500
+
+def test_link_mode_copy_patterns(tmp_path):
+    cache = IpCache(str(tmp_path / 'cache'), 1 << 30, link=True, copy=['*.xci'])
+    cache.store(KEY, data_tree(tmp_path, 'ip'))
+
+    dst = tmp_path / 'out'
+    assert cache.restore(KEY, str(dst))
+    assert os.stat(str(dst / 'ip.xci')).st_nlink == 1      # rewritten by Vivado: copied
+    assert os.stat(str(dst / 'ip.dcp')).st_nlink == 2      # linked to cache entry
+
+    (dst / 'ip.xci').write_text('<changed/>\n')
+    assert cache.restore(KEY, str(tmp_path / 'out2'))
+    assert (tmp_path / 'out2' / 'ip.xci').read_text() == '<xml/>\n'
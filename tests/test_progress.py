@@ -0,0 +1,79 @@
+#*******************************************************************************
+#*
+#*    Phase progress monitor and run log follower
+#*
+#*******************************************************************************
+
+import os
+
+from progress import PhaseMonitor, ProgressHistory, LogTail
+
+RUNME_LOG = [
+    'Command: opt_design',
+    'Phase 1 Retarget',
+    'Phase 2 Constant propagation',
+    'Command: place_design',
+    'Phase 1 Placer Initialization',
+    'INFO: [Place 30-612] ...',
+    'Phase 2 Global Placement',
+    'Command: route_design',
+    'Phase 1 Build RT Design',
+]
+
+PHASES = [
+    'opt_design',
+    'opt_design: Phase 1 Retarget',
+    'opt_design: Phase 2 Constant propagation',
+    'place_design',
+    'place_design: Phase 1 Placer Initialization',
+    'place_design: Phase 2 Global Placement',
+    'route_design',
+    'route_design: Phase 1 Build RT Design',
+]
+
+def monitor(tmp_path):
+    history = ProgressHistory(str(tmp_path / 'progress.json'))
+    return PhaseMonitor('impl', 'key', history, interval=0)
+
+#-------------------------------------------------------------------------------
+def test_runme_log_replay(tmp_path):
+    log = tmp_path / 'runme.log'
+    mon = monitor(tmp_path)
+    tail = LogTail([str(log)], mon.line)
+
+    tail.poll()                                  # run not started yet
+    with open(log, 'w') as f:
+        f.write('\n'.join(RUNME_LOG[:5]) + '\nPhase 2 Glo')
+    tail.poll()
+    assert [p[0] for p in mon.phases] == PHASES[:5]
+
+    with open(log, 'a') as f:
+        f.write('bal Placement\n' + '\n'.join(RUNME_LOG[7:]) + '\n')
+    tail.stop()
+    assert [p[0] for p in mon.phases] == PHASES
+
+def test_previous_run_log_skipped(tmp_path):
+    log = tmp_path / 'runme.log'
+    log.write_text('Command: synth_design\nStart Technology Mapping\n')
+    mon  = monitor(tmp_path)
+    tail = LogTail([str(log)], mon.line)
+
+    tail.poll()
+    assert mon.phases == []
+
+    os.remove(str(log))                          # 'reset_run' recreates run directory
+    log.write_text('Command: synth_design\nStart RTL Elaboration\n')
+    tail.stop()
+    assert [p[0] for p in mon.phases] == ['synth_design', 'synth_design: RTL Elaboration']
+
+def test_eta_from_history(tmp_path):
+    mon = monitor(tmp_path)
+    for l in RUNME_LOG:
+        mon.line(l)
+    mon.save()
+    mon.history.save()
+
+    mon = monitor(tmp_path)              # history reloaded from file
+    assert mon.prev['phases'][0][0] == 'opt_design'
+    mon.line('Command: opt_design')
+    assert mon.eta() is not None
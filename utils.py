@@ -12,11 +12,22 @@ import os
 import sys
 import subprocess
 import re
-import glob
-import yaml
+import ast
+import copy
+import json
+import atexit
+import functools
+import hashlib
+import importlib
+import time
+import signal
+import threading
+import selectors
+import collections
+import contextlib
 
+import SCons.Script
 from SCons.Script import *
-from colorama import Fore, Style
 
 #-------------------------------------------------------------------------------
 # 
@@ -27,40 +38,753 @@ def namegen(fullpath, ext):
     name     = os.path.splitext(basename)[0]
     return name + os.path.extsep + ext
 #-------------------------------------------------------------------------------
+#
+#    Tool runner
+#
+#    Runs external tool with stdout/stderr drained concurrently, optionally
+#    tees output to log file. Console output modes:
+#
+#        'stream' : print lines as they come
+#        'prefix' : print lines prefixed with job name
+#        'buffer' : collect lines (last TOOL_BUFFER_LINES) and print them at once
+#                   when the job finishes
+#        'quiet'  : log file only
+#
+#    Optional monitor object gets every output line via its 'line' method.
+#
+TOOL_POLL_INTERVAL = 0.1          # s
+TOOL_KILL_GRACE    = 5            # s
+TOOL_EXIT_WAIT     = 30           # s, wait for exit status after output is closed
+TOOL_LINE_MAX      = 64*1024      # bytes, longer lines are split
+TOOL_BUFFER_LINES  = 10000
+
+console_lock = threading.Lock()
+
+class ToolResult(object):
+
+    def __init__(self, cmd):
+        self.cmd       = cmd
+        self.rcode     = None
+        self.start     = time.time()
+        self.end       = None
+        self.timed_out = False
+        self.cancelled = False
+        self.exceeded  = False
+
+    @property
+    def elapsed(self):
+        return (self.end if self.end else time.time()) - self.start
+
+#-------------------------------------------------------------------------------
+#
+#    Build timeline trace
+#
+#    Builder actions wrapped by 'traced', tool runs and admission waits are
+#    recorded as Chrome trace events (Perfetto, chrome://tracing), one row per
+#    worker thread. Enabled by TRACE_FILE construction variable, when it is
+#    empty the only overhead is the variable lookup.
+#
+class Tracer(object):
+
+    def __init__(self, path):
+        self.path   = os.path.abspath(path)
+        self.t0     = time.time()
+        self.pid    = os.getpid()
+        self.events = []
+        self.slots  = {}
+        self.lock   = threading.Lock()
+
+    def slot(self):
+        ident = threading.get_ident()
+        slot  = self.slots.get(ident)
+        if slot is None:
+            with self.lock:
+                slot = len(self.slots) + 1
+                self.slots[ident] = slot
+                self.events.append({ 'name' : 'thread_name', 'ph' : 'M', 'pid' : self.pid, 'tid' : slot,
+                                     'args' : { 'name' : 'worker ' + str(slot) } })
+        return slot
+
+    def event(self, name, cat, start, end, **args):
+        ev = { 'name' : name,
+               'cat'  : cat,
+               'ph'   : 'X',
+               'ts'   : round((start - self.t0)*1e6),
+               'dur'  : round((end - start)*1e6),
+               'pid'  : self.pid,
+               'tid'  : self.slot(),
+               'args' : args }
+        with self.lock:
+            self.events.append(ev)
+
+    def save(self):
+        with self.lock:
+            data = { 'traceEvents' : list(self.events), 'displayTimeUnit' : 'ms' }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+
+tracer = None
+
+def get_tracer(path):
+    global tracer
+    if tracer is None:
+        tracer = Tracer(path)
+        atexit.register(tracer.save)
+    return tracer
+
+def trace_event(name, cat, start, end, **args):
+    if tracer:
+        tracer.event(name, cat, start, end, **args)
+
+#-------------------------------------------------------------------------------
+def traced(func):
+
+    @functools.wraps(func)
+    def action(target, source, env):
+        path = env.get('TRACE_FILE')
+        if not path:
+            return func(target, source, env)
+
+        t     = get_tracer(path)
+        start = time.time()
+        rcode = 'exception'
+        try:
+            rcode = func(target, source, env)
+        finally:
+            t.event(func.__name__, 'action', start, time.time(),
+                    target = str(target[0]) if target else '',
+                    rcode  = rcode)
+        return rcode
+
+    return action
+
+#-------------------------------------------------------------------------------
+#
+#    Tool process trees
+#
+#    Tools run in process group of SCons, so keyboard interrupt reaches them
+#    directly. Timeout, cancel and memory limit kill the tool together with
+#    its descendants (found via /proc when available). Tools still running
+#    at exit are killed as well.
+#
+KILL_SIGNALS = (signal.SIGTERM, getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+live_procs = set()
+live_lock  = threading.Lock()
+
+def register_proc(p):
+    with live_lock:
+        live_procs.add(p)
+
+def release_proc(p):
+    with live_lock:
+        live_procs.discard(p)
+
+def proc_stats():                 # pid -> /proc/<pid>/stat fields from 'state' on
+    stats = {}
+    if not os.path.isdir('/proc'):
+        return stats
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open('/proc/' + pid + '/stat') as f:
+                stat = f.read()
+            stats[int(pid)] = stat[stat.rfind(')') + 2:].split()
+        except OSError:
+            pass
+    return stats
+
+def proc_tree(pid, stats=None):
+    if stats is None:
+        stats = proc_stats()
+    children = {}
+    for p in stats:
+        try:
+            children.setdefault(int(stats[p][1]), []).append(p)
+        except (ValueError, IndexError):
+            pass
+    tree  = []
+    stack = [pid]
+    while stack:
+        p = stack.pop()
+        tree.append(p)
+        stack += children.get(p, [])
+    return tree
+
+def kill_proc_tree(p, grace=TOOL_KILL_GRACE):
+    pids = proc_tree(p.pid)
+    for sig in KILL_SIGNALS:
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except OSError:
+                pass
+        try:
+            p.wait(grace)
+            return
+        except subprocess.TimeoutExpired:
+            pids = proc_tree(p.pid)
+
+def kill_live_procs():
+    with live_lock:
+        procs = list(live_procs)
+    for p in procs:
+        if p.poll() is None:
+            kill_proc_tree(p, 1)
+
+atexit.register(kill_live_procs)
+
+#-------------------------------------------------------------------------------
+class ToolOutput(object):
+
+    def __init__(self, job='', mode='stream', logfile=None, monitor=None):
+        self.job     = job
+        self.mode    = mode
+        self.log     = open(logfile, 'w', encoding='utf8') if logfile else None
+        self.tail    = collections.deque(maxlen=TOOL_BUFFER_LINES)
+        self.count   = 0
+        self.monitor = monitor
+
+    def line(self, line):
+        self.count += 1
+        if self.monitor:
+            self.monitor.line(line)
+        if self.log:
+            self.log.write(line + os.linesep)
+        if self.mode == 'stream':
+            with console_lock:
+                print(line)
+        elif self.mode == 'prefix':
+            with console_lock:
+                print('[' + self.job + '] ' + line)
+        elif self.mode == 'buffer':
+            self.tail.append(line)
+
+    def close(self):
+        if self.log:
+            self.log.close()
+            self.log = None
+
+        if self.mode == 'buffer':
+            with console_lock:
+                print('-'*30, self.job, '-'*30)
+                if self.count > len(self.tail):
+                    print('... ' + str(self.count - len(self.tail)) + ' lines skipped')
+                for line in self.tail:
+                    print(line)
+            self.tail.clear()
+
+#-------------------------------------------------------------------------------
+#
+#    Process tree resource sampler
+#
+#    Each sample sums RSS, CPU time (with reaped children), threads and I/O
+#    bytes over the tool process and its descendants from /proc. Sampling
+#    returns True when RSS exceeds memory limit. Page size and clock tick are
+#    looked up on first sample; hosts without /proc do not sample at all.
+#
+@functools.lru_cache(maxsize=None)
+def proc_units():
+    return os.sysconf('SC_PAGE_SIZE'), os.sysconf('SC_CLK_TCK')
+
+def proc_tree_usage(pid):
+    usage = { 'rss' : 0, 'cpu' : 0.0, 'threads' : 0, 'read' : 0, 'write' : 0 }
+    stats = proc_stats()
+    if not stats:
+        return usage
+    page_size, clock_tick = proc_units()
+    for p in proc_tree(pid, stats):
+        try:
+            fields = stats[p]
+            usage['cpu']     += sum(int(x) for x in fields[11:15])/clock_tick
+            usage['threads'] += int(fields[17])
+            usage['rss']     += int(fields[21])*page_size
+            with open('/proc/' + str(p) + '/io') as f:
+                for line in f:
+                    if line.startswith('read_bytes:'):
+                        usage['read']  += int(line.split()[1])
+                    elif line.startswith('write_bytes:'):
+                        usage['write'] += int(line.split()[1])
+        except (KeyError, OSError, ValueError, IndexError):
+            pass
+    return usage
+
+class ResourceSampler(object):
+
+    def __init__(self, interval=1.0, mem_limit=None):
+        self.interval  = interval
+        self.mem_limit = mem_limit          # bytes
+        self.last      = 0
+        self.count     = 0
+        self.rss_sum   = 0
+        self.peak      = { 'rss' : 0, 'cpu' : 0.0, 'threads' : 0, 'read' : 0, 'write' : 0 }
+
+    def sample(self, pid):
+        now = time.time()
+        if now - self.last < self.interval:
+            return False
+        self.last = now
+
+        usage = proc_tree_usage(pid)
+        self.count   += 1
+        self.rss_sum += usage['rss']
+        for k in usage:
+            self.peak[k] = max(self.peak[k], usage[k])
+
+        return bool(self.mem_limit) and usage['rss'] > self.mem_limit
+
+    def stats(self):
+        return { 'peak_rss_gb' : round(self.peak['rss']/1024**3, 3),
+                 'avg_rss_gb'  : round(self.rss_sum/max(self.count, 1)/1024**3, 3),
+                 'cpu_s'       : round(self.peak['cpu'], 1),
+                 'threads'     : self.peak['threads'],
+                 'read_mb'     : round(self.peak['read']/1024**2, 1),
+                 'write_mb'    : round(self.peak['write']/1024**2, 1),
+                 'samples'     : self.count }
+
+#-------------------------------------------------------------------------------
+def split_lines(partial, data):
+    chunks = (partial + data).split(b'\n')
+    rest   = chunks.pop()
+    if len(rest) > TOOL_LINE_MAX:
+        chunks.append(rest)
+        rest = b''
+    return [c.decode('utf8', errors='replace').rstrip() for c in chunks], rest
+
+#-------------------------------------------------------------------------------
+def run_tool(cmd, wdir=os.curdir, logfile=None, job='', mode='stream', timeout=None, cancel=None, environ=None,
+             monitor=None, sampler=None):
+
+    args = cmd.split() if isinstance(cmd, str) else list(cmd)
+    res  = ToolResult(cmd)
+    out  = ToolOutput(job, mode, logfile, monitor)
+
+    p = subprocess.Popen(args,
+                         cwd    = str(wdir),
+                         stdin  = subprocess.DEVNULL,
+                         stdout = subprocess.PIPE,
+                         stderr = subprocess.PIPE,
+                         env    = environ)
+    register_proc(p)
+
+    sel     = selectors.DefaultSelector()
+    partial = {}
+    for f in (p.stdout, p.stderr):
+        sel.register(f, selectors.EVENT_READ)
+        partial[f] = b''
+
+    deadline = res.start + timeout if timeout else None
+    try:
+        while sel.get_map():
+            for key, _ in sel.select(TOOL_POLL_INTERVAL):
+                f    = key.fileobj
+                data = os.read(f.fileno(), 65536)
+                if not data:
+                    sel.unregister(f)
+                    data = b'\n' if partial[f] else b''
+
+                lines, partial[f] = split_lines(partial[f], data)
+                for line in lines:
+                    out.line(line)
+
+            if deadline and time.time() > deadline:
+                res.timed_out = True
+            if cancel is not None and cancel.is_set():
+                res.cancelled = True
+            if sampler and sampler.sample(p.pid):
+                res.exceeded = True
+            if res.timed_out or res.cancelled or res.exceeded:
+                kill_proc_tree(p)
+                break
+
+        try:
+            res.rcode = p.wait(TOOL_EXIT_WAIT)
+        except subprocess.TimeoutExpired:
+            kill_proc_tree(p)
+            res.rcode = p.poll()
+            if res.rcode is None:
+                res.rcode = -1
+
+    except BaseException:
+        kill_proc_tree(p)
+        raise
+
+    finally:
+        release_proc(p)
+        sel.close()
+        p.stdout.close()
+        p.stderr.close()
+        out.close()
+        res.end = time.time()
+        if tracer:
+            tracer.event(job or os.path.basename(args[0]), 'tool', res.start, res.end,
+                         cmd = ' '.join(args), rcode = res.rcode)
+
+    return res
+
+#-------------------------------------------------------------------------------
+#
+#    Admission control
+#
+#    Every tool launch with a cost class from env['JOB_COSTS'] acquires memory
+#    (GB), CPU and license tokens from host budget before start. Jobs are
+#    admitted in FIFO order; a job costing more than the whole budget is
+#    clamped so it can still run alone. Spare CPU tokens (up to cost's
+#    'max_threads') are granted as extra threads and passed to the tool via
+#    TOOL_THREADS environment variable.
+#
+#    License limits are opt-in: only licenses listed in HOST_BUDGET['lic'] are
+#    counted, 'lic' entries of job costs for other licenses are ignored.
+#
+#    Idle pooled tool sessions hold their resident cost (reserved without
+#    waiting). When the first queued job does not fit, idle sessions are
+#    reclaimed (closed) by registered pool callbacks.
+#
+class Admission(object):
+
+    def __init__(self, mem, cpu, lic=None):
+        self.total = { 'mem' : mem, 'cpu' : cpu, 'lic' : dict(lic) if lic else {} }
+        self.free  = { 'mem' : mem, 'cpu' : cpu, 'lic' : dict(self.total['lic']) }
+        self.queue = collections.deque()
+        self.cond  = threading.Condition()
+        self.reclaimers = []
+
+    def clamp(self, cost):
+        lic = {}
+        for l in cost.get('lic', {}):
+            lic[l] = min(cost['lic'][l], self.total['lic'][l]) if l in self.total['lic'] else 0
+        return { 'mem' : min(cost.get('mem', 0), self.total['mem']),
+                 'cpu' : min(cost.get('cpu', 1), self.total['cpu']),
+                 'lic' : lic }
+
+    def fits(self, cost):
+        if cost['mem'] > self.free['mem'] or cost['cpu'] > self.free['cpu']:
+            return False
+        return all(cost['lic'][l] <= self.free['lic'].get(l, 0) for l in cost['lic'] if cost['lic'][l])
+
+    def take(self, grant, sign):
+        self.free['mem'] -= sign*grant['mem']
+        self.free['cpu'] -= sign*grant['cpu']
+        for l in grant['lic']:
+            if l in self.free['lic']:
+                self.free['lic'][l] -= sign*grant['lic'][l]
+
+    def acquire(self, cost, max_threads=1):
+        grant  = self.clamp(cost)
+        ticket = object()
+        with self.cond:
+            self.queue.append(ticket)
+            while self.queue[0] is not ticket or not self.fits(grant):
+                if self.queue[0] is ticket and self.reclaim():
+                    continue
+                self.cond.wait()
+            self.queue.popleft()
+            extra = min(max_threads - grant['cpu'], (self.free['cpu'] - grant['cpu'])//2)
+            if extra > 0:
+                grant['cpu'] += extra
+            self.take(grant, 1)
+            self.cond.notify_all()
+        return grant
+
+    def release(self, grant):
+        with self.cond:
+            self.take(grant, -1)
+            self.cond.notify_all()
+
+    def reserve(self, cost, sign=1):
+        with self.cond:
+            self.take(self.clamp(cost), sign)
+            self.cond.notify_all()
+
+    def reclaim(self):
+        return any(r() for r in list(self.reclaimers))
+
+#-------------------------------------------------------------------------------
+def host_budget():
+    mem = 0
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    mem = int(line.split()[1])/1024**2          # kB -> GB
+                    break
+    except OSError:
+        pass
+
+    try:
+        cpu = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpu = os.cpu_count()
+
+    return { 'mem' : mem, 'cpu' : cpu }
+
+admission = None
+
+def get_admission(env):
+    global admission
+    if admission is None:
+        budget = host_budget()
+        if env.get('HOST_BUDGET'):
+            budget.update(env['HOST_BUDGET'])
+        admission = Admission(budget['mem'], budget['cpu'], budget.get('lic'))
+    return admission
+
+#-------------------------------------------------------------------------------
+@contextlib.contextmanager
+def admitted(env, cost):
+    costs = env.get('JOB_COSTS', {})
+    if not env.get('ADMISSION_CONTROL') or cost not in costs:
+        yield None
+        return
+
+    adm   = get_admission(env)
+    start = time.time()
+    grant = adm.acquire(costs[cost], costs[cost].get('max_threads', 1))
+    if tracer:
+        tracer.event('wait ' + cost, 'admission', start, time.time(), grant = grant)
+    try:
+        yield grant
+    finally:
+        adm.release(grant)
+
+#-------------------------------------------------------------------------------
+#
+#    Resource sampling of tool runs (opt-in): SAMPLE_INTERVAL (s, 0: off),
+#    memory ceiling per cost class as 'mem_limit' (GB) in JOB_COSTS, checked
+#    only while sampling. Per-job figures are merged into BUILD_METRICS file
+#    (empty: off) at exit. Sampling needs /proc, it is off without it
+#
+def resource_sampler(env, cost=None):
+    interval = env.get('SAMPLE_INTERVAL')
+    if not interval or not os.path.isdir('/proc'):
+        return None
+    limit = env.get('JOB_COSTS', {}).get(cost, {}).get('mem_limit')
+    return ResourceSampler(interval, int(limit*1024**3) if limit else None)
+
+def mem_limit_text(sampler):
+    return '%.2f GB exceeded limit %.2f GB' % (sampler.peak['rss']/1024**3, sampler.mem_limit/1024**3)
+
+build_metrics = {}                # path -> { job : record }
+metrics_lock  = threading.Lock()
+
+def record_metrics(env, job, sampler, rcode, elapsed):
+    if not sampler or not env.get('BUILD_METRICS'):
+        return
+    rec = sampler.stats()
+    rec['rcode']   = rcode
+    rec['elapsed'] = round(elapsed, 1)
+    rec['time']    = time.time()
+    with metrics_lock:
+        if not build_metrics:
+            atexit.register(save_build_metrics)
+        build_metrics.setdefault(os.path.abspath(env['BUILD_METRICS']), {})[job] = rec
+
+def save_build_metrics():
+    with metrics_lock:
+        for path, recs in build_metrics.items():
+            data = {}
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                pass
+            data.update(recs)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(data, f, indent=4, sort_keys=True)
+
+#-------------------------------------------------------------------------------
+def output_mode(env):
+    mode = env.get('TOOL_OUTPUT_MODE', 'auto')
+    if mode == 'auto':
+        mode = 'prefix' if GetOption('num_jobs') > 1 else 'stream'
+    return mode
+
+#-------------------------------------------------------------------------------
+#
+#    Construction variables shared by tools (HDL scanning, tool runs,
+#    admission control): defaults are set once by the first tool loaded and
+#    never override values already in env. Cost classes of the tool are
+#    added to JOB_COSTS the same way
+#
+def set_shared_defaults(env, job_costs=None):
+
+    defaults = {
+        'HDL_SCAN_CACHE'    : os.path.join(str(env.Dir('#')), 'build', '.hdl_scan.json'),
+        'HDL_PRUNE'         : False,    # use only HDL files reachable from top unit
+        'HDL_EXTRA_TOPS'    : [],       # additional roots for pruning (bind modules, etc.)
+        'TRACE_FILE'        : '',       # Chrome trace-event file of the build timeline, empty: off
+        'SAMPLE_INTERVAL'   : 0,        # s, tool process tree resource sampling (mem_limit), 0: off
+        'BUILD_METRICS'     : '',       # per-job resource metrics file (needs SAMPLE_INTERVAL), empty: off
+        'TOOL_OUTPUT_MODE'  : 'auto',   # stream | prefix | buffer | quiet | auto
+        'TOOL_TIMEOUT'      : None,     # s
+        'ADMISSION_CONTROL' : True,
+        'HOST_BUDGET'       : None,     # { 'mem' : GB, 'cpu' : N, 'lic' : { name : N } }, None: probe host, licenses not limited
+        'JOB_COSTS'         : {}        # class : { 'mem', 'cpu', 'lic', 'max_threads', 'mem_limit' (GB, kill above) }
+    }
+    for key in defaults:
+        if key not in env:
+            env[key] = defaults[key]
+
+    for c in (job_costs or {}):
+        if c not in env['JOB_COSTS']:
+            env['JOB_COSTS'][c] = job_costs[c]
+
+#-------------------------------------------------------------------------------
+#
+#    Tool installation variables are checked when an action of the tool runs,
+#    not when the tool is loaded, so 'scons -h' and builds not using the tool
+#    work without the installation. 'hints' maps construction variable to its
+#    description
+#
+def check_tool_env(env, hints):
+    missing = [v for v in hints if not env.get(v)]
+    for v in missing:
+        print_error('E: "' + v + '" construction environment variable must be defined and ' + hints[v])
+    return not missing
+
+def tool_action(hints):
+    def wrap(func):
+        @functools.wraps(func)
+        def action(target, source, env):
+            if not check_tool_env(env, hints):
+                return -2
+            return func(target, source, env)
+        return action
+    return wrap
+
+#-------------------------------------------------------------------------------
+def tool_exec(env, cmd, wdir=os.curdir, job='', logfile=None, cost=None, monitor=None, cancel=None):
+
+    if not job:
+        job = os.path.basename(cmd.split()[0])
+
+    sampler = resource_sampler(env, cost)
+    with admitted(env, cost) as grant:
+        if cancel is not None and cancel.is_set():         # cancelled while waiting for admission
+            print_info(job + ': cancelled')
+            return -1
+        environ = dict(os.environ, TOOL_THREADS=str(grant['cpu'])) if grant else None
+        res = run_tool(cmd, wdir,
+                       logfile = logfile,
+                       job     = job,
+                       mode    = output_mode(env),
+                       timeout = env.get('TOOL_TIMEOUT'),
+                       cancel  = cancel,
+                       environ = environ,
+                       monitor = monitor,
+                       sampler = sampler)
+
+    record_metrics(env, job, sampler, res.rcode, res.elapsed)
+
+    if res.cancelled:
+        print_info(job + ': cancelled')
+        return -1
+
+    if res.timed_out:
+        print_error('E: ' + job + ': tool killed after ' + str(env.get('TOOL_TIMEOUT')) + ' s timeout')
+        return -1
+
+    if res.exceeded:
+        print_error('E: ' + job + ': tool killed, memory ' + mem_limit_text(sampler))
+        return -1
+
+    if env.get('VERBOSE'):
+        print_info(job + ': exit code ' + str(res.rcode) + ', elapsed ' + '%.1f' % res.elapsed + ' s')
+
+    return res.rcode
+
+#-------------------------------------------------------------------------------
+#
+#    Parallel tasks: each task is called with cancel event and returns exit
+#    code. The first failure sets the event, so pending tasks are skipped
+#    (result None) and running tools are killed. Returns results in task
+#    order and index of the first failed task (None when all succeeded)
+#
+def run_parallel(tasks, jobs):
+
+    results = [None]*len(tasks)
+    failed  = []
+    pending = collections.deque(enumerate(tasks))
+    cancel  = threading.Event()
+    lock    = threading.Lock()
+
+    def worker():
+        while not cancel.is_set():
+            with lock:
+                if not pending:
+                    return
+                i, task = pending.popleft()
+            rcode = task(cancel)
+            results[i] = rcode
+            if rcode:
+                with lock:
+                    failed.append(i)
+                cancel.set()
+
+    threads = [threading.Thread(target=worker) for k in range(max(1, min(jobs, len(tasks))))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return results, (failed[0] if failed else None)
+
+#-------------------------------------------------------------------------------
 def pexec(cmd, wdir = os.curdir):
-    p = subprocess.Popen(cmd.split(),
-                         cwd = str(wdir),
-                         universal_newlines = True,
-                         stdin    = subprocess.PIPE,
-                         stdout   = subprocess.PIPE,
-                         stderr   = subprocess.PIPE,
-                         encoding = 'utf8')
-
-    while True:
-        out = p.stdout.readline()    
-        if len(out) == 0 and p.poll() is not None:
-            break
-        if out:
-            print(out.strip())
-
-    rcode = p.poll()
-    return rcode
-    
+    return run_tool(cmd, wdir).rcode
+
+#-------------------------------------------------------------------------------
+#
+#    Lazily imported modules: the proxy imports the module (or its attribute)
+#    on first attribute access. 'Fore', 'Style' and 'yaml' are exported to
+#    SConscripts this way, so site_init does not import them eagerly
+#
+class LazyImport(object):
+
+    def __init__(self, module, attr=None):
+        self.__dict__['lazy'] = (module, attr)
+
+    def target(self):
+        obj = self.__dict__.get('obj')
+        if obj is None:
+            module, attr = self.__dict__['lazy']
+            obj = importlib.import_module(module)
+            if attr:
+                obj = getattr(obj, attr)
+            self.__dict__['obj'] = obj
+        return obj
+
+    def __getattr__(self, name):
+        return getattr(self.target(), name)
+
+    def __repr__(self):
+        return '<lazy ' + '.'.join(x for x in self.__dict__['lazy'] if x) + '>'
+
+Fore  = LazyImport('colorama', 'Fore')
+Style = LazyImport('colorama', 'Style')
+yaml  = LazyImport('yaml')
+
+def ansi(color):
+    return getattr(Fore, color)
+
 #-------------------------------------------------------------------------------
 def print_info(text):
-    print(Fore.LIGHTCYAN_EX + text + Style.RESET_ALL)
+    print(ansi('LIGHTCYAN_EX') + text + Style.RESET_ALL)
 #-------------------------------------------------------------------------------
 def print_action(text):
-    print(Fore.LIGHTGREEN_EX + text + Style.RESET_ALL)
-    #print(Fore.LIGHTYELLOW_EX + text + Style.RESET_ALL)
+    print(ansi('LIGHTGREEN_EX') + text + Style.RESET_ALL)
+    #print(ansi('LIGHTYELLOW_EX') + text + Style.RESET_ALL)
                
 #-------------------------------------------------------------------------------
 def print_error(text):
-    print(Fore.LIGHTRED_EX + text + Style.RESET_ALL)
+    print(ansi('LIGHTRED_EX') + text + Style.RESET_ALL)
                    
 #-------------------------------------------------------------------------------
 def print_success(text):
-    print(Fore.GREEN + text + Style.RESET_ALL)
+    print(ansi('GREEN') + text + Style.RESET_ALL)
 
 #-------------------------------------------------------------------------------
 def colorize(text, color, light=False):
@@ -69,7 +793,7 @@ def colorize(text, color, light=False):
     if light:
         color = 'LIGHT' + color + '_EX'
     
-    c = eval('Fore.' + color)
+    c = ansi(color)
         
     return c + text + Style.RESET_ALL
     
@@ -87,6 +811,90 @@ def clog2(n: int) -> int:
 def max_str_len(x):
     return len(max(x, key=len))
 #-------------------------------------------------------------------------------
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+#-------------------------------------------------------------------------------
+#
+#    File search index
+#
+#    Basename -> paths index built once per search root. Directories listed
+#    in SEARCH_PRUNE_DIRS and hidden directories are not descended into. Hits
+#    are checked for existence of found paths only. On a miss the index is
+#    revalidated (mtime of indexed directories) at most once per phase:
+#    SConscript reading and build, so files generated by the build are found.
+#
+SEARCH_PRUNE_DIRS = ['build', '.git', '.svn', '.Xil', '__pycache__']
+
+def scons_phase():
+    return 'read' if getattr(SCons.Script, 'sconscript_reading', 0) else 'build'
+
+class FileIndex(object):
+
+    def __init__(self, root):
+        self.root    = root
+        self.names   = {}
+        self.dirs    = {}
+        self.checked = set()      # phases the index was validated in
+        self.build()
+
+    def build(self):
+        self.names = {}
+        self.dirs  = {}
+        self.checked.add(scons_phase())
+        seen = set()
+        top  = self.root if self.root else os.curdir
+        for dirpath, dirnames, filenames in os.walk(top, followlinks=True):
+            real = os.path.realpath(dirpath)
+            if real in seen:                     # symlink loop
+                dirnames[:] = []
+                continue
+            seen.add(real)
+            try:
+                self.dirs[dirpath] = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+
+            for name in dirnames + filenames:
+                path = os.path.join(dirpath, name)
+                if not self.root:
+                    path = os.path.normpath(path)
+                self.names.setdefault(name, []).append(path)
+
+            dirnames[:] = [d for d in dirnames if d not in SEARCH_PRUNE_DIRS and not d.startswith('.')]
+
+    def valid(self):
+        try:
+            for d in self.dirs:
+                if os.stat(d).st_mtime_ns != self.dirs[d]:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def lookup(self, name):
+        res = [p for p in self.names.get(name, []) if os.path.exists(p)]
+        if not res and scons_phase() not in self.checked:
+            self.checked.add(scons_phase())
+            if not self.valid():
+                self.build()
+                res = list(self.names.get(name, []))
+        return res
+
+file_indices = {}
+
+def file_index(search_root=''):
+    key = (os.path.abspath(search_root if search_root else os.curdir), search_root)
+    idx = file_indices.get(key)
+    if idx is None:
+        idx = FileIndex(search_root)
+        file_indices[key] = idx
+    return idx
+
+#-------------------------------------------------------------------------------
 def search_file(fn, search_root=''):
     fname = os.path.basename(fn)
     fpath = os.path.join(search_root, fname)
@@ -94,7 +902,7 @@ def search_file(fn, search_root=''):
     if os.path.exists(fpath):
         full_path = str.split(fpath)
     else:
-        full_path = glob.glob( os.path.join(search_root, '**', fname), recursive=True )
+        full_path = file_index(search_root).lookup(fname)
         
     if not len(full_path):
         print_error('E: file not found: ' + fn)
@@ -119,54 +927,222 @@ class Dict2Class(object):
     def get_data(self):
         return [a for a in dir(self) if not a.startswith('__') and not callable(getattr(self, a))]
             
+#-------------------------------------------------------------------------------
+#
+#    Config expression evaluator
+#
+#    Each '=' expression is parsed and compiled once (code objects are kept
+#    in a bounded LRU cache keyed by expression text). Parameters are
+#    evaluated in dependency order, so forward references are allowed;
+#    dependency cycles are reported. Expressions see this module namespace
+#    (helpers such as clog2, os, re), parameters of the section and imported
+#    configs.
+#
+CFG_EXPR_CACHE_SIZE = 4096
+
+CFG_COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.GeneratorExp, ast.DictComp)
+
+def cfg_target_names(node):
+    return { n.id for n in ast.walk(node) if isinstance(n, ast.Name) }
+
+def cfg_free_names(node, bound=frozenset()):
+    if isinstance(node, ast.Name):
+        if isinstance(node.ctx, ast.Load) and node.id not in bound:
+            yield node.id
+    elif isinstance(node, CFG_COMPREHENSIONS):
+        inner = set(bound)
+        for i, gen in enumerate(node.generators):
+            yield from cfg_free_names(gen.iter, bound if i == 0 else inner)   # first iterable is evaluated outside
+            inner |= cfg_target_names(gen.target)
+            for cond in gen.ifs:
+                yield from cfg_free_names(cond, inner)
+        elts = [node.key, node.value] if isinstance(node, ast.DictComp) else [node.elt]
+        for e in elts:
+            yield from cfg_free_names(e, inner)
+    elif isinstance(node, ast.Lambda):
+        a = node.args
+        for d in a.defaults + [d for d in a.kw_defaults if d is not None]:
+            yield from cfg_free_names(d, bound)
+        args = a.posonlyargs + a.args + a.kwonlyargs + [x for x in (a.vararg, a.kwarg) if x]
+        yield from cfg_free_names(node.body, bound | { x.arg for x in args })
+    else:
+        for child in ast.iter_child_nodes(node):
+            yield from cfg_free_names(child, bound)
+
+@functools.lru_cache(maxsize=CFG_EXPR_CACHE_SIZE)
+def compile_cfg_expr(expr):
+    tree = ast.parse(expr, mode='eval')
+    return compile(tree, '<cfg: ' + expr + '>', 'eval'), frozenset(cfg_free_names(tree))
+
+#-------------------------------------------------------------------------------
+def cfg_eval_order(deps, keys):
+
+    order = []
+    state = {}                # key -> 1: in progress, 2: done
+    for root in keys:
+        if root in state:
+            continue
+        stack = [(root, iter(deps[root]))]
+        path  = [root]
+        state[root] = 1
+        while stack:
+            key, it = stack[-1]
+            dep = next(it, None)
+            if dep is None:
+                stack.pop()
+                path.pop()
+                state[key] = 2
+                order.append(key)
+            elif state.get(dep) == 1:
+                cycle = path[path.index(dep):] + [dep]
+                print_error('E: config parameters dependency cycle: ' + ' -> '.join(cycle))
+                sys.exit(1)
+            elif dep not in state:
+                state[dep] = 1
+                path.append(dep)
+                stack.append((dep, iter(deps[dep])))
+
+    return order
+
 #-------------------------------------------------------------------------------
 def eval_cfg_dict(cfg_dict: dict, imps=None) -> dict:
-    
-#   print('\n>>>>>>>>>>>>>>')
-#   print('cfg_dict:', cfg_dict)
-#   print('imps:',imps)
-#   print('<<<<<<<<<<<<<<\n')
 
+    ns = dict(globals())
     if imps:               # deflating imported parameters
         for i in imps:
-            var = i
-            exec( var + ' = ' + 'Dict2Class(imps[i], var)' )
-        
-    for key in cfg_dict:
-        var = key
-        exec(var + '= cfg_dict[key]')
+            ns[i] = Dict2Class(imps[i], i)
+
+    ns.update(cfg_dict)
 
+    exprs = {}
+    names = {}
     for key in cfg_dict:
-        if isinstance(cfg_dict[key], str):
-            if cfg_dict[key][0] == '=':
-                cfg_dict[key] = eval(cfg_dict[key][1:])            # evaluate new dict value
-                if isinstance(cfg_dict[key], str):
-                    exec(key + ' = "' + cfg_dict[key] + '"')       # update local variable
-                    cfg_dict[key] = re.sub('`', '"', cfg_dict[key])
-                else:
-                    exec(key + ' = ' + str(cfg_dict[key]))         # update local variable
-                
+        value = cfg_dict[key]
+        if isinstance(value, str) and value[:1] == '=':
+            exprs[key], names[key] = compile_cfg_expr(value[1:])
+
+    deps = {}              # references to other derived parameters
+    for key in exprs:
+        deps[key] = [n for n in names[key] if n in exprs]
+
+    for key in cfg_eval_order(deps, list(exprs)):
+        value   = eval(exprs[key], ns)
+        ns[key] = value                                        # update namespace
+        if isinstance(value, str):
+            value = re.sub('`', '"', value)
+        cfg_dict[key] = value
+
     return cfg_dict
 
 #-------------------------------------------------------------------------------
-def read_config(fn: str, param_sect='parameters', search_root=''):
+#
+#    Parsed config cache
+#
+#    Config files are parsed once per process and keyed by resolved path;
+#    entries are revalidated by file mtime/size. Evaluated parameter dicts
+#    are cached together with signatures of all files in the import chain.
+#    yaml is imported on first parse, so runs reading no configs skip it.
+#
+yaml_loader = None
 
-    path = search_file(fn, search_root)
-    with open( path ) as f:
-        cfg = yaml.safe_load(f)
+def parse_yaml(f):
+    global yaml_loader
+    if yaml_loader is None:
+        yaml_loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    return yaml.load(f, Loader=yaml_loader)
+
+class ConfigCache(object):
+
+    def __init__(self):
+        self.docs   = {}          # path -> (signature, document)
+        self.params = {}          # (path, param_sect, search_root) -> (deps, params)
+        self.local  = threading.local()   # 'chain': import chain being evaluated by build thread
+        self.hits   = { 'doc' : 0, 'params' : 0 }
+        self.misses = { 'doc' : 0, 'params' : 0 }
+
+    def signature(self, path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def chain(self):
+        if not hasattr(self.local, 'chain'):
+            self.local.chain = []
+        return self.local.chain
+
+    def valid(self, deps):
+        try:
+            for path in deps:
+                if self.signature(path) != deps[path]:
+                    return False
+        except OSError:
+            return False
+        return True
+
+    def document(self, fn):
+        path = os.path.realpath(fn)
+        sig  = self.signature(path)
+        item = self.docs.get(path)
+        if item and item[0] == sig:
+            self.hits['doc'] += 1
+            return item[1]
+
+        self.misses['doc'] += 1
+        with open(path) as f:
+            doc = parse_yaml(f)
+        self.docs[path] = (sig, doc)
+        return doc
+
+    def evaluate(self, fn, param_sect='parameters', search_root=''):
+        path = os.path.realpath(fn)
+        key  = (path, param_sect, search_root)
+        item = self.params.get(key)
+        if item and self.valid(item[0]):
+            self.hits['params'] += 1
+            return copy.deepcopy(item[1])
+
+        chain = self.chain()
+        if path in chain:
+            cycle = chain[chain.index(path):] + [path]
+            print_error('E: config import cycle: ' + ' -> '.join(cycle))
+            sys.exit(1)
 
-    imps = {}
-    if 'import' in cfg:
-        imports = cfg['import'].split()
+        self.misses['params'] += 1
+        chain.append(path)
+        try:
+            cfg  = self.document(path)
+            deps = { path : self.signature(path) }
+            imps = {}
+            if 'import' in cfg:
+                for i in cfg['import'].split():
+                    imp_path = search_file(i + '.yml', search_root)
+                    imps[i]  = self.evaluate(imp_path, search_root=search_root)
+                    imp_key  = (os.path.realpath(imp_path), 'parameters', search_root)
+                    deps.update(self.params[imp_key][0])
 
-        for i in imports:
-            imp_fn = i + '.yml'                         # file name of imported data
-            imps[i] = read_config(imp_fn, search_root=search_root)
-                
-    params = cfg[param_sect]
-    params = eval_cfg_dict(params, imps)
+            params = eval_cfg_dict(dict(cfg[param_sect]), imps)
+        finally:
+            chain.pop()
 
-    return params
+        self.params[key] = (deps, params)
+        return copy.deepcopy(params)
+
+    def stats(self):
+        return { 'hits' : dict(self.hits), 'misses' : dict(self.misses) }
+
+config_cache = ConfigCache()
+
+#-------------------------------------------------------------------------------
+#
+#    Cached document is shared by all callers: they get own copy
+#
+def load_yaml(fn):
+    return copy.deepcopy(config_cache.document(fn))
+
+#-------------------------------------------------------------------------------
+def read_config(fn: str, param_sect='parameters', search_root=''):
+
+    path = search_file(fn, search_root)
+    return config_cache.evaluate(path, param_sect, search_root)
 
 #-------------------------------------------------------------------------------
 def import_config(fn: str):
@@ -175,9 +1151,7 @@ def import_config(fn: str):
 def read_ip_config(fn, param_sect, search_root=''):
 
     cfg_params = read_config(fn, param_sect, search_root)
-    
-    with open( fn ) as f:
-        cfg = yaml.safe_load(f)
+    cfg        = load_yaml(fn)
         
     ip_cfg = {}
     ip_cfg['type']     = cfg['type']
@@ -189,8 +1163,7 @@ def read_ip_config(fn, param_sect, search_root=''):
 def read_src_list(fn: str, search_root=''):
 
     path = search_file(fn, search_root)
-    with open( path ) as f:
-        cfg = yaml.safe_load(f)
+    cfg  = load_yaml(path)
         
     return cfg['sources']
     
@@ -208,8 +1181,7 @@ def get_dirs(flist):
 def prefix_suffix(fn, params):
     prefix = ''
     suffix = ''
-    with open( fn ) as f:
-        cfg = yaml.safe_load(f)
+    cfg    = load_yaml(fn)
         
     if 'options' in cfg:
         opt = cfg['options']